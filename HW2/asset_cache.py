@@ -0,0 +1,171 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+
+class AssetCache:
+    """
+    Кэш декодированных изображений фонов и клеток.
+    Каждый файл декодируется один раз; варианты с измененным размером хранятся отдельно
+    под ключом (путь, размер, альфа-канал). Объем кэша ограничен бюджетом памяти:
+    при превышении вытесняются давно не использованные изображения (LRU).
+    Декодированные изображения можно сохранить в пакет на диске (save_pack) — плоский
+    массив uint8 .npy с индексом .json. Процессы-воркеры открывают пакет через memmap
+    (from_pack) и читают общие страницы вместо того, чтобы декодировать свою копию.
+    """
+
+    def __init__(self, memory_limit_mb=256, pack_path=None):
+        """
+        :param memory_limit_mb: ограничение памяти кэша в МБ (пакет на диске в него не входит)
+        :param pack_path: путь к пакету, созданному save_pack (необязательно)
+        """
+        self.memory_limit = int(memory_limit_mb * 2 ** 20)
+        self.entries = OrderedDict()  # ключ -> изображение, в порядке последнего использования
+        self.used = 0  # байт занято изображениями в кэше
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.pack = {}  # ключ -> изображение-представление пакета (только чтение)
+        if pack_path is not None:
+            self._open_pack(pack_path)
+
+    @classmethod
+    def from_pack(cls, pack_path, memory_limit_mb=256):
+        """
+        Создает кэш поверх пакета на диске.
+
+        :param pack_path: путь к .npy пакету
+        :param memory_limit_mb: ограничение памяти кэша для вариантов, отсутствующих в пакете
+        """
+        return cls(memory_limit_mb=memory_limit_mb, pack_path=pack_path)
+
+    @staticmethod
+    def key(path, size=None, with_alpha=False):
+        """
+        Ключ изображения в кэше.
+
+        :param size: размер (ширина, высота) или None для исходного размера
+        """
+        return os.path.abspath(path), tuple(size) if size is not None else None, bool(with_alpha)
+
+    def get(self, path, size=None, with_alpha=False, copy=True):
+        """
+        Возвращает изображение из кэша, при первом обращении декодируя (и при необходимости уменьшая) его.
+
+        :param path: путь к файлу изображения
+        :param size: целевой размер (ширина, высота) или None
+        :param with_alpha: загрузить изображение с альфа-каналом
+        :param copy: вернуть собственную копию; без копии возвращается общий массив только для чтения
+        :return: изображение (NumPy массив)
+        """
+        key = self.key(path, size, with_alpha)
+        if size is None:
+            image = self.get_or_create(key, lambda: self._decode(key[0], with_alpha))
+        else:
+            # Уменьшенный вариант строится из кэшированного исходного изображения
+            image = self.get_or_create(key, lambda: cv2.resize(self.get(path, None, with_alpha, copy=False), key[1]))
+        return image.copy() if copy else image
+
+    def get_or_create(self, key, factory):
+        """
+        Возвращает массив по произвольному ключу, при промахе создавая его вызовом factory().
+        Используется и для производных вариантов изображений (например, повернутых клеток).
+
+        :param key: хешируемый ключ
+        :param factory: функция без аргументов, возвращающая NumPy массив
+        :return: общий массив кэша (только для чтения)
+        """
+        image = self._lookup(key)
+        if image is None:
+            image = self._store(key, factory())
+        return image
+
+    def _lookup(self, key):
+        with self.lock:
+            if key in self.pack:
+                self.hits += 1
+                return self.pack[key]
+            image = self.entries.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return image
+
+    def _decode(self, path, with_alpha):
+        flags = cv2.IMREAD_UNCHANGED if with_alpha else cv2.IMREAD_COLOR
+        image = cv2.imread(path, flags)
+        if image is None:
+            raise ValueError(f"Error: Failed to load image {path}")
+        return image
+
+    def _store(self, key, image):
+        """Помещает изображение в кэш и вытесняет давно не использованные сверх бюджета."""
+        image.flags.writeable = False  # Общий массив не должен изменяться вызывающими
+        with self.lock:
+            if key in self.entries:  # Другой поток успел декодировать то же изображение
+                return self.entries[key]
+            self.entries[key] = image
+            self.used += image.nbytes
+            while self.used > self.memory_limit and len(self.entries) > 1:
+                _, evicted = self.entries.popitem(last=False)
+                self.used -= evicted.nbytes
+        return image
+
+    def stats(self):
+        """
+        :return: словарь со статистикой кэша (попадания, промахи, число изображений, занятая память)
+        """
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries),
+                    "packed": len(self.pack), "memory_mb": self.used / 2 ** 20}
+
+    def save_pack(self, pack_path, keys):
+        """
+        Декодирует изображения и сохраняет их в пакет: плоский массив uint8 (pack_path)
+        и индекс со смещениями и формами (pack_path + '.json').
+
+        :param pack_path: путь к .npy файлу пакета
+        :param keys: список кортежей (путь, размер или None, альфа-канал)
+        """
+        images = [self.get(path, size, with_alpha, copy=False) for path, size, with_alpha in keys]
+        index = []
+        offset = 0
+        for (path, size, with_alpha), image in zip(keys, images):
+            index.append({"path": os.path.abspath(path), "size": list(size) if size is not None else None,
+                          "alpha": bool(with_alpha), "offset": offset, "shape": list(image.shape)})
+            offset += image.size
+        flat = np.lib.format.open_memmap(pack_path, mode="w+", dtype=np.uint8, shape=(max(offset, 1),))
+        for entry, image in zip(index, images):
+            flat[entry["offset"]:entry["offset"] + image.size] = image.reshape(-1)
+        flat.flush()
+        del flat
+        with open(pack_path + ".json", "w") as f:
+            json.dump(index, f)
+
+    def _open_pack(self, pack_path):
+        flat = np.load(pack_path, mmap_mode="r")
+        with open(pack_path + ".json") as f:
+            index = json.load(f)
+        for entry in index:
+            size = entry["size"]
+            key = self.key(entry["path"], size, entry["alpha"])
+            count = int(np.prod(entry["shape"]))
+            self.pack[key] = flat[entry["offset"]:entry["offset"] + count].reshape(entry["shape"])
+
+
+def pack_keys(dataset_loader, img_size):
+    """
+    Ключи изображений, которые ImageGenerator читает для заданного размера кадра:
+    фоны (цветные) и клетки (с альфа-каналом), уменьшенные до размера кадра.
+
+    :param dataset_loader: экземпляр DatasetLoader
+    :param img_size: размер кадра (высота, ширина), как в ImageGenerator
+    """
+    size = (img_size[1], img_size[0])
+    return ([(path, size, False) for path in dataset_loader.patterns["backgrounds"]] +
+            [(path, size, True) for path in dataset_loader.patterns["cells"]])
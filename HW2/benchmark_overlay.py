@@ -0,0 +1,99 @@
+"""
+Замер скорости наложения клеток ImageGenerator._overlay на кадрах с 25 клетками
+и сверка результата с исходной реализацией (поканальное смешивание в float64 без кэша).
+Новая реализация округляет результат смешивания, а исходная отбрасывает дробную часть,
+поэтому значения могут отличаться на 1 на каждую наложенную клетку. При angle_step > 1
+углы поворота квантуются, и кадры отличаются от исходных уже по содержанию.
+
+Запуск из папки HW2:
+    python benchmark_overlay.py --frames 50 --angle-step 1
+"""
+import time
+import random
+import argparse
+import cv2
+import numpy as np
+from dataset_loader import DatasetLoader
+from image_generator import ImageGenerator
+
+CELLS_PER_FRAME = 25
+
+
+def legacy_overlay(generator, background, cell, coord, transparency=1.0):
+    """
+    Исходная реализация _overlay: уменьшение и поворот на каждый вызов,
+    поканальное смешивание в float64.
+    """
+    scale = round(random.uniform(0.05, 0.20), 2)
+    cell_size = int(min(generator.img_size) * scale)
+    cell = cv2.resize(cell, (cell_size, cell_size))
+
+    cell, cell_h, cell_w = generator._rotate_cell(cell, cell_size, cell_size)
+
+    if coord["h"] + cell_h > background.shape[0]:
+        cell_h = background.shape[0] - coord["h"]
+    if coord["w"] + cell_w > background.shape[1]:
+        cell_w = background.shape[1] - coord["w"]
+
+    cell = cell[:cell_h, :cell_w]
+
+    if cell.shape[-1] == 4:
+        alpha = (cell[:, :, 3] / 255.0) * transparency
+        for c in range(3):
+            background[coord["h"]:coord["h"] + cell_h, coord["w"]:coord["w"] + cell_w, c] = (
+                (1 - alpha) * background[coord["h"]:coord["h"] + cell_h, coord["w"]:coord["w"] + cell_w, c] +
+                alpha * cell[:, :, c]
+            )
+
+    return background
+
+
+def render(generator, seed, legacy):
+    """Собирает кадр из 25 клеток без шума; случайные числа берутся в том же порядке, что в _generate_image."""
+    random.seed(seed)
+    coords = generator._generate_cell_coords(CELLS_PER_FRAME)
+    background = generator._load_image(generator.dataset_loader.get_random_background(), resize=True)
+    start = time.perf_counter()
+    for i in range(CELLS_PER_FRAME):
+        cell_path = generator.dataset_loader.get_random_cell()
+        cell = generator._load_image(cell_path, resize=True, with_alpha=True, copy=False)
+        transparency = random.uniform(0.6, 1.0)
+        if legacy:
+            background = legacy_overlay(generator, background, cell, coords[i], transparency)
+        else:
+            background = generator._overlay(background, cell, coords[i], transparency, cell_key=cell_path)
+    return background, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=50, help="количество кадров")
+    parser.add_argument("--dataset", default="dataset", help="папка с backgrounds и cells")
+    parser.add_argument("--angle-step", type=int, default=1, help="шаг квантования угла (1 — точное совпадение углов)")
+    args = parser.parse_args()
+
+    generator = ImageGenerator(DatasetLoader(args.dataset), angle_step=args.angle_step)
+    render(generator, 0, legacy=True)  # Прогрев: декодирование фонов и клеток в кэш ресурсов
+
+    times = {"legacy": [], "new": []}
+    max_diff, mismatched = 0, 0.0
+    for seed in range(args.frames):
+        reference, legacy_time = render(generator, seed, legacy=True)
+        result, new_time = render(generator, seed, legacy=False)
+        times["legacy"].append(legacy_time)
+        times["new"].append(new_time)
+        diff = np.abs(reference.astype(np.int16) - result.astype(np.int16))
+        max_diff = max(max_diff, int(diff.max()))
+        mismatched += (diff > 0).mean()
+
+    print(f"Кадров: {args.frames}, клеток на кадр: {CELLS_PER_FRAME}, шаг угла: {args.angle_step}")
+    for name, values in times.items():
+        print(f"{name:<8} {np.mean(values) * 1000:8.2f} мс/кадр  {1 / np.mean(values):8.1f} кадров/с")
+    print(f"Ускорение: {np.mean(times['legacy']) / np.mean(times['new']):.1f}x")
+    print(f"Максимальная разность с исходной реализацией: {max_diff}, "
+          f"доля отличающихся значений: {mismatched / args.frames * 100:.3f}%")
+    print(f"Кэш вариантов клеток: {generator.variant_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,19 +2,41 @@ import os
 import random
 
 class DatasetLoader:
-    def __init__(self, dataset_dir):
+    # Результаты обхода папок: абсолютный путь набора -> (mtime папок категорий, списки файлов)
+    _scan_cache = {}
+
+    def __init__(self, dataset_dir, use_cache=True):
         self.dataset_dir = dataset_dir
         self.patterns = {"backgrounds": [], "cells": []}
+        self.use_cache = use_cache
         self._load_patterns()
 
     def _load_patterns(self):
+        root_dir = os.path.abspath(self.dataset_dir)
+        cached = self._scan_cache.get(root_dir) if self.use_cache else None
+        # Повторный обход не нужен, если ни одна папка категорий не изменялась с прошлого обхода
+        if cached is not None and cached[0] == self._dir_mtimes(cached[1]):
+            self.patterns = {category: list(files) for category, files in cached[2].items()}
+            return
+
+        dirs = {}
         for root, _, files in os.walk(self.dataset_dir):
             category = os.path.basename(root)
             if category in self.patterns:
                 self.patterns[category] = sorted([os.path.join(root, f) for f in files])
+                dirs[category] = root
 
         if not self.patterns["backgrounds"] or not self.patterns["cells"]:
             raise ValueError("Error: backgrounds or cells not found")
+        self._scan_cache[root_dir] = (self._dir_mtimes(dirs), dirs,
+                                      {category: list(files) for category, files in self.patterns.items()})
+
+    @staticmethod
+    def _dir_mtimes(dirs):
+        try:
+            return {category: os.stat(path).st_mtime_ns for category, path in dirs.items()}
+        except OSError:
+            return None
 
     def get_random_background(self):
         return random.choice(self.patterns["backgrounds"])
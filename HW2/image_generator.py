@@ -3,6 +3,8 @@ import cv2
 import random
 import numpy as np
 from dataset_loader import DatasetLoader
+from noise import NoiseEngine
+from asset_cache import AssetCache
 
 
 class ImageGenerator:
@@ -12,16 +14,28 @@ class ImageGenerator:
     """
 
     def __init__(self, dataset_loader, img_size=(480, 640), num_imgs=5,
-             min_cells=5, max_cells=25, seed=None):
+             min_cells=5, max_cells=25, seed=None, noise_mode="rgb", asset_cache=None,
+             angle_step=1, variant_cache_mb=64):
         """
         :param min_cells: минимальное количество клеток на изображении
         :param max_cells: максимальное количество клеток на изображении
+        :param noise_mode: вид шума (см. NoiseEngine.MODES)
+        :param asset_cache: кэш декодированных изображений (AssetCache); по умолчанию создается свой
+        :param angle_step: шаг квантования угла поворота клетки в градусах (1 — без изменения результата);
+                           чем крупнее шаг, тем чаще повернутые варианты берутся из кэша
+        :param variant_cache_mb: ограничение памяти кэша уменьшенных и повернутых клеток в МБ
         """
         self.dataset_loader = dataset_loader
         self.img_size = img_size
         self.num_imgs = num_imgs
         self.min_cells = min_cells
         self.max_cells = max_cells  # ← новое поле
+        self.noise_mode = noise_mode
+        self.noise = NoiseEngine(seed)  # собственный генератор случайных чисел для шума
+        self.asset_cache = asset_cache if asset_cache is not None else AssetCache()
+        self.angle_step = angle_step
+        # Клетки, уже уменьшенные и повернутые, по ключу (путь, размер, угол)
+        self.variant_cache = AssetCache(memory_limit_mb=variant_cache_mb)
 
         if seed is not None:
             random.seed(seed)
@@ -51,9 +65,11 @@ class ImageGenerator:
         background = self._load_image(self.dataset_loader.get_random_background(), resize=True)
 
         for i in range(num_cells_this_img):
-            cell = self._load_image(self.dataset_loader.get_random_cell(), resize=True, with_alpha=True)
+            cell_path = self.dataset_loader.get_random_cell()
+            # Клетка только читается (_overlay уменьшает её в новый массив), копия не нужна
+            cell = self._load_image(cell_path, resize=True, with_alpha=True, copy=False)
             transparency = random.uniform(0.6, 1.0)
-            background = self._overlay(background, cell, coords[i], transparency)
+            background = self._overlay(background, cell, coords[i], transparency, cell_key=cell_path)
 
         self._apply_random_noise(background)
 
@@ -70,15 +86,21 @@ class ImageGenerator:
 
     def noise_image(self, image, percent):
         """
-        Добавляет случайный RGB-шум на изображение.
+        Добавляет случайный шум (по умолчанию RGB) на изображение на месте.
 
         :param image: изображение (NumPy массив)
         :param percent: процент пикселей, подверженных шуму
         """
-        for i in range(image.shape[0]):
-            for j in range(image.shape[1]):
-                if random.random() < percent / 100:
-                    image[i, j] = np.random.randint(0, 256, size=3)
+        self.noise.apply(image, self.noise_mode, percent)
+
+    def noise_images(self, images, percent):
+        """
+        Зашумляет пачку изображений (массив (N, H, W, C) или список) одним вызовом.
+
+        :param images: изображения
+        :param percent: процент пикселей, подверженных шуму
+        """
+        return self.noise.apply_batch(images, self.noise_mode, percent)
 
     def _generate_cell_coords(self, count):
         """
@@ -88,42 +110,38 @@ class ImageGenerator:
                 "w": random.randint(0, self.img_size[1] - int(self.img_size[1] * 0.01))}
                 for _ in range(count)]
 
-    def _load_image(self, image_path, resize=False, with_alpha=False):
+    def _load_image(self, image_path, resize=False, with_alpha=False, copy=True):
         """
-        Загружает изображение по указанному пути.
+        Загружает изображение по указанному пути через кэш декодированных изображений.
 
         :param image_path: путь к файлу изображения
         :param resize: если True — изменить размер под целевой размер изображения
         :param with_alpha: если True — загрузить изображение с альфа-каналом
+        :param copy: если False — вернуть общий массив кэша (только для чтения)
         :return: загруженное изображение (NumPy массив)
         """
-        flags = cv2.IMREAD_UNCHANGED if with_alpha else cv2.IMREAD_COLOR
-        image = cv2.imread(image_path, flags)
-
-        if image is None:
-            raise ValueError(f"Error: Failed to load image {image_path}")
-
-        if resize:
-            image = cv2.resize(image, (self.img_size[1], self.img_size[0]))
-
-        return image
+        size = (self.img_size[1], self.img_size[0]) if resize else None
+        return self.asset_cache.get(image_path, size=size, with_alpha=with_alpha, copy=copy)
 
-    def _overlay(self, background, cell, coord, transparency=1.0):
+    def _overlay(self, background, cell, coord, transparency=1.0, cell_key=None):
         """
         Накладывает изображение клетки на фоновое изображение с заданной прозрачностью.
+        Смешивание выполняется только в области клетки (ROI) одним вызовом cv2.blendLinear
+        с весами float32 и записывается в фон на месте.
 
         :param background: фоновое изображение
         :param cell: изображение клетки
         :param coord: координаты размещения (словарь с 'h' и 'w')
         :param transparency: прозрачность наложения (от 0 до 1)
+        :param cell_key: ключ клетки (путь к файлу) для кэша уменьшенных и повернутых вариантов; None — без кэша
         :return: обновлённое фоновое изображение
         """
         scale = round(random.uniform(0.05, 0.20), 2)
         cell_size = int(min(self.img_size) * scale)
-        cell = cv2.resize(cell, (cell_size, cell_size))
-
-        cell, cell_h, cell_w = self._rotate_cell(cell, cell_size, cell_size)
+        angle = random.randint(0, 360)
+        cell = self._prepare_cell(cell, cell_size, angle, cell_key)
 
+        cell_h, cell_w = cell.shape[:2]
         if coord["h"] + cell_h > background.shape[0]:
             cell_h = background.shape[0] - coord["h"]
         if coord["w"] + cell_w > background.shape[1]:
@@ -132,26 +150,49 @@ class ImageGenerator:
         cell = cell[:cell_h, :cell_w]
 
         if cell.shape[-1] == 4:
-            alpha = (cell[:, :, 3] / 255.0) * transparency
-            for c in range(3):
-                background[coord["h"]:coord["h"] + cell_h, coord["w"]:coord["w"] + cell_w, c] = (
-                    (1 - alpha) * background[coord["h"]:coord["h"] + cell_h, coord["w"]:coord["w"] + cell_w, c] +
-                    alpha * cell[:, :, c]
-                )
+            roi = background[coord["h"]:coord["h"] + cell_h, coord["w"]:coord["w"] + cell_w]
+            weights = cell[:, :, 3].astype(np.float32)
+            weights *= np.float32(transparency / 255.0)
+            # roi = cell * alpha + roi * (1 - alpha) с округлением до uint8, результат пишется прямо в ROI фона
+            blended = cv2.blendLinear(np.ascontiguousarray(cell[:, :, :3]), roi, weights, 1 - weights, dst=roi)
+            if not np.shares_memory(blended, roi):
+                np.copyto(roi, blended)
 
         return background
 
-    def _rotate_cell(self, cell, cell_h, cell_w):
+    def _prepare_cell(self, cell, cell_size, angle, cell_key=None):
+        """
+        Уменьшает клетку до cell_size и поворачивает на угол angle (с учетом angle_step).
+        При заданном cell_key уменьшенная клетка и повернутый вариант берутся из кэша вариантов
+        или сохраняются в него.
+
+        :return: изображение клетки uint8
         """
-        Поворачивает изображение клетки на случайный угол и корректирует размер.
+        if self.angle_step > 1:
+            angle = int(round(angle / self.angle_step) * self.angle_step)
+        if cell_key is None:
+            resized = cv2.resize(cell, (cell_size, cell_size))
+            return self._rotate_cell(resized, cell_size, cell_size, angle)[0]
+
+        # Уменьшение кадра клетки до cell_size выполняется один раз на пару (клетка, размер)
+        resized = self.variant_cache.get_or_create(("resized", cell_key, cell_size),
+                                                   lambda: cv2.resize(cell, (cell_size, cell_size)))
+        return self.variant_cache.get_or_create(("rotated", cell_key, cell_size, angle),
+                                                lambda: self._rotate_cell(resized, cell_size, cell_size, angle)[0])
+
+    def _rotate_cell(self, cell, cell_h, cell_w, angle=None):
+        """
+        Поворачивает изображение клетки на случайный (или заданный) угол и корректирует размер.
 
         :param cell: изображение клетки
         :param cell_h: исходная высота клетки
         :param cell_w: исходная ширина клетки
+        :param angle: угол поворота в градусах; None — случайный
         :return: повернутое изображение, новая высота, новая ширина
         """
         center = (cell_w // 2, cell_h // 2)
-        angle = random.randint(0, 360)
+        if angle is None:
+            angle = random.randint(0, 360)
         matrix = cv2.getRotationMatrix2D(center, angle, 1.0)
 
         new_w = int((cell_h * abs(matrix[0, 1])) + (cell_w * abs(matrix[0, 0])))
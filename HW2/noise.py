@@ -0,0 +1,107 @@
+import numpy as np
+
+
+class NoiseEngine:
+    """
+    Векторизованное зашумление изображений uint8.
+    Все виды шума применяются операциями над целыми массивами (без циклов по пикселям),
+    изменяют изображение на месте и используют собственный np.random.Generator,
+    поэтому результат воспроизводим по зерну и не зависит от глобального состояния random.
+    Процент percent везде означает долю пикселей, затронутых шумом: каждый пиксель
+    выбирается независимо с вероятностью percent / 100.
+    """
+
+    MODES = ("rgb", "salt_pepper", "gaussian", "poisson", "speckle")
+
+    def __init__(self, seed=None):
+        """
+        :param seed: зерно генератора случайных чисел (None — случайное)
+        """
+        self.rng = np.random.default_rng(seed)
+
+    def apply(self, image, mode="rgb", percent=100.0, **params):
+        """
+        Применяет шум заданного вида к изображению на месте.
+
+        :param image: изображение uint8 (H, W) или (H, W, C)
+        :param mode: вид шума из MODES
+        :param percent: процент пикселей, подверженных шуму
+        :param params: параметры вида шума (sigma для gaussian и speckle, scale для poisson)
+        :return: то же изображение
+        """
+        return self._apply(image, mode, percent, batched=False, **params)
+
+    def apply_batch(self, images, mode="rgb", percent=100.0, **params):
+        """
+        Применяет шум ко многим кадрам. Массив (N, H, W[, C]) зашумляется за один проход,
+        список кадров — по одному, но тем же генератором.
+
+        :param images: массив кадров uint8 или список кадров
+        :return: те же кадры
+        """
+        if isinstance(images, np.ndarray):
+            return self._apply(images, mode, percent, batched=True, **params)
+        for image in images:
+            self._apply(image, mode, percent, batched=False, **params)
+        return images
+
+    def rgb(self, image, percent):
+        """Заменяет выбранные пиксели случайными цветами (все каналы независимо)."""
+        return self.apply(image, "rgb", percent)
+
+    def salt_pepper(self, image, percent):
+        """Заменяет выбранные пиксели белыми или черными."""
+        return self.apply(image, "salt_pepper", percent)
+
+    def gaussian(self, image, sigma=10.0, percent=100.0):
+        """Добавляет к выбранным пикселям нормальный шум со стандартным отклонением sigma."""
+        return self.apply(image, "gaussian", percent, sigma=sigma)
+
+    def poisson(self, image, scale=1.0, percent=100.0):
+        """Заменяет выбранные пиксели значениями Пуассона со средним, равным яркости (scale — число фотонов на уровень)."""
+        return self.apply(image, "poisson", percent, scale=scale)
+
+    def speckle(self, image, sigma=0.1, percent=100.0):
+        """Мультипликативный шум: пиксель умножается на (1 + N(0, sigma))."""
+        return self.apply(image, "speckle", percent, sigma=sigma)
+
+    def _apply(self, image, mode, percent, batched, sigma=None, scale=1.0):
+        if mode not in self.MODES:
+            raise ValueError(f"Error: unknown noise mode {mode}")
+        if image.dtype != np.uint8:
+            raise ValueError("Error: noise is applied to uint8 images only")
+
+        # Форма сетки пикселей: без оси каналов, если она есть
+        has_channels = image.ndim == (4 if batched else 3)
+        pixel_shape = image.shape[:-1] if has_channels else image.shape
+
+        if percent >= 100:
+            selected = image # Шум на всех пикселях: работаем со всем массивом без маски
+            mask = None
+        else:
+            mask = self.rng.random(pixel_shape) < percent / 100
+            selected = image[mask] # (число пикселей, каналы) или (число пикселей,)
+
+        if mode == "rgb":
+            values = self.rng.integers(0, 256, size=selected.shape, dtype=np.uint8)
+        elif mode == "salt_pepper":
+            # Одно значение на пиксель, одинаковое во всех каналах
+            level_shape = selected.shape[:-1] if has_channels else selected.shape
+            levels = self.rng.integers(0, 2, size=level_shape, dtype=np.uint8) * np.uint8(255)
+            values = np.broadcast_to(levels[..., None], selected.shape) if has_channels else levels
+        else:
+            values = selected.astype(np.float32)
+            if mode == "gaussian":
+                values += self.rng.normal(0, sigma if sigma is not None else 10.0, size=values.shape).astype(np.float32)
+            elif mode == "poisson":
+                values = self.rng.poisson(values * scale).astype(np.float32) / scale
+            else: # speckle
+                noise = self.rng.normal(0, sigma if sigma is not None else 0.1, size=values.shape).astype(np.float32)
+                values += values * noise
+            np.clip(np.rint(values, out=values), 0, 255, out=values)
+
+        if mask is None:
+            np.copyto(image, values, casting="unsafe")
+        else:
+            image[mask] = values
+        return image
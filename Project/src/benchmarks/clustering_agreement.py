@@ -0,0 +1,70 @@
+"""Сверка бэкендов кластеризации ClusteringModel с исходным DBSCAN на сгенерированных изображениях.
+
+Для каждого изображения текстурные карты считаются один раз, после чего все конфигурации
+(бэкенд + размер сетки признаков) кластеризуют один и тот же стек. Эталон - DBSCAN на
+сетке 100x100, как в исходной модели.
+
+Запуск из папки src:
+    python -m benchmarks.clustering_agreement --images 10 --configs precomputed:100 grid:100 grid:100:20 grid:200
+"""
+import os
+import argparse
+import cv2
+import numpy as np
+from models.clustering_model import ClusteringModel
+from models.clustering_backends import make_backend
+from utils.generator import BloodCellGenerator
+
+REFERENCE = "dbscan:100"
+
+
+def parse_config(config):
+    """Разбирает строку вида 'бэкенд:размер_сетки[:min_samples]'."""
+    backend, size, min_samples = (config.split(":") + ["", ""])[:3]
+    return backend, int(size or 100), int(min_samples or 5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=10, help="количество сгенерированных изображений")
+    parser.add_argument("--image-size", type=int, default=640, help="сторона генерируемого изображения")
+    parser.add_argument("--seed", type=int, default=0, help="зерно генератора")
+    parser.add_argument("--configs", nargs="+", default=["precomputed:100", "grid:100", "grid:200", "dbscan:64"],
+                        help="конфигурации 'бэкенд:размер_сетки[:min_samples]' для сравнения с эталоном")
+    args = parser.parse_args()
+
+    np.random.seed(args.seed)
+    data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data")
+    generator = BloodCellGenerator(data_dir, image_size=(args.image_size, args.image_size))
+
+    configs = [REFERENCE] + [c for c in args.configs if c != REFERENCE]
+    models = {}
+    for config in configs:
+        backend, size, min_samples = parse_config(config)
+        models[config] = ClusteringModel(backend=make_backend(backend), feature_size=size, min_samples=min_samples)
+
+    counts = {config: [] for config in configs}
+    true_counts = []
+    for _ in range(args.images):
+        image, bboxes = generator.generate_image(return_bboxes=True)
+        true_counts.append(len(bboxes))
+        # Предобработка и текстурные карты общие для всех конфигураций
+        gray = cv2.GaussianBlur(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), (9, 9), 0.5)
+        combined_maps = models[REFERENCE].texture_engine.combined_energies(gray)
+        for config, model in models.items():
+            counts[config].append(model.cluster_texture(gray, combined_maps, eps=model.eps,
+                                                        min_samples=model.min_samples))
+
+    reference = np.array(counts[REFERENCE])
+    truth = np.array(true_counts)
+    print(f"Изображений: {args.images} ({args.image_size}x{args.image_size}), эталон: {REFERENCE}")
+    print(f"{'конфигурация':<18}{'мс/вызов':>10}{'совпадение':>12}{'|Δ| эталон':>12}{'|Δ| истина':>12}")
+    for config, model in models.items():
+        result = np.array(counts[config])
+        agreement = np.mean(result == reference) * 100
+        print(f"{config:<18}{model.backend.mean_time * 1000:>10.1f}{agreement:>11.0f}%"
+              f"{np.abs(result - reference).mean():>12.2f}{np.abs(result - truth).mean():>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Сравнение задержки и пропускной способности бэкендов CNNModel.
+
+Запуск из папки src:
+    python -m benchmarks.cnn_backends --images 16 --batch-sizes 1 4 8 --threads 4
+"""
+import os
+import time
+import argparse
+import numpy as np
+from models.cnn_model import CNNModel
+from utils.generator import BloodCellGenerator
+
+
+def time_calls(fn, items, repeats):
+    """Вызывает fn для каждого элемента items repeats раз и возвращает список задержек в секундах."""
+    latencies = []
+    for _ in range(repeats):
+        for item in items:
+            start = time.perf_counter()
+            fn(item)
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(name, latencies, images_per_call):
+    """Печатает строку отчета: задержка на вызов (p50/p95) и пропускная способность."""
+    latencies = np.array(latencies)
+    p50, p95 = np.percentile(latencies, [50, 95]) * 1000
+    throughput = images_per_call * len(latencies) / latencies.sum()
+    print(f"{name:<30} p50: {p50:8.1f} мс  p95: {p95:8.1f} мс  {throughput:8.2f} изобр./с")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=16, help="количество тестовых кадров")
+    parser.add_argument("--image-size", type=int, default=1024, help="сторона генерируемого кадра")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8], help="размеры пачек для predict_batch")
+    parser.add_argument("--repeats", type=int, default=3, help="число повторов каждого замера")
+    parser.add_argument("--threads", type=int, default=None, help="intra_op_threads для ONNX Runtime")
+    args = parser.parse_args()
+
+    np.random.seed(0) # Одинаковые кадры при каждом запуске
+    data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data")
+    generator = BloodCellGenerator(data_dir, image_size=(args.image_size, args.image_size))
+    images = [generator.generate_image() for _ in range(args.images)]
+
+    torch_model = CNNModel(backend="ultralytics")
+    squash_model = CNNModel(backend="ultralytics", keep_aspect=False) # Исходное растяжение до 640x640
+    onnx_model = CNNModel(backend="onnx", intra_op_threads=args.threads)
+
+    # Прогрев: первые вызовы включают ленивую инициализацию
+    torch_model.predict(images[0])
+    squash_model.predict(images[0])
+    onnx_model.predict(images[0])
+
+    print(f"Кадров: {len(images)} ({args.image_size}x{args.image_size}), повторов: {args.repeats}")
+    report("ultralytics predict", time_calls(torch_model.predict, images, args.repeats), 1)
+    report("ultralytics predict (squash)", time_calls(squash_model.predict, images, args.repeats), 1)
+    report("onnx predict", time_calls(onnx_model.predict, images, args.repeats), 1)
+    for batch_size in args.batch_sizes:
+        batches = [images[i:i + batch_size] for i in range(0, len(images) - batch_size + 1, batch_size)]
+        if not batches:
+            continue
+        report(f"ultralytics batch={batch_size}",
+               time_calls(lambda b: torch_model.predict_batch(b, batch_size), batches, args.repeats), batch_size)
+        report(f"onnx batch={batch_size}",
+               time_calls(lambda b: onnx_model.predict_batch(b, batch_size), batches, args.repeats), batch_size)
+
+    # Согласованность результатов: predict_batch обоих бэкендов использует одинаковый letterbox
+    torch_counts = torch_model.predict_batch(images)
+    onnx_counts = onnx_model.predict_batch(images)
+    diff = np.abs(np.array(torch_counts) - np.array(onnx_counts))
+    print(f"Расхождение числа клеток ultralytics/onnx: среднее {diff.mean():.2f}, максимум {diff.max()}")
+    # Насколько letterbox меняет число клеток относительно исходного растяжения
+    diff = np.abs(np.array(torch_counts) - np.array(squash_model.predict_batch(images)))
+    print(f"Расхождение числа клеток letterbox/squash: среднее {diff.mean():.2f}, максимум {diff.max()}")
+
+
+if __name__ == "__main__":
+    main()
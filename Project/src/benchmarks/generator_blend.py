@@ -0,0 +1,72 @@
+"""Сравнение режимов вставки клеток BloodCellGenerator: бесшовное клонирование и альфа-смешивание.
+
+Для каждого зерна фон генерируется один раз, после чего generate_cells обоих режимов
+запускается из одного и того же состояния генератора случайных чисел. Проверяется, что
+рамки клеток совпадают, сравниваются время вставки, статистики изображений и число клеток,
+которое находит MLModel на изображениях двух режимов.
+
+Запуск из папки src:
+    python -m benchmarks.generator_blend --images 20 --image-size 640 --save /tmp/blend
+"""
+import os
+import time
+import argparse
+import cv2
+import numpy as np
+from models.ml_model import MLModel
+from utils.generator import BloodCellGenerator
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=20, help="количество изображений (зерна 0..images-1)")
+    parser.add_argument("--image-size", type=int, default=640, help="сторона генерируемого изображения")
+    parser.add_argument("--save", default=None, help="папка для сохранения пар изображений (слева seamless, справа alpha)")
+    args = parser.parse_args()
+
+    data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data")
+    size = (args.image_size, args.image_size)
+    generators = {mode: BloodCellGenerator(data_dir, image_size=size, blend_mode=mode)
+                  for mode in BloodCellGenerator.BLEND_MODES}
+    ml_model = MLModel()
+    if args.save:
+        os.makedirs(args.save, exist_ok=True)
+
+    times = {mode: [] for mode in generators}
+    counts = {mode: [] for mode in generators}
+    same_bboxes = 0
+    pixel_diff, mean_diff, std_diff = [], [], []
+    for seed in range(args.images):
+        np.random.seed(seed)
+        background = generators["seamless"].generate_background()
+        state = np.random.get_state()
+
+        images, bboxes = {}, {}
+        for mode, generator in generators.items():
+            np.random.set_state(state) # Оба режима получают одинаковую последовательность случайных чисел
+            start = time.perf_counter()
+            images[mode], bboxes[mode] = generator.generate_cells(background.copy())
+            times[mode].append(time.perf_counter() - start)
+            counts[mode].append(ml_model.predict(images[mode]))
+
+        seamless, alpha = images["seamless"].astype(np.float32), images["alpha"].astype(np.float32)
+        same_bboxes += bboxes["seamless"] == bboxes["alpha"]
+        pixel_diff.append(np.abs(seamless - alpha).mean())
+        mean_diff.append(abs(seamless.mean() - alpha.mean()))
+        std_diff.append(abs(seamless.std() - alpha.std()))
+        if args.save:
+            cv2.imwrite(os.path.join(args.save, f"blend_{seed:04d}.png"), np.hstack([images["seamless"], images["alpha"]]))
+
+    print(f"Изображений: {args.images} ({args.image_size}x{args.image_size})")
+    print(f"{'режим':<10}{'мс/вставка':>12}{'MLModel, среднее':>18}")
+    for mode in generators:
+        print(f"{mode:<10}{np.mean(times[mode]) * 1000:>12.1f}{np.mean(counts[mode]):>18.2f}")
+    print(f"Ускорение вставки: {np.mean(times['seamless']) / np.mean(times['alpha']):.1f}x")
+    print(f"Совпадение рамок: {same_bboxes}/{args.images}")
+    print(f"Средняя |разность| пикселей: {np.mean(pixel_diff):.2f}, "
+          f"|Δ| средней яркости: {np.mean(mean_diff):.2f}, |Δ| стандартного отклонения: {np.mean(std_diff):.2f}")
+    print(f"|Δ| числа клеток MLModel: {np.abs(np.subtract(counts['seamless'], counts['alpha'])).mean():.2f}")
+
+
+if __name__ == "__main__":
+    main()
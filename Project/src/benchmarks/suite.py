@@ -0,0 +1,405 @@
+"""Набор бенчмарков моделей, генератора, фильтров и хранилища с историей результатов.
+
+Входные изображения синтетические и генерируются с фиксированным зерном для каждого
+разрешения, поэтому запуски сравнимы между собой. Для каждого компонента и разрешения
+сохраняются задержка (p50/p90/p99), пропускная способность и пиковая память: прирост
+памяти Python/NumPy по tracemalloc (отдельным проходом, чтобы трассировка не искажала
+время) и максимальный RSS процесса. Результаты пишутся в SQLite (benchmarks.db).
+compare сравнивает запуск с базовым и завершается с кодом 1 при регрессии.
+Все замеры выполняются на CPU без сети; CNN пропускается, если ultralytics или веса недоступны.
+
+Запуск из папки src:
+    python -m benchmarks.suite run --sizes 640 1024 2048 --repeats 10 --baseline
+    python -m benchmarks.suite run --components ml filters.blur storage.write
+    python -m benchmarks.suite compare --threshold 0.15
+    python -m benchmarks.suite list
+"""
+import os
+import sys
+import time
+import socket
+import sqlite3
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import tracemalloc
+from datetime import datetime
+import cv2
+import numpy as np
+
+DB_PATH = "benchmarks.db" # История запусков
+DEFAULT_SIZES = (640, 1024, 2048)
+INPUTS_PER_SIZE = 3 # Различных входных изображений на разрешение
+
+
+class Skip(Exception):
+    """Компонент недоступен в текущем окружении (например, нет ultralytics или весов)."""
+
+
+def make_inputs(size, seed, count=INPUTS_PER_SIZE):
+    """Синтетические изображения size x size с фиксированным зерном (быстрая альфа-вставка клеток)."""
+    from utils.generator import BloodCellGenerator
+    np.random.seed(seed)
+    generator = BloodCellGenerator(data_dir(), image_size=(size, size), blend_mode="alpha")
+    return [generator.generate_image() for _ in range(count)]
+
+
+def data_dir():
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data")
+
+
+# Фабрики компонентов: factory(size, inputs) -> функция одного вызова fn(k), k - номер вызова
+def bench_ml(size, inputs):
+    from models.ml_model import MLModel
+    model = MLModel()
+    return lambda k: model.predict(inputs[k % len(inputs)])
+
+
+def bench_clustering(size, inputs):
+    from models.clustering_model import ClusteringModel
+    model = ClusteringModel()
+    return lambda k: model.predict(inputs[k % len(inputs)])
+
+
+def bench_cnn(size, inputs):
+    try:
+        from models.cnn_model import CNNModel
+        model = CNNModel()
+    except Exception as e: # ultralytics не установлен или нет weights.pt
+        raise Skip(str(e))
+    return lambda k: model.predict(inputs[k % len(inputs)])
+
+
+def bench_generator(blend_mode):
+    def factory(size, inputs):
+        from utils.generator import BloodCellGenerator
+        np.random.seed(0)
+        generator = BloodCellGenerator(data_dir(), image_size=(size, size), blend_mode=blend_mode)
+        return lambda k: generator.generate_image()
+    return factory
+
+
+def bench_filter(name):
+    def factory(size, inputs):
+        from preprocessing.filters import ImageFilters
+        method = getattr(ImageFilters, name)
+        return lambda k: method(inputs[k % len(inputs)])
+    return factory
+
+
+def bench_filter_pipeline(size, inputs):
+    """Цепочка blur -> sharpen -> contrast через FilterPipeline с переиспользуемыми буферами."""
+    from preprocessing.pipeline import FilterPipeline
+    pipeline = FilterPipeline(["blur", "sharpen", "contrast"])
+    buffers = {}
+    return lambda k: pipeline.apply(inputs[k % len(inputs)], buffers=buffers)
+
+
+_teardowns = [] # Освобождение ресурсов последнего компонента (временные БД, писатели), см. teardown()
+
+
+def temp_db_path():
+    """Путь к results.db во временной папке, которая удаляется в teardown()."""
+    directory = tempfile.TemporaryDirectory(prefix="bench_db_")
+    _teardowns.append(directory.cleanup)
+    return os.path.join(directory.name, "results.db")
+
+
+def teardown():
+    """Освобождает ресурсы, созданные фабриками компонентов, в обратном порядке."""
+    while _teardowns:
+        _teardowns.pop()()
+
+
+def bench_storage_write(size, inputs):
+    """Пакетная запись 1000 строк через ExperimentWriter во временную БД."""
+    from experiment_db import ExperimentWriter
+    path = temp_db_path()
+    writer = ExperimentWriter(db_path=path, batch_size=1000, flush_interval=None)
+    _teardowns.append(writer.close) # Закрывается до удаления папки с БД
+    rows = [("2025-01-01 00:00:00", "", str(i % 30), i % 31, i % 29, i % 28) for i in range(1000)]
+
+    def call(k):
+        writer.add_many(rows)
+        writer.flush()
+    return call
+
+
+def check_paging(limit=5000):
+    """Регрессионная проверка постраничной выборки текущей БД (experiment_db.DB_PATH).
+
+    Обход страниц по каждой колонке сортировки в обоих направлениях должен вернуть
+    ровно count_results() строк без повторов, в том числе когда ключ страницы - NULL.
+    """
+    import experiment_db
+    total = experiment_db.count_results()
+    columns = experiment_db.result_columns()
+    for column in experiment_db.SORTABLE_COLUMNS:
+        for descending in (False, True):
+            ids, after = set(), None
+            while True:
+                rows = experiment_db.load_results_page(limit=limit, order_by=column, descending=descending,
+                                                       after=after)
+                ids.update(row[0] for row in rows)
+                if len(rows) < limit:
+                    break
+                after = (rows[-1][columns.index(column)], rows[-1][0])
+            if len(ids) != total:
+                raise AssertionError(f"Постраничный обход по {column} ({'DESC' if descending else 'ASC'}) "
+                                     f"вернул {len(ids)} строк из {total}")
+
+
+def bench_storage_page(size, inputs):
+    """Постраничная выборка с сортировкой и фильтром по таблице из 50 000 строк.
+
+    Перед замером проверяется, что постраничный обход по каждой колонке возвращает все строки (check_paging).
+    """
+    import experiment_db
+    path = temp_db_path()
+    with experiment_db.ExperimentWriter(db_path=path, batch_size=5000, flush_interval=None) as writer:
+        # Каждая седьмая строка без результата метода, каждая пятая - реальное изображение без true_count:
+        # ключи NULL в середине сортировки
+        writer.add_many(("2025-01-01 00:00:00", f"/data/real/{i}.png" if i % 5 == 0 else "",
+                         "" if i % 5 == 0 else str(i % 30), i % 31 if i % 7 else None, i % 29, i % 28)
+                        for i in range(50000))
+
+    saved, experiment_db.DB_PATH = experiment_db.DB_PATH, path
+    try:
+        check_paging()
+    finally:
+        experiment_db.DB_PATH = saved
+
+    def call(k):
+        saved, experiment_db.DB_PATH = experiment_db.DB_PATH, path
+        try:
+            experiment_db.load_results_page(limit=200, order_by="method1_result", descending=bool(k % 2),
+                                            after=(15, 25000), filters={"gen_params": "1"})
+        finally:
+            experiment_db.DB_PATH = saved
+    return call
+
+
+COMPONENTS = {
+    "ml": bench_ml,
+    "clustering": bench_clustering,
+    "cnn": bench_cnn,
+    "generator": bench_generator("seamless"),
+    "generator.alpha": bench_generator("alpha"),
+    "filters.blur": bench_filter("blur"),
+    "filters.sharpen": bench_filter("sharpen"),
+    "filters.gradient": bench_filter("gradient"),
+    "filters.contrast": bench_filter("contrast"),
+    "filters.pipeline": bench_filter_pipeline,
+    "storage.write": bench_storage_write,
+    "storage.page": bench_storage_page,
+}
+SIZE_INDEPENDENT = {"storage.write", "storage.page"} # Замеряются один раз, размер записывается как 0
+ITEMS_PER_CALL = {"storage.write": 1000} # Для пропускной способности: строк за вызов
+
+
+def measure(fn, repeats, warmup):
+    """Замеряет задержку repeats вызовов после warmup прогревочных и пиковую память одного вызова.
+
+    Returns:
+        dict: Задержки в секундах, прирост памяти по tracemalloc (МБ) и максимальный RSS процесса (МБ).
+    """
+    for k in range(warmup):
+        fn(k)
+    latencies = []
+    for k in range(repeats):
+        start = time.perf_counter()
+        fn(k)
+        latencies.append(time.perf_counter() - start)
+
+    # Отдельный проход под tracemalloc: трассировка выделений заметно замедляет вызов
+    tracemalloc.start()
+    try:
+        fn(repeats)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # На Linux ru_maxrss в КБ
+    return {"latencies": latencies, "peak_mb": peak / 2 ** 20, "rss_mb": rss}
+
+
+def connect(db_path):
+    """Открывает БД истории и создает таблицы при необходимости."""
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT,
+            label TEXT,
+            git_commit TEXT,
+            host TEXT,
+            python TEXT,
+            numpy TEXT,
+            opencv TEXT,
+            cpu_count INTEGER,
+            is_baseline INTEGER DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS results (
+            run_id INTEGER REFERENCES runs(id),
+            component TEXT,
+            size INTEGER,
+            status TEXT, -- ok или skipped: причина
+            samples INTEGER,
+            p50_ms REAL,
+            p90_ms REAL,
+            p99_ms REAL,
+            mean_ms REAL,
+            throughput REAL, -- элементов в секунду
+            peak_mb REAL,
+            rss_mb REAL,
+            PRIMARY KEY (run_id, component, size)
+        );
+    """)
+    return conn
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(args):
+    """Команда run: замер выбранных компонентов на всех разрешениях и запись в историю."""
+    unknown = set(args.components) - set(COMPONENTS)
+    if unknown:
+        raise SystemExit(f"Неизвестные компоненты: {', '.join(sorted(unknown))}")
+    if args.threads:
+        cv2.setNumThreads(args.threads)
+
+    conn = connect(args.db)
+    with conn:
+        run_id = conn.execute(
+            "INSERT INTO runs (date, label, git_commit, host, python, numpy, opencv, cpu_count, is_baseline) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), args.label, git_commit(), socket.gethostname(),
+             platform.python_version(), np.__version__, cv2.__version__, os.cpu_count(), int(args.baseline))
+        ).lastrowid
+
+    print(f"Запуск {run_id}: {len(args.components)} компонентов, разрешения {args.sizes}")
+    print(f"{'компонент':<18}{'размер':>7}{'p50, мс':>10}{'p90, мс':>10}{'p99, мс':>10}"
+          f"{'элем./с':>10}{'tracemalloc, МБ':>17}{'RSS, МБ':>9}")
+    inputs = {}
+    for component in args.components:
+        sizes = [0] if component in SIZE_INDEPENDENT else args.sizes
+        for size in sizes:
+            if size and size not in inputs:
+                inputs[size] = make_inputs(size, args.seed)
+            try:
+                fn = COMPONENTS[component](size, inputs.get(size))
+                result = measure(fn, args.repeats, args.warmup)
+            except Skip as e:
+                print(f"{component:<18}{size:>7}  пропущен: {e}")
+                with conn:
+                    conn.execute("INSERT INTO results (run_id, component, size, status) VALUES (?, ?, ?, ?)",
+                                 (run_id, component, size, f"skipped: {e}"))
+                continue
+            finally:
+                teardown() # Временные БД компонента удаляются и при ошибке
+
+            latencies = np.array(result["latencies"])
+            p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) * 1000
+            throughput = ITEMS_PER_CALL.get(component, 1) * len(latencies) / latencies.sum()
+            print(f"{component:<18}{size:>7}{p50:>10.2f}{p90:>10.2f}{p99:>10.2f}{throughput:>10.1f}"
+                  f"{result['peak_mb']:>17.1f}{result['rss_mb']:>9.0f}")
+            with conn:
+                conn.execute(
+                    "INSERT INTO results VALUES (?, ?, ?, 'ok', ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (run_id, component, size, len(latencies), p50, p90, p99, latencies.mean() * 1000,
+                     throughput, result["peak_mb"], result["rss_mb"])
+                )
+    conn.close()
+    return run_id
+
+
+def compare(args):
+    """Команда compare: сравнение запуска с базовым; код возврата 1 при регрессии."""
+    conn = connect(args.db)
+    current = args.run or conn.execute("SELECT MAX(id) FROM runs").fetchone()[0]
+    baseline = args.against or conn.execute(
+        "SELECT MAX(id) FROM runs WHERE is_baseline = 1 AND id != ?", (current,)).fetchone()[0]
+    if current is None or baseline is None:
+        raise SystemExit("Нет запуска для сравнения или базового запуска (run --baseline)")
+
+    rows = conn.execute("""
+        SELECT c.component, c.size, b.p50_ms, c.p50_ms, b.p90_ms, c.p90_ms, b.peak_mb, c.peak_mb
+        FROM results c JOIN results b ON b.component = c.component AND b.size = c.size
+        WHERE c.run_id = ? AND b.run_id = ? AND c.status = 'ok' AND b.status = 'ok'
+        ORDER BY c.component, c.size
+    """, (current, baseline)).fetchall()
+    conn.close()
+
+    print(f"Запуск {current} против базового {baseline} (порог времени {args.threshold:.0%}, "
+          f"памяти {args.memory_threshold:.0%})")
+    print(f"{'компонент':<18}{'размер':>7}{'p50 было':>10}{'p50 стало':>11}{'Δ p50':>8}{'Δ p90':>8}{'Δ память':>10}")
+    regressions = 0
+    for component, size, base_p50, p50, base_p90, p90, base_peak, peak in rows:
+        d50, d90 = p50 / base_p50 - 1, p90 / base_p90 - 1
+        dmem = peak / base_peak - 1 if base_peak else 0.0
+        # Регрессия по времени засчитывается, только если выросли и медиана, и p90 (устойчивость к шуму)
+        slow = d50 > args.threshold and d90 > args.threshold
+        heavy = dmem > args.memory_threshold and peak - base_peak > 1.0 # Меньше 1 МБ - шум
+        flag = " РЕГРЕССИЯ" + (" (время)" if slow else "") + (" (память)" if heavy else "") if slow or heavy else ""
+        regressions += bool(flag)
+        print(f"{component:<18}{size:>7}{base_p50:>10.2f}{p50:>11.2f}{d50:>+8.0%}{d90:>+8.0%}{dmem:>+10.0%}{flag}")
+    print(f"Регрессий: {regressions}")
+    return 1 if regressions else 0
+
+
+def list_runs(args):
+    """Команда list: перечень запусков в истории."""
+    conn = connect(args.db)
+    for run_id, date, label, commit, is_baseline, count in conn.execute("""
+        SELECT r.id, r.date, r.label, r.git_commit, r.is_baseline, COUNT(res.component)
+        FROM runs r LEFT JOIN results res ON res.run_id = r.id GROUP BY r.id ORDER BY r.id
+    """):
+        print(f"{run_id:>4}  {date}  {commit or '-':<9} {'базовый' if is_baseline else '':<8} "
+              f"замеров: {count:<4} {label or ''}")
+    conn.close()
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=DB_PATH, help="файл истории результатов")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="выполнить замеры и сохранить их в историю")
+    run_parser.add_argument("--components", nargs="+", default=list(COMPONENTS), help="компоненты для замера")
+    run_parser.add_argument("--sizes", nargs="+", type=int, default=list(DEFAULT_SIZES), help="стороны изображений")
+    run_parser.add_argument("--repeats", type=int, default=10, help="замеряемых вызовов на компонент и размер")
+    run_parser.add_argument("--warmup", type=int, default=1, help="прогревочных вызовов")
+    run_parser.add_argument("--seed", type=int, default=0, help="зерно синтетических входных изображений")
+    run_parser.add_argument("--threads", type=int, default=None, help="число потоков OpenCV")
+    run_parser.add_argument("--label", default=None, help="подпись запуска")
+    run_parser.add_argument("--baseline", action="store_true", help="отметить запуск как базовый")
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser("compare", help="сравнить запуск с базовым")
+    compare_parser.add_argument("--run", type=int, default=None, help="запуск (по умолчанию последний)")
+    compare_parser.add_argument("--against", type=int, default=None,
+                                help="базовый запуск (по умолчанию последний отмеченный --baseline)")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="допустимый относительный рост времени")
+    compare_parser.add_argument("--memory-threshold", type=float, default=0.20,
+                                help="допустимый относительный рост пиковой памяти")
+    compare_parser.set_defaults(handler=compare)
+
+    list_parser = commands.add_parser("list", help="показать историю запусков")
+    list_parser.set_defaults(handler=list_runs)
+
+    args = parser.parse_args()
+    result = args.handler(args)
+    if args.command == "compare":
+        sys.exit(result)
+
+
+if __name__ == "__main__":
+    main()
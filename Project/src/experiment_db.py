@@ -1,40 +1,285 @@
+import json
 import sqlite3
-import pandas as pd
+import atexit
+import threading
 from datetime import datetime
 
 DB_PATH = "results.db" # Путь к файлу базы данных SQLite
 
+# Колонки, по которым таблица экспериментов может сортироваться и фильтроваться средствами SQLite
+SORTABLE_COLUMNS = ("id", "date", "real_data_path", "gen_params", "method1_result", "method2_result", "method3_result",
+                    "true_count")
+TEXT_COLUMNS = ("date", "real_data_path", "gen_params") # Фильтр по префиксу строки, для остальных - точное совпадение
+
+# Колонки, добавленные после первой версии схемы: в старые файлы БД они добавляются через ALTER TABLE
+ADDED_COLUMNS = (
+    ("stage_timings", "TEXT"), # JSON с замерами стадий моделей {метод: {стадия: {...}}} (см. BaseModel.stage_stats)
+    ("true_count", "INTEGER"), # Истинное число клеток (для синтетических изображений)
+)
+
+# Методы анализа и колонки их результатов в таблице results
+METHOD_COLUMNS = (("ml", "method1_result"), ("clustering", "method2_result"), ("cnn", "method3_result"))
+
+INSERT_SQL = """
+    INSERT INTO results (date, real_data_path, gen_params, method1_result, method2_result, method3_result,
+                         stage_timings, true_count)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?) -- Вставляем новую запись с параметрами
+"""
+
+def _row(date, real_data_path, gen_params, method1, method2, method3, stage_timings=None, true_count=None):
+    """Приводит строку к порядку колонок INSERT_SQL.
+
+    Замеры стадий сериализуются в JSON. Если true_count не задан, а gen_params - целое число
+    (так run_experiments сохраняет число сгенерированных клеток), истинное число берется из него.
+    """
+    if stage_timings is not None and not isinstance(stage_timings, str):
+        stage_timings = json.dumps(stage_timings, ensure_ascii=False)
+    if true_count is None and isinstance(gen_params, str) and gen_params.isdecimal():
+        true_count = int(gen_params)
+    return date, real_data_path, gen_params, method1, method2, method3, stage_timings, true_count
+
+def _summary_delta(sign):
+    """Тело триггера: добавляет (sign=1) или вычитает (sign=-1) ошибки строки в accuracy_summary."""
+    row = "NEW" if sign > 0 else "OLD"
+    statements = []
+    for method, column in METHOD_COLUMNS:
+        error = f"({row}.{column} - {row}.true_count)"
+        statements.append(f"""
+            INSERT INTO accuracy_summary (method, true_count, n, sum_error, sum_abs_error, sum_sq_error)
+            SELECT '{method}', {row}.true_count, {sign}, {sign} * {error}, {sign} * abs{error}, {sign} * {error} * {error}
+            WHERE {row}.{column} IS NOT NULL
+            ON CONFLICT (method, true_count) DO UPDATE SET
+                n = n + excluded.n,
+                sum_error = sum_error + excluded.sum_error,
+                sum_abs_error = sum_abs_error + excluded.sum_abs_error,
+                sum_sq_error = sum_sq_error + excluded.sum_sq_error;""")
+    return "".join(statements)
+
+def rebuild_accuracy_summary(conn):
+    """Пересчитывает accuracy_summary полным проходом по results (после миграции или ручной правки строк)."""
+    conn.execute("DELETE FROM accuracy_summary")
+    for method, column in METHOD_COLUMNS:
+        conn.execute(f"""
+            INSERT INTO accuracy_summary (method, true_count, n, sum_error, sum_abs_error, sum_sq_error)
+            SELECT '{method}', true_count, COUNT(*), SUM({column} - true_count), SUM(abs({column} - true_count)),
+                   SUM(({column} - true_count) * ({column} - true_count))
+            FROM results WHERE true_count IS NOT NULL AND {column} IS NOT NULL
+            GROUP BY true_count
+        """)
+
+def create_accuracy_summary(conn):
+    """Создает таблицу накопленных ошибок методов и триггеры, поддерживающие ее при вставке и удалении строк.
+
+    Для каждого метода и истинного числа клеток хранятся количество строк и суммы ошибки,
+    модуля ошибки и квадрата ошибки, поэтому MAE, смещение и RMSE читаются без прохода по results.
+    """
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'accuracy_summary'").fetchone()
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS accuracy_summary (
+            method TEXT, -- Метод анализа (ml, clustering, cnn)
+            true_count INTEGER, -- Истинное число клеток
+            n INTEGER, -- Количество строк
+            sum_error REAL, -- Сумма ошибок (результат - истина)
+            sum_abs_error REAL, -- Сумма модулей ошибок
+            sum_sq_error REAL, -- Сумма квадратов ошибок
+            PRIMARY KEY (method, true_count)
+        ) WITHOUT ROWID
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS results_accuracy_insert AFTER INSERT ON results
+        WHEN NEW.true_count IS NOT NULL
+        BEGIN {_summary_delta(1)}
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS results_accuracy_delete AFTER DELETE ON results
+        WHEN OLD.true_count IS NOT NULL
+        BEGIN {_summary_delta(-1)}
+        END
+    """)
+    if not exists:
+        rebuild_accuracy_summary(conn) # Сводка по строкам, записанным до появления таблицы
+
+def create_schema(conn):
+    """Создает таблицу 'results' в переданном соединении, если она не существует."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS results ( -- Создать таблицу results, если она не существует
+            id INTEGER PRIMARY KEY AUTOINCREMENT, -- Уникальный идентификатор эксперимента (автоинкремент)
+            date TEXT, -- Дата и время проведения эксперимента (текстовое представление)
+            real_data_path TEXT, -- Путь к файлу реального изображения (если использовалось)
+            gen_params TEXT, -- Параметры генерации синтетического изображения (если использовалось, например, число клеток)
+            method1_result INTEGER, -- Результат анализа методом 1 (например, ML)
+            method2_result INTEGER, -- Результат анализа методом 2 (например, Clustering)
+            method3_result INTEGER, -- Результат анализа методом 3 (например, CNN)
+            stage_timings TEXT -- Замеры стадий моделей в JSON (если профилирование было включено)
+        )
+    """)
+    # Миграция БД, созданных до появления новых колонок
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(results)")}
+    for column, declaration in ADDED_COLUMNS:
+        if column not in existing:
+            conn.execute(f"ALTER TABLE results ADD COLUMN {column} {declaration}")
+    if "true_count" not in existing:
+        # Истинное число клеток прежних строк восстанавливается из gen_params, если там целое число
+        conn.execute("UPDATE results SET true_count = CAST(gen_params AS INTEGER) "
+                     "WHERE gen_params GLOB '[0-9]*' AND gen_params NOT GLOB '*[^0-9]*'")
+    create_accuracy_summary(conn)
+    # Индексы (колонка, id) для сортировки и постраничной выборки по ключу в таблице GUI
+    for column in SORTABLE_COLUMNS:
+        if column != "id":
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_results_{column} ON results ({column}, id)")
+
+class ExperimentWriter:
+    """Писатель результатов экспериментов с постоянным соединением и пакетной вставкой.
+
+    Держит одно соединение с БД (журнал WAL, synchronous=NORMAL), копит строки в буфере
+    и сбрасывает их через executemany при достижении batch_size строк или раз в
+    flush_interval секунд. Методы add/add_many/flush потокобезопасны. Соединение SQLite
+    нельзя передать в другой процесс, поэтому процессы-производители отправляют строки
+    через multiprocessing.Queue, а процесс-владелец писателя вызывает consume().
+    """
+    def __init__(self, db_path=None, batch_size=100, flush_interval=1.0):
+        """
+        Args:
+            db_path: Путь к файлу БД (по умолчанию DB_PATH).
+            batch_size: Количество строк в буфере, при котором выполняется сброс.
+            flush_interval: Максимальное время (с) хранения строк в буфере; None - без сброса по времени.
+        """
+        self.db_path = db_path or DB_PATH
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        # Соединение используется из разных потоков, доступ к нему сериализуется блокировкой
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL") # Читатели не блокируют писателя, меньше fsync на коммит
+        self.conn.execute("PRAGMA synchronous=NORMAL") # В режиме WAL fsync только при контрольной точке
+        create_schema(self.conn)
+        self.conn.commit()
+
+        self._buffer = [] # Строки, ожидающие записи
+        self._lock = threading.Lock()
+        self._closed = False
+
+        # Фоновый поток сбрасывает буфер по времени, чтобы строки не залеживались при медленном потоке данных
+        self._stop = threading.Event()
+        self._timer = None
+        if flush_interval:
+            self._timer = threading.Thread(target=self._flush_periodically, daemon=True)
+            self._timer.start()
+
+    def add(self, date, real_data_path, gen_params, method1, method2, method3, stage_timings=None, true_count=None):
+        """Добавляет одну строку в буфер; при заполнении буфера сбрасывает его в БД."""
+        self.add_many([(date, real_data_path, gen_params, method1, method2, method3, stage_timings, true_count)])
+
+    def add_many(self, rows):
+        """Добавляет в буфер несколько строк-кортежей в порядке колонок INSERT_SQL (stage_timings и true_count можно опустить)."""
+        rows = [_row(*row) for row in rows]
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("ExperimentWriter уже закрыт")
+            self._buffer.extend(rows)
+            if len(self._buffer) >= self.batch_size:
+                self._flush_locked()
+
+    def flush(self):
+        """Немедленно записывает все буферизованные строки одной транзакцией."""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        """Сброс буфера; вызывается только под self._lock."""
+        if not self._buffer:
+            return
+        self.conn.executemany(INSERT_SQL, self._buffer) # Одна транзакция на всю пачку
+        self.conn.commit()
+        self._buffer = []
+
+    def _flush_periodically(self):
+        """Цикл фонового потока: сбрасывает буфер раз в flush_interval секунд."""
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def consume(self, rows_queue, sentinel=None):
+        """Забирает строки из очереди (например, multiprocessing.Queue) до получения sentinel.
+
+        Returns:
+            int: Количество полученных строк.
+        """
+        count = 0
+        while True:
+            row = rows_queue.get()
+            if row is sentinel:
+                return count
+            self.add(*row)
+            count += 1
+
+    def close(self):
+        """Останавливает фоновый сброс, записывает остаток буфера и закрывает соединение."""
+        if self._closed:
+            return
+        self._stop.set()
+        if self._timer is not None:
+            self._timer.join()
+        with self._lock:
+            self._flush_locked()
+            self._closed = True
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+_default_writer = None # Общий писатель для функционального API модуля
+_default_writer_lock = threading.Lock()
+
+def get_writer():
+    """Возвращает общий ExperimentWriter модуля, создавая его при первом обращении."""
+    global _default_writer
+    with _default_writer_lock:
+        if _default_writer is None or _default_writer._closed:
+            _default_writer = ExperimentWriter()
+            atexit.register(_default_writer.close) # Остаток буфера записывается при выходе из программы
+        return _default_writer
+
+def flush_pending():
+    """Записывает строки, накопленные общим писателем, чтобы их увидели читающие функции."""
+    if _default_writer is not None and not _default_writer._closed:
+        _default_writer.flush()
+
 def init_db():
     """Инициализирует базу данных: создает таблицу 'results' если она не существует."""
     conn = sqlite3.connect(DB_PATH) # Устанавливаем соединение с базой данных
-    cursor = conn.cursor() # Создаем объект курсора для выполнения команд SQL
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS results ( # Создать таблицу results, если она не существует
-            id INTEGER PRIMARY KEY AUTOINCREMENT, # Уникальный идентификатор эксперимента (автоинкремент)
-            date TEXT, # Дата и время проведения эксперимента (текстовое представление)
-            real_data_path TEXT, # Путь к файлу реального изображения (если использовалось)
-            gen_params TEXT, # Параметры генерации синтетического изображения (если использовалось, например, число клеток)
-            method1_result INTEGER, # Результат анализа методом 1 (например, ML)
-            method2_result INTEGER, # Результат анализа методом 2 (например, Clustering)
-            method3_result INTEGER # Результат анализа методом 3 (например, CNN)
-        )
-    """)
+    conn.execute("PRAGMA journal_mode=WAL") # Режим журнала сохраняется в файле БД
+    create_schema(conn) # Создаем таблицу
     conn.commit() # Применяем изменения (создание таблицы)
     conn.close() # Закрываем соединение с базой данных
 
-def save_experiment(date, real_data_path, gen_params, method1, method2, method3):
-    """Сохраняет результаты одного эксперимента в таблицу 'results'."""
-    conn = sqlite3.connect(DB_PATH) # Устанавливаем соединение с базой данных
-    cursor = conn.cursor() # Создаем объект курсора
-    cursor.execute("""
-        INSERT INTO results (date, real_data_path, gen_params, method1_result, method2_result, method3_result)
-        VALUES (?, ?, ?, ?, ?, ?) # Вставляем новую запись с параметрами
-    """, (date, real_data_path, gen_params, method1, method2, method3)) # Передаем значения параметров
-    conn.commit() # Сохраняем изменения
-    conn.close() # Закрываем соединение
+def save_experiment(date, real_data_path, gen_params, method1, method2, method3, stage_timings=None,
+                    true_count=None):
+    """Сохраняет результаты одного эксперимента в таблицу 'results'.
+
+    Строка попадает в буфер общего писателя и записывается пачкой вместе с соседними.
+    stage_timings - словарь замеров стадий моделей (сохраняется в JSON) или None;
+    true_count - истинное число клеток (по умолчанию из gen_params, если там целое число).
+    """
+    get_writer().add(date, real_data_path, gen_params, method1, method2, method3, stage_timings, true_count)
+
+def save_experiments(rows):
+    """Сохраняет пачку экспериментов одной транзакцией.
+
+    Args:
+        rows: Список кортежей (date, real_data_path, gen_params, method1, method2, method3[, stage_timings[, true_count]]).
+    """
+    writer = get_writer()
+    writer.add_many(rows)
+    writer.flush()
 
 def load_results():
     """Загружает все записи из таблицы 'results' и возвращает их в виде pandas DataFrame."""
+    import pandas as pd # Отложенный импорт: pandas нужен только для выгрузки в DataFrame
+    flush_pending() # Сначала записываем строки, ожидающие в буфере
     conn = sqlite3.connect(DB_PATH) # Устанавливаем соединение
     df = pd.read_sql_query("SELECT * FROM results", conn) # Выполняем SQL-запрос и загружаем результат в DataFrame
     conn.close() # Закрываем соединение
@@ -42,11 +287,159 @@ def load_results():
 
 def load_experiment_by_id(exp_id):
     """Загружает одну запись эксперимента по её уникальному идентификатору (id)."""
+    import pandas as pd # Отложенный импорт: pandas нужен только для выгрузки в DataFrame
+    flush_pending() # Сначала записываем строки, ожидающие в буфере
     conn = sqlite3.connect(DB_PATH) # Устанавливаем соединение
     df = pd.read_sql_query("SELECT * FROM results WHERE id = ?", conn, params=(exp_id,)) # Выполняем запрос с фильтром по id
     conn.close() # Закрываем соединение
     return df # Возвращаем DataFrame (будет содержать одну строку или быть пустым)
 
+def result_columns():
+    """Возвращает список колонок таблицы 'results' в порядке их объявления."""
+    conn = sqlite3.connect(DB_PATH)
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(results)")]
+    conn.close()
+    return columns
+
+def _where_clause(filters):
+    """Строит условие WHERE по словарю фильтров {колонка: значение} и список параметров.
+
+    Текстовые колонки фильтруются по префиксу через диапазон (col >= v AND col < v + U+10FFFF),
+    чтобы SQLite мог использовать индекс; числовые - по точному совпадению.
+    """
+    conditions, params = [], []
+    for column, value in (filters or {}).items():
+        if column not in SORTABLE_COLUMNS:
+            raise ValueError(f"Недопустимая колонка фильтра: {column}")
+        if column in TEXT_COLUMNS:
+            conditions.append(f"{column} >= ? AND {column} < ?")
+            params.extend([value, value + "\U0010ffff"])
+        else:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    return conditions, params
+
+def load_results_page(limit=200, order_by="id", descending=False, after=None, filters=None):
+    """Загружает одну страницу результатов с постраничной выборкой по ключу (keyset pagination).
+
+    Вместо OFFSET страница продолжается строго после последней показанной строки, поэтому
+    стоимость запроса не растет с номером страницы, а сортировка идет по индексу (колонка, id).
+
+    Args:
+        limit: Максимальное количество строк на странице.
+        order_by: Колонка сортировки из SORTABLE_COLUMNS.
+        descending: Сортировка по убыванию.
+        after: Ключ последней строки предыдущей страницы - кортеж (значение order_by, id) или None.
+        filters: Словарь фильтров {колонка: значение}.
+
+    Returns:
+        list: Список кортежей-строк со всеми колонками таблицы.
+    """
+    if order_by not in SORTABLE_COLUMNS:
+        raise ValueError(f"Недопустимая колонка сортировки: {order_by}")
+    flush_pending() # Строки из буфера общего писателя должны попасть на страницу, как и в load_results
+    conditions, params = _where_clause(filters)
+    direction = "DESC" if descending else "ASC"
+    op = "<" if descending else ">"
+
+    # Продолжение после ключа - последовательные отрезки порядка сортировки. SQLite ставит NULL первыми
+    # при ASC и последними при DESC, а сравнение кортежей с NULL дает NULL, поэтому строки с NULL
+    # выбираются отдельным отрезком; каждый отрезок - поиск по индексу (колонка, id), без OR
+    if after is None:
+        segments = [([], [])]
+    elif order_by == "id":
+        segments = [([f"id {op} ?"], [after[1]])]
+    else:
+        value, last_id = after
+        if value is None and not descending:
+            segments = [([f"{order_by} IS NULL", f"id {op} ?"], [last_id]), ([f"{order_by} IS NOT NULL"], [])]
+        elif value is None:
+            segments = [([f"{order_by} IS NULL", f"id {op} ?"], [last_id])]
+        elif not descending:
+            segments = [([f"({order_by}, id) {op} (?, ?)"], [value, last_id])]
+        else:
+            segments = [([f"({order_by}, id) {op} (?, ?)"], [value, last_id]), ([f"{order_by} IS NULL"], [])]
+
+    order = "id" if order_by == "id" else f"{order_by} {direction}, id"
+    rows = []
+    conn = sqlite3.connect(DB_PATH)
+    for segment_conditions, segment_params in segments:
+        where_conditions = conditions + segment_conditions
+        where = f"WHERE {' AND '.join(where_conditions)}" if where_conditions else ""
+        rows += conn.execute(f"SELECT * FROM results {where} ORDER BY {order} {direction} LIMIT ?",
+                             params + segment_params + [limit - len(rows)]).fetchall()
+        if len(rows) >= limit:
+            break
+    conn.close()
+    return rows
+
+def load_processed_paths(prefix=""):
+    """Возвращает множество путей реальных изображений, для которых уже есть результаты.
+
+    Args:
+        prefix: Префикс путей (например, корневая папка архива); выборка идет по индексу real_data_path.
+    """
+    flush_pending() # Строки, ожидающие в буфере общего писателя, тоже считаются обработанными
+    conn = sqlite3.connect(DB_PATH)
+    rows = conn.execute("SELECT DISTINCT real_data_path FROM results WHERE real_data_path >= ? AND real_data_path < ?",
+                        (prefix or "\x01", prefix + "\U0010ffff")).fetchall() # Пустой путь - синтетические изображения
+    conn.close()
+    return {row[0] for row in rows}
+
+def load_accuracy_summary(by_count=False):
+    """Возвращает точность методов из накопленной сводки accuracy_summary (без прохода по results).
+
+    Args:
+        by_count: Разбить по истинному числу клеток.
+
+    Returns:
+        list: Словари {"method", "true_count" (при by_count), "n", "mae", "bias", "rmse"}.
+    """
+    flush_pending()
+    group = "method, true_count" if by_count else "method"
+    conn = sqlite3.connect(DB_PATH)
+    rows = conn.execute(f"""
+        SELECT {group}, SUM(n), SUM(sum_abs_error) / SUM(n), SUM(sum_error) / SUM(n), SUM(sum_sq_error) / SUM(n)
+        FROM accuracy_summary GROUP BY {group} HAVING SUM(n) > 0 ORDER BY {group}
+    """).fetchall()
+    conn.close()
+    keys = ("method", "true_count", "n", "mae", "bias", "mse") if by_count else ("method", "n", "mae", "bias", "mse")
+    summary = []
+    for row in rows:
+        entry = dict(zip(keys, row))
+        entry["rmse"] = entry.pop("mse") ** 0.5
+        summary.append(entry)
+    return summary
+
+def load_results_since(last_id, filters=None, limit=1000):
+    """Загружает строки, добавленные после строки с идентификатором last_id (для живого обновления)."""
+    flush_pending()
+    conditions, params = _where_clause(filters)
+    conditions.append("id > ?")
+    conn = sqlite3.connect(DB_PATH)
+    rows = conn.execute(f"SELECT * FROM results WHERE {' AND '.join(conditions)} ORDER BY id LIMIT ?",
+                        params + [last_id, limit]).fetchall()
+    conn.close()
+    return rows
+
+def count_results(filters=None):
+    """Возвращает количество строк, удовлетворяющих фильтрам."""
+    flush_pending()
+    conditions, params = _where_clause(filters)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    conn = sqlite3.connect(DB_PATH)
+    count = conn.execute(f"SELECT COUNT(*) FROM results {where}", params).fetchone()[0]
+    conn.close()
+    return count
+
+def max_result_id():
+    """Возвращает наибольший id в таблице 'results' (0 для пустой таблицы)."""
+    flush_pending()
+    conn = sqlite3.connect(DB_PATH)
+    last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM results").fetchone()[0]
+    conn.close()
+    return last_id
+
 if __name__ == "__main__":
     """Пример использования функций модуля при запуске как основного скрипта."""
     init_db() # Инициализируем базу данных
@@ -0,0 +1,247 @@
+"""Экспорт синтетического набора данных в формате YOLO для обучения CNN.
+
+Изображения делятся на шарды по shard_size штук; каждый шард генерируется в одном из
+процессов-воркеров собственным потоком np.random.Generator, полученным из главного зерна
+через np.random.SeedSequence.spawn. Поэтому содержимое шарда зависит только от главного
+зерна и номера шарда, а не от числа воркеров и порядка выполнения.
+
+Структура результата:
+    out/images/{train,val}/shard_00000/0000000.png
+    out/labels/{train,val}/shard_00000/0000000.txt   (класс 0, центр и размеры, нормированные на размер кадра)
+    out/manifests/{train,val}_shard_00000.jsonl      (по строке на изображение)
+    out/manifest.jsonl                               (объединенный индекс)
+    out/data.yaml                                    (описание набора для ultralytics)
+    out/export.json                                  (параметры экспорта)
+
+Шард считается готовым, когда записан его манифест, поэтому прерванный экспорт при
+повторном запуске с теми же параметрами продолжается с недостающих шардов. Параметры
+первого запуска сохраняются в export.json; запуск в ту же папку с другими параметрами
+отклоняется, чтобы в набор не попали шарды старого экспорта.
+
+Запуск из папки src:
+    python export_dataset.py --out ../dataset_synth --num-images 100000 --val-fraction 0.1 --workers 8
+"""
+import os
+import json
+import time
+import argparse
+import multiprocessing as mp
+import cv2
+import numpy as np
+from utils.generator import BloodCellGenerator
+
+_generator = None # Генератор процесса-воркера, создается один раз в init_worker
+
+
+def init_worker(data_dir, image_size, blend_mode, background_pool, seed):
+    """Инициализация процесса-воркера: один генератор на процесс, источник случайных чисел задается на шард.
+
+    Начальный источник выводится из главного зерна и pid воркера: пул фонов начинает синтез
+    сразу при создании генератора, и с общим зерном все воркеры синтезировали бы одинаковые фоны.
+    """
+    global _generator
+    cv2.setNumThreads(1) # Параллелизм обеспечивается процессами, а не потоками OpenCV
+    _generator = BloodCellGenerator(data_dir, image_size=image_size, blend_mode=blend_mode,
+                                    background_pool=background_pool, rng=np.random.default_rng([seed, os.getpid()]))
+
+
+def yolo_labels(bboxes, width, height):
+    """Строки разметки YOLO (класс, x_центр, y_центр, ширина, высота в долях кадра) из рамок генератора."""
+    lines = []
+    for bbox in bboxes:
+        values = np.clip([bbox['center_x'] / width, bbox['center_y'] / height,
+                          bbox['width'] / width, bbox['height'] / height], 0, 1)
+        lines.append("0 " + " ".join(f"{v:.6f}" for v in values))
+    return "\n".join(lines) + ("\n" if lines else "")
+
+
+def shard_name(shard):
+    """Имя папки шарда."""
+    return f"shard_{shard:05d}"
+
+
+def manifest_path(out_dir, split, shard):
+    """Путь к манифесту шарда; файл существует только у полностью записанных шардов."""
+    return os.path.join(out_dir, "manifests", f"{split}_{shard_name(shard)}.jsonl")
+
+
+def export_shard(task):
+    """Генерирует и записывает один шард; возвращает (pid, split, номер шарда, число изображений, время работы).
+
+    Манифест шарда записывается во временный файл и переименовывается последним шагом:
+    его наличие означает, что все изображения и разметка шарда записаны.
+    """
+    out_dir, split, shard, first_index, count, seed, image_format = task
+    start = time.perf_counter()
+    _generator.set_rng(np.random.default_rng(seed))
+    images_dir = os.path.join(out_dir, "images", split, shard_name(shard))
+    labels_dir = os.path.join(out_dir, "labels", split, shard_name(shard))
+    os.makedirs(images_dir, exist_ok=True)
+    os.makedirs(labels_dir, exist_ok=True)
+
+    entries = []
+    for index in range(first_index, first_index + count):
+        image, bboxes = _generator.generate_image(return_bboxes=True)
+        height, width = image.shape[:2]
+        image_path = os.path.join(images_dir, f"{index:07d}.{image_format}")
+        label_path = os.path.join(labels_dir, f"{index:07d}.txt")
+        if not cv2.imwrite(image_path, image):
+            raise IOError(f"Не удалось записать изображение: {image_path}")
+        with open(label_path, "w") as f:
+            f.write(yolo_labels(bboxes, width, height))
+        entries.append({
+            "index": index,
+            "split": split,
+            "shard": shard,
+            "image": os.path.relpath(image_path, out_dir),
+            "label": os.path.relpath(label_path, out_dir),
+            "num_cells": len(bboxes),
+        })
+
+    path = manifest_path(out_dir, split, shard)
+    with open(path + ".tmp", "w") as f:
+        f.writelines(json.dumps(entry) + "\n" for entry in entries)
+    os.replace(path + ".tmp", path)
+    return os.getpid(), split, shard, count, time.perf_counter() - start
+
+
+def plan_shards(out_dir, num_images, val_fraction, shard_size, seed, image_format):
+    """Разбивает набор на шарды и выдает каждому независимое зерно из главного зерна.
+
+    Returns:
+        list: Задачи (out_dir, split, номер шарда, индекс первого изображения, число изображений, зерно, формат).
+    """
+    num_val = int(round(num_images * val_fraction))
+    splits = [("train", 0, num_images - num_val), ("val", num_images - num_val, num_val)]
+    tasks = []
+    for split, first, count in splits:
+        for shard, offset in enumerate(range(0, count, shard_size)):
+            tasks.append([out_dir, split, shard, first + offset, min(shard_size, count - offset)])
+    # Потоки случайных чисел шардов независимы и определяются только главным зерном и порядком шардов
+    seeds = np.random.SeedSequence(seed).spawn(len(tasks))
+    return [tuple(task) + (seeds[k], image_format) for k, task in enumerate(tasks)]
+
+
+def check_params(out_dir, params):
+    """Записывает параметры экспорта в export.json при первом запуске, а при продолжении сверяет их.
+
+    Raises:
+        ValueError: Папка содержит экспорт с другими или неизвестными параметрами.
+    """
+    path = os.path.join(out_dir, "export.json")
+    if os.path.exists(path):
+        with open(path) as f:
+            saved = json.load(f)
+        if saved != params:
+            changed = ", ".join(f"{key}: {saved.get(key)!r} -> {params.get(key)!r}"
+                                for key in sorted(set(saved) | set(params)) if saved.get(key) != params.get(key))
+            raise ValueError(f"В {out_dir} уже есть экспорт с другими параметрами ({changed}); "
+                             f"укажите другую папку или удалите прежний экспорт")
+        return
+    if os.listdir(os.path.join(out_dir, "manifests")):
+        raise ValueError(f"В {out_dir} есть шарды экспорта с неизвестными параметрами (нет export.json); "
+                         f"укажите другую папку или удалите прежний экспорт")
+    with open(path + ".tmp", "w") as f:
+        json.dump(params, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def write_index(out_dir, tasks):
+    """Собирает манифесты шардов в общий manifest.jsonl и записывает data.yaml для ultralytics."""
+    with open(os.path.join(out_dir, "manifest.jsonl"), "w") as index:
+        for _, split, shard, *_ in tasks:
+            with open(manifest_path(out_dir, split, shard)) as f:
+                index.write(f.read())
+    with open(os.path.join(out_dir, "data.yaml"), "w") as f:
+        f.write(f"path: {os.path.abspath(out_dir)}\n")
+        f.write("train: images/train\n")
+        f.write("val: images/val\n")
+        f.write("names:\n  0: cell\n")
+
+
+def export_dataset(out_dir, num_images, val_fraction=0.1, workers=None, shard_size=1000, seed=0,
+                   image_size=(640, 640), blend_mode="seamless", background_pool=0, image_format="png"):
+    """Экспортирует набор данных; уже готовые шарды (с записанным манифестом) пропускаются.
+
+    Args:
+        out_dir: Папка набора данных.
+        num_images: Общее количество изображений (обучающая и проверочная выборки).
+        val_fraction: Доля проверочной выборки.
+        workers: Количество процессов-воркеров (по умолчанию число ядер).
+        shard_size: Количество изображений в шарде.
+        seed: Главное зерно, из которого выводятся зерна шардов.
+        image_size: Размер изображений (ширина, высота).
+        blend_mode: Режим вставки клеток генератора ("seamless" или "alpha").
+        background_pool: Размер пула фонов каждого воркера (0 - без пула). Пул ускоряет генерацию,
+            но его содержимое зависит от времени выполнения, и экспорт перестает быть воспроизводимым.
+        image_format: Расширение файлов изображений ("png" или "jpg").
+
+    Returns:
+        dict: Статистика воркеров {pid: (число изображений, время работы)}.
+
+    Raises:
+        ValueError: В out_dir уже есть экспорт с другими параметрами (см. check_params).
+    """
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    data_dir = os.path.join(base_dir, "data")
+    os.makedirs(os.path.join(out_dir, "manifests"), exist_ok=True)
+    # Все параметры, от которых зависят содержимое и разбиение шардов
+    check_params(out_dir, {"num_images": num_images, "val_fraction": val_fraction, "shard_size": shard_size,
+                           "seed": seed, "image_size": list(image_size), "blend_mode": blend_mode,
+                           "background_pool": background_pool, "image_format": image_format})
+
+    tasks = plan_shards(out_dir, num_images, val_fraction, shard_size, seed, image_format)
+    pending = [task for task in tasks if not os.path.exists(manifest_path(out_dir, task[1], task[2]))]
+    print(f"Шардов: {len(tasks)}, готово ранее: {len(tasks) - len(pending)}, к генерации: {len(pending)}")
+
+    workers = workers or os.cpu_count()
+    worker_stats = {} # pid -> [число изображений, время работы]
+    done = sum(task[4] for task in tasks) - sum(task[4] for task in pending)
+    started = time.perf_counter()
+    if pending:
+        # spawn: воркеры не наследуют потоки и состояние генератора случайных чисел родителя
+        ctx = mp.get_context("spawn")
+        with ctx.Pool(min(workers, len(pending)), initializer=init_worker,
+                      initargs=(data_dir, tuple(image_size), blend_mode, background_pool, seed)) as pool:
+            for pid, split, shard, count, busy in pool.imap_unordered(export_shard, pending):
+                stats = worker_stats.setdefault(pid, [0, 0.0])
+                stats[0] += count
+                stats[1] += busy
+                done += count
+                print(f"[{split} {shard_name(shard)}] {count} изображений за {busy:.1f} с "
+                      f"({count / busy:.1f} изобр./с), всего {done}/{num_images}")
+    wall_time = time.perf_counter() - started
+
+    write_index(out_dir, tasks)
+
+    if worker_stats:
+        print("Пропускная способность воркеров (изображений/с):")
+        for pid, (count, busy) in sorted(worker_stats.items()):
+            print(f"  воркер {pid:<8} изображений: {count:<8} {count / busy:8.2f}")
+        generated = sum(count for count, _ in worker_stats.values())
+        print(f"  итого: {generated / wall_time:.2f} изображений/с за {wall_time:.1f} с")
+    return {pid: tuple(stats) for pid, stats in worker_stats.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", required=True, help="папка набора данных")
+    parser.add_argument("--num-images", type=int, required=True, help="общее количество изображений")
+    parser.add_argument("--val-fraction", type=float, default=0.1, help="доля проверочной выборки")
+    parser.add_argument("--workers", type=int, default=None, help="число процессов-воркеров")
+    parser.add_argument("--shard-size", type=int, default=1000, help="изображений в шарде")
+    parser.add_argument("--seed", type=int, default=0, help="главное зерно")
+    parser.add_argument("--image-size", type=int, default=640, help="сторона изображения")
+    parser.add_argument("--blend-mode", choices=["seamless", "alpha"], default="seamless",
+                        help="вставка клеток: бесшовное клонирование или быстрое альфа-смешивание")
+    parser.add_argument("--background-pool", type=int, default=0,
+                        help="размер пула фонов воркера; ускоряет генерацию, но нарушает воспроизводимость")
+    parser.add_argument("--format", choices=["png", "jpg"], default="png", help="формат изображений")
+    args = parser.parse_args()
+
+    try:
+        export_dataset(args.out, args.num_images, val_fraction=args.val_fraction, workers=args.workers,
+                       shard_size=args.shard_size, seed=args.seed, image_size=(args.image_size, args.image_size),
+                       blend_mode=args.blend_mode, background_pool=args.background_pool, image_format=args.format)
+    except ValueError as e:
+        raise SystemExit(str(e))
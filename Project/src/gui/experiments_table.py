@@ -0,0 +1,164 @@
+import tkinter as tk
+from tkinter import ttk
+from experiment_db import (init_db, result_columns, load_results_page, load_results_since,
+                           count_results, max_result_id, SORTABLE_COLUMNS)
+
+
+class ExperimentsTable:
+    """Окно таблицы экспериментов с постраничной подгрузкой строк.
+
+    В Treeview находятся только уже просмотренные страницы: следующая страница запрашивается
+    из SQLite по ключу последней строки, когда прокрутка подходит к концу таблицы. Сортировка
+    (щелчок по заголовку) и фильтрация выполняются запросом к БД по индексам, а строки,
+    записанные работающим экспериментом, периодически дописываются в таблицу.
+    """
+    PAGE_SIZE = 200 # Количество строк, загружаемых за один запрос
+    PREFETCH_THRESHOLD = 0.9 # Доля прокрутки, после которой подгружается следующая страница
+    POLL_INTERVAL_MS = 2000 # Период проверки новых строк в БД
+
+    def __init__(self, root):
+        init_db() # Создает недостающие индексы в уже существующей БД
+        self.columns = result_columns()
+        self.order_by = "id" # Текущая колонка сортировки
+        self.descending = False # Направление сортировки
+        self.filters = {} # Активные фильтры {колонка: значение}
+        self.last_key = None # Ключ (значение сортировки, id) последней загруженной строки
+        self.exhausted = False # Все строки для текущего запроса уже загружены
+        self.max_id = max_result_id() # Наибольший id, известный таблице (для живого обновления)
+        self.poll_job = None
+
+        self.window = tk.Toplevel(root) # Создаем новое окно верхнего уровня
+        self.window.title("Результаты экспериментов") # Устанавливаем заголовок окна
+        self.window.geometry("800x600") # Устанавливаем начальный размер окна
+        self.window.bind("<Destroy>", self._on_destroy)
+        self.setup_ui()
+        self.reload()
+        self.poll_job = self.window.after(self.POLL_INTERVAL_MS, self._poll_new_rows)
+
+    def setup_ui(self):
+        # Панель фильтра: колонка, значение и кнопки применения/сброса
+        filter_bar = ttk.Frame(self.window)
+        filter_bar.pack(fill=tk.X, padx=10, pady=(10, 0))
+
+        ttk.Label(filter_bar, text="Фильтр:").pack(side=tk.LEFT)
+        self.filter_column = ttk.Combobox(filter_bar, values=list(SORTABLE_COLUMNS), state="readonly", width=18)
+        self.filter_column.set("gen_params")
+        self.filter_column.pack(side=tk.LEFT, padx=5)
+        self.filter_value = ttk.Entry(filter_bar, width=25)
+        self.filter_value.pack(side=tk.LEFT, padx=5)
+        self.filter_value.bind("<Return>", lambda _: self.apply_filter())
+        ttk.Button(filter_bar, text="Применить", command=self.apply_filter).pack(side=tk.LEFT, padx=5)
+        ttk.Button(filter_bar, text="Сбросить", command=self.reset_filter).pack(side=tk.LEFT)
+
+        self.status_label = ttk.Label(filter_bar, text="")
+        self.status_label.pack(side=tk.RIGHT)
+
+        # Создаем фрейм-контейнер с внутренними отступами
+        container = ttk.Frame(self.window)
+        container.pack(fill=tk.BOTH, expand=True, padx=10, pady=10) # Растягиваем контейнер на все окно
+
+        self.tree = ttk.Treeview(container, columns=self.columns, show='headings')
+        for col in self.columns:
+            # Сортировка по щелчку доступна только для колонок с индексом
+            command = (lambda c=col: self.sort_by(c)) if col in SORTABLE_COLUMNS else ""
+            self.tree.heading(col, text=col, command=command)
+            self.tree.column(col, width=120, anchor='center') # Устанавливаем ширину и выравнивание столбцов
+
+        # Вертикальная прокрутка дополнительно сообщает о приближении к концу загруженных строк
+        self.scrollbar_y = ttk.Scrollbar(container, orient=tk.VERTICAL, command=self.tree.yview)
+        scrollbar_x = ttk.Scrollbar(container, orient=tk.HORIZONTAL, command=self.tree.xview)
+        self.tree.configure(yscrollcommand=self._on_scroll, xscrollcommand=scrollbar_x.set)
+
+        # Размещаем таблицу и полосы прокрутки внутри контейнера
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar_y.grid(row=0, column=1, sticky="ns")
+        scrollbar_x.grid(row=1, column=0, sticky="ew")
+
+        # Настраиваем веса для растяжения таблицы и полос прокрутки
+        container.columnconfigure(0, weight=1)
+        container.rowconfigure(0, weight=1)
+
+    def reload(self):
+        """Очищает таблицу и загружает первую страницу для текущей сортировки и фильтров."""
+        self.tree.delete(*self.tree.get_children())
+        self.last_key = None
+        self.exhausted = False
+        self.load_next_page()
+        self.update_status()
+
+    def load_next_page(self):
+        """Запрашивает из БД следующую страницу и добавляет её в конец таблицы."""
+        if self.exhausted:
+            return
+        rows = load_results_page(limit=self.PAGE_SIZE, order_by=self.order_by, descending=self.descending,
+                                 after=self.last_key, filters=self.filters)
+        for row in rows:
+            self.tree.insert('', tk.END, iid=str(row[0]), values=row)
+        if rows:
+            last = rows[-1]
+            self.last_key = (last[self.columns.index(self.order_by)], last[0])
+        self.exhausted = len(rows) < self.PAGE_SIZE
+
+    def update_status(self):
+        """Показывает количество загруженных и найденных строк."""
+        total = count_results(self.filters)
+        self.status_label.configure(text=f"Показано {len(self.tree.get_children())} из {total}")
+
+    def sort_by(self, column):
+        """Сортирует таблицу по колонке; повторный щелчок меняет направление сортировки."""
+        self.descending = not self.descending if column == self.order_by else False
+        self.order_by = column
+        self.reload()
+
+    def apply_filter(self):
+        """Применяет фильтр из панели над таблицей."""
+        column = self.filter_column.get()
+        value = self.filter_value.get().strip()
+        self.filters = {}
+        if value:
+            if column in ("id", "method1_result", "method2_result", "method3_result"):
+                if not value.lstrip("-").isdigit():
+                    self.status_label.configure(text="Для этой колонки нужно целое число")
+                    return
+                value = int(value)
+            self.filters[column] = value
+        self.reload()
+
+    def reset_filter(self):
+        """Снимает фильтр и перезагружает таблицу."""
+        self.filter_value.delete(0, tk.END)
+        self.filters = {}
+        self.reload()
+
+    def _on_scroll(self, first, last):
+        """Обработчик прокрутки: двигает полосу прокрутки и подгружает следующую страницу."""
+        self.scrollbar_y.set(first, last)
+        if float(last) >= self.PREFETCH_THRESHOLD and not self.exhausted:
+            self.load_next_page()
+            self.update_status()
+
+    def _poll_new_rows(self):
+        """Дописывает строки, появившиеся в БД после последней проверки."""
+        rows = load_results_since(self.max_id, filters=self.filters)
+        if rows:
+            self.max_id = rows[-1][0]
+            if self.order_by == "id":
+                # При сортировке по id новые строки идут в начало (по убыванию) или в конец (по возрастанию);
+                # в последнем случае их дописываем только когда все предыдущие страницы уже загружены
+                for row in rows:
+                    if self.tree.exists(str(row[0])): # Строка уже попала в таблицу с очередной страницей
+                        continue
+                    if self.descending:
+                        self.tree.insert('', 0, iid=str(row[0]), values=row)
+                    elif self.exhausted:
+                        self.tree.insert('', tk.END, iid=str(row[0]), values=row)
+                        self.last_key = (row[0], row[0])
+            # При другой сортировке новые строки появятся при подгрузке соответствующих страниц
+            self.update_status()
+        self.poll_job = self.window.after(self.POLL_INTERVAL_MS, self._poll_new_rows)
+
+    def _on_destroy(self, event):
+        """Останавливает периодический опрос БД при закрытии окна."""
+        if event.widget is self.window and self.poll_job is not None:
+            self.window.after_cancel(self.poll_job)
+            self.poll_job = None
@@ -4,28 +4,51 @@ from PIL import Image, ImageTk
 import cv2
 import numpy as np
 import os
-from utils.generator import BloodCellGenerator
-from models.ml_model import MLModel
-from models.clustering_model import ClusteringModel
-from models.cnn_model import CNNModel
-from experiment_db import load_results
-from preprocessing.filters import ImageFilters
+import threading
+from collections import OrderedDict
+from models.registry import ModelRegistry
+from models.prediction_cache import PredictionCache
+from gui.experiments_table import ExperimentsTable
+from gui.task_runner import TaskRunner
+from preprocessing.filter_chain import FilterChain
 
 class MainWindow:
+    PHOTO_CACHE_SIZE = 16 # Сколько последних PhotoImage хранить для повторного показа без пересоздания
+    FILTERS = {
+        "Размытие": "blur",
+        "Резкость": "sharpen",
+        "Увеличение контраста": "contrast",
+    }
+    
     def __init__(self, root):
         self.root = root
         self.root.title("Анализатор клеток крови") # Устанавливаем заголовок окна
-        self.current_image = None
+        self.current_image = None # Исходное изображение; фильтры его не изменяют
+        # Цепочка фильтров над исходным изображением: предпросмотр считается на уменьшенной копии,
+        # полное разрешение - только перед анализом
+        self.filter_chain = FilterChain()
+        self.photo_cache = OrderedDict() # Ключ цепочки фильтров -> готовый PhotoImage
         self.setup_ui()
         
-        # Инициализация генератора изображений
-        data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data")
-        self.generator = BloodCellGenerator(data_dir, image_size=(640, 640))
+        # Пул фоновых задач: генерация, фильтрация и анализ не блокируют цикл событий Tk
+        self.tasks = TaskRunner(self.root, max_workers=3, on_busy_change=self._on_busy_change)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
-        # Инициализация моделей анализа
-        self.ml_model = MLModel()
-        self.clustering_model = ClusteringModel()
-        self.cnn_model = CNNModel()
+        # Генератор и модели импортируются и создаются при первом обращении (или прогреваются в фоне),
+        # поэтому окно появляется без ожидания загрузки torch, sklearn и ресурсов генератора
+        data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data")
+        self.registry = ModelRegistry()
+        # Пул фонов синтезируется в фоне после создания генератора, дальше кадр генерируется за доли секунды
+        self.registry.configure("generator", data_dir=data_dir, image_size=(640, 640), background_pool=8)
+        self.models = {
+            "Классическое ML": "ml",
+            "Кластеризация": "clustering",
+            "Свёрточная сеть": "cnn",
+        }
+        # Модели не рассчитаны на одновременные вызовы из нескольких потоков
+        self.model_locks = {method: threading.Lock() for method in self.models}
+        # Повторный анализ того же изображения теми же моделями берется из кэша (predictions.db)
+        self.prediction_cache = PredictionCache()
         
     def setup_ui(self):
         # Создание основного фрейма с внутренними отступами
@@ -72,6 +95,9 @@ class MainWindow:
         # Кнопка для применения выбранного фильтра к текущему изображению
         ttk.Button(self.filter_frame, text="Применить фильтр", 
                   command=self.apply_filter).grid(row=1, column=0, padx=5, pady=5, sticky="ew") # Растягиваем по ширине
+        # Кнопка для отмены последнего примененного фильтра
+        ttk.Button(self.filter_frame, text="Отменить последний фильтр", 
+                  command=self.undo_filter).grid(row=2, column=0, padx=5, pady=5, sticky="ew") # Растягиваем по ширине
         
         # Секция выбора метода анализа
         self.method_frame = ttk.LabelFrame(self.right_panel, text="Метод анализа", padding="10")
@@ -87,6 +113,9 @@ class MainWindow:
         # Кнопка для запуска анализа текущего изображения выбранным методом
         ttk.Button(self.method_frame, text="🔍 Анализировать", 
                   command=self.analyze_image).grid(row=1, column=0, padx=5, pady=5, sticky="ew") # Растягиваем по ширине
+        # Кнопка для одновременного запуска всех трех методов
+        ttk.Button(self.method_frame, text="⚡ Все методы параллельно", 
+                  command=self.analyze_all).grid(row=2, column=0, padx=5, pady=5, sticky="ew") # Растягиваем по ширине
         
         # Секция отображения результатов анализа
         self.result_frame = ttk.LabelFrame(self.right_panel, text="Результаты анализа", padding="10")
@@ -95,6 +124,21 @@ class MainWindow:
         self.result_label = ttk.Label(self.result_frame, text="", font=("Arial", 12)) # Метка для отображения результатов
         self.result_label.grid(row=0, column=0, padx=5, pady=5) # Размещаем метку
         
+        # Результаты всех трех методов рядом друг с другом
+        self.method_results_frame = ttk.Frame(self.result_frame)
+        self.method_results_frame.grid(row=1, column=0, sticky="ew")
+        self.method_labels = {}
+        for column, method in enumerate(methods):
+            label = ttk.Label(self.method_results_frame, text="", anchor="center")
+            label.grid(row=0, column=column, padx=5, pady=5)
+            self.method_labels[method] = label
+        
+        # Индикатор выполнения фоновых задач
+        self.progress = ttk.Progressbar(self.result_frame, mode="indeterminate")
+        self.progress.grid(row=2, column=0, padx=5, pady=5, sticky="ew")
+        self.status_label = ttk.Label(self.result_frame, text="")
+        self.status_label.grid(row=3, column=0, padx=5)
+        
         # Кнопка для открытия окна с таблицей всех экспериментов
         ttk.Button(self.right_panel, text="📊 Таблица экспериментов", 
                   command=self.show_experiments_table).grid(row=4, column=0, padx=5, pady=5, sticky="ew") # Растягиваем по ширине
@@ -111,47 +155,12 @@ class MainWindow:
         self.image_frame.rowconfigure(0, weight=1)
         
     def show_experiments_table(self):
-        # Загружаем данные всех экспериментов из БД
-        df = load_results()
-        window = tk.Toplevel(self.root) # Создаем новое окно верхнего уровня
-        window.title("Результаты экспериментов") # Устанавливаем заголовок окна
-        window.geometry("800x600") # Устанавливаем начальный размер окна
-        
-        # Создаем фрейм-контейнер с внутренними отступами
-        container = ttk.Frame(window)
-        container.pack(fill=tk.BOTH, expand=True, padx=10, pady=10) # Растягиваем контейнер на все окно
-        
-        # Создаем виджет Treeview для отображения данных в виде таблицы
-        tree = ttk.Treeview(container, columns=list(df.columns), show='headings')
-        
-        # Добавляем заголовки столбцов на основе названий колонок DataFrame
-        for col in df.columns:
-            tree.heading(col, text=col)
-            tree.column(col, width=120, anchor='center') # Устанавливаем ширину и выравнивание столбцов
-        
-        # Заполняем таблицу данными из DataFrame
-        for _, row in df.iterrows():
-            tree.insert('', tk.END, values=list(row)) # Вставляем каждую строку как новую запись в таблице
-            
-        # Добавляем вертикальную и горизонтальную полосы прокрутки к таблице
-        scrollbar_y = ttk.Scrollbar(container, orient=tk.VERTICAL, command=tree.yview)
-        scrollbar_x = ttk.Scrollbar(container, orient=tk.HORIZONTAL, command=tree.xview)
-        tree.configure(yscrollcommand=scrollbar_y.set, xscrollcommand=scrollbar_x.set)
-        
-        # Размещаем таблицу и полосы прокрутки внутри контейнера
-        tree.grid(row=0, column=0, sticky="nsew")
-        scrollbar_y.grid(row=0, column=1, sticky="ns")
-        scrollbar_x.grid(row=1, column=0, sticky="ew")
-        
-        # Настраиваем веса для растяжения таблицы и полос прокрутки
-        container.columnconfigure(0, weight=1)
-        container.rowconfigure(0, weight=1)
-    
-    def display_image(self, image):
-        """Отображает изображение в GUI"""
-        if image is None:
-            return
-            
+        """Открывает окно с постраничной таблицей всех экспериментов."""
+        ExperimentsTable(self.root)
+    
+    @staticmethod
+    def _display_array(image):
+        """Готовит изображение OpenCV к показу: BGR -> RGB и уменьшение до 800 пикселей по большей стороне."""
         # Конвертируем изображение из формата BGR (OpenCV) в RGB (PIL)
         if len(image.shape) == 3 and image.shape[2] == 3:
             image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
@@ -164,56 +173,132 @@ class MainWindow:
             new_width = int(width * scale)
             new_height = int(height * scale)
             image = cv2.resize(image, (new_width, new_height)) # Изменяем размер с сохранением пропорций
-            
+        return image
+    
+    def display_image(self, image, key=None):
+        """Отображает изображение в GUI; изображение с уже показанным ключом key берется из кэша PhotoImage."""
+        if image is None:
+            return
+        if not self._show_cached(key):
+            self._show_photo(self._display_array(image), key)
+    
+    def _show_cached(self, key):
+        """Показывает PhotoImage из кэша, если он там есть."""
+        photo = self.photo_cache.get(key) if key is not None else None
+        if photo is None:
+            return False
+        self.photo_cache.move_to_end(key)
+        self.image_label.configure(image=photo)
+        self.image_label.image = photo
+        return True
+    
+    def _show_photo(self, image, key=None):
+        """Создает PhotoImage из подготовленного RGB-массива, показывает и кэширует его под ключом key."""
         # Конвертируем изображение в формат, поддерживаемый Tkinter
         image = Image.fromarray(image) # Преобразуем numpy array в объект Image
         photo = ImageTk.PhotoImage(image=image) # Создаем PhotoImage объект
+        if key is not None:
+            self.photo_cache[key] = photo
+            while len(self.photo_cache) > self.PHOTO_CACHE_SIZE:
+                self.photo_cache.popitem(last=False)
         
         # Обновляем изображение в метке
         self.image_label.configure(image=photo) # Присваиваем новый PhotoImage метке
         self.image_label.image = photo  # Сохраняем ссылку на объект PhotoImage, чтобы избежать сборки мусора
     
+    @property
+    def generator(self):
+        """Генератор изображений (создается при первом обращении)."""
+        return self.registry.get("generator")
+    
+    def warm_up(self):
+        """Прогревает генератор и модели в фоновом потоке после появления окна."""
+        self.registry.warm_up(["generator", "ml", "clustering", "cnn"])
+    
+    def _on_busy_change(self, active):
+        """Показывает индикатор занятости, пока в пуле есть незавершенные задачи."""
+        if active > 0:
+            self.progress.start(10)
+            self.status_label.configure(text=f"Выполняется задач: {active}")
+        else:
+            self.progress.stop()
+            self.status_label.configure(text="")
+    
+    def _show_error(self, error):
+        """Показывает ошибку фоновой задачи в области результатов."""
+        self.result_label.configure(text=f"Ошибка: {error}", font=("Arial", 12))
+    
+    def _set_image(self, image):
+        """Делает изображение текущим; фильтры и анализ прежнего изображения становятся устаревшими."""
+        if image is None:
+            self._show_error("не удалось загрузить изображение")
+            return
+        self.tasks.cancel("filter")
+        self.tasks.cancel("analysis")
+        self.current_image = image
+        self.filter_chain.set_image(image) # Заодно строится уменьшенная копия для предпросмотра
+        self.filter_combo.set("Без фильтра")
+        self.refresh_preview()
+    
     def load_image(self):
         """Открывает диалоговое окно для выбора файла изображения и загружает его."""
         file_path = filedialog.askopenfilename(
             filetypes=[("Image files", "*.png *.jpg *.jpeg *.bmp *.gif")] # Фильтр по типам файлов
         )
         if file_path:
-            self.current_image = cv2.imread(file_path) # Загружаем изображение с помощью OpenCV
-            self.display_image(self.current_image) # Отображаем загруженное изображение
+            # Загружаем изображение с помощью OpenCV в фоновом потоке; прежняя загрузка/генерация отменяется
+            self.tasks.cancel("image")
+            self.tasks.submit("image", cv2.imread, file_path, on_success=self._set_image, on_error=self._show_error)
     
     def generate_image(self):
         """Генерирует новое синтетическое изображение клеток крови."""
-        self.current_image = self.generator.generate_image() # Генерируем изображение
-        self.display_image(self.current_image) # Отображаем сгенерированное изображение
+        self.tasks.cancel("image")
+        self.tasks.submit("image", lambda: self.generator.generate_image(), # Генерируем изображение в фоновом потоке
+                          on_success=self._set_image, on_error=self._show_error)
+    
+    def _render_preview(self):
+        """Выполняется в рабочем потоке: вычисляет цепочку на уменьшенной копии и готовит её к показу."""
+        key, preview = self.filter_chain.render()
+        return self._display_array(preview), key
+    
+    def refresh_preview(self):
+        """Показывает текущую цепочку фильтров; уже показанный вариант берется из кэша без пересчета."""
+        self.tasks.cancel("filter")
+        if self._show_cached(self.filter_chain.key()):
+            return
+        self.tasks.submit("filter", self._render_preview,
+                          on_success=lambda result: self._show_photo(*result), on_error=self._show_error)
+    
+    def _filters_changed(self):
+        """Цепочка фильтров изменилась: анализ прежнего результата устарел, предпросмотр обновляется."""
+        self.tasks.cancel("analysis")
+        self.refresh_preview()
     
     def apply_filter(self):
-        """Применяет выбранный фильтр к текущему изображению."""
+        """Добавляет выбранный фильтр в цепочку; "Без фильтра" возвращает исходное изображение."""
         if self.current_image is None:
             return # Ничего не делаем, если изображение не загружено
             
         filter_name = self.filter_var.get() # Получаем название выбранного фильтра
         if filter_name == "Без фильтра":
-            # Здесь можно добавить логику для сброса фильтров, если нужно вернуться к исходному изображению
-            # Но пока просто выходим, так как display_image всегда показывает текущее self.current_image
-            return
-        
-        image = self.current_image # Работаем с текущим изображением
-        if filter_name == "Размытие":
-            filtered = ImageFilters.blur(image)
-        elif filter_name == "Резкость":
-            filtered = ImageFilters.sharpen(image)
-        elif filter_name == "Увеличение контраста":
-            filtered = ImageFilters.contrast(image)
+            self.filter_chain.clear()
         else:
-            filtered = image # Если фильтр не опознан, используем исходное изображение
-        self.display_image(filtered) # Отображаем отфильтрованное изображение
-        # Важно: Если мы хотим, чтобы фильтры применялись последовательно,
-        # нужно сохранять результат фильтрации в self.current_image.
-        # Если каждый фильтр должен применяться к исходному изображению,
-        # нужно хранить исходное изображение отдельно.
-        # Текущая реализация применяет фильтр к последнему отображенному изображению.
-        self.current_image = filtered # Обновляем текущее изображение на отфильтрованное
+            self.filter_chain.append(self.FILTERS[filter_name])
+        self._filters_changed()
+    
+    def undo_filter(self):
+        """Убирает последний фильтр цепочки; предыдущий результат берется из кэша."""
+        if self.current_image is None or not self.filter_chain.stages:
+            return
+        self.filter_chain.remove()
+        self._filters_changed()
+    
+    def _run_model(self, method):
+        """Выполняется в рабочем потоке: запускает модель метода на результате фильтров в полном разрешении."""
+        image = self.filter_chain.result() # Полное разрешение считается один раз и кэшируется цепочкой
+        model = self.registry.get(self.models[method])
+        with self.model_locks[method]:
+            return self.prediction_cache.predict(model, image)
     
     def analyze_image(self):
         """Запускает анализ текущего изображения выбранным методом."""
@@ -221,19 +306,36 @@ class MainWindow:
             return # Ничего не делаем, если изображение не загружено
             
         method = self.method_var.get() # Получаем название выбранного метода анализа
-        count = 0 # Переменная для хранения результата подсчета клеток
-        
-        # try:
-        # Выбираем и запускаем соответствующую модель
-        if method == "Классическое ML":
-            count = self.ml_model.predict(self.current_image)
-        elif method == "Кластеризация":
-            count = self.clustering_model.predict(self.current_image)
-        elif method == "Свёрточная сеть":
-            count = self.cnn_model.predict(self.current_image)
-            
-        # Обновляем метку с результатом анализа
-        self.result_label.configure(
-            text=f"Найдено клеток: {count}", # Форматируем строку результата
-            font=("Arial", 12) # Устанавливаем шрифт
-        )
+        self.tasks.cancel("analysis") # Предыдущий анализ больше не нужен
+        self.result_label.configure(text="Анализ...", font=("Arial", 12))
+        
+        def show_count(count):
+            # Обновляем метку с результатом анализа
+            self.result_label.configure(
+                text=f"Найдено клеток: {count}", # Форматируем строку результата
+                font=("Arial", 12) # Устанавливаем шрифт
+            )
+        
+        self.tasks.submit("analysis", self._run_model, method,
+                          on_success=show_count, on_error=self._show_error)
+    
+    def analyze_all(self):
+        """Запускает все три метода параллельно и показывает результаты рядом."""
+        if self.current_image is None:
+            return # Ничего не делаем, если изображение не загружено
+        
+        self.tasks.cancel("analysis")
+        self.result_label.configure(text="Анализ всеми методами...", font=("Arial", 12))
+        for method, label in self.method_labels.items():
+            label.configure(text=f"{method}:\n...")
+            self.tasks.submit(
+                "analysis", self._run_model, method,
+                on_success=lambda count, m=method: self.method_labels[m].configure(text=f"{m}:\n{count}"),
+                on_error=self._show_error,
+            )
+    
+    def on_close(self):
+        """Останавливает пул фоновых задач и закрывает окно."""
+        self.tasks.shutdown()
+        self.prediction_cache.close()
+        self.root.destroy()
@@ -0,0 +1,85 @@
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TaskRunner:
+    """Выполняет тяжелые операции в пуле потоков и возвращает результаты в поток Tk.
+
+    Tkinter не потокобезопасен, поэтому рабочие потоки только кладут готовые futures
+    в очередь, а обратные вызовы выполняются в цикле событий через root.after.
+    Задачи объединяются в каналы (например, "image" или "analysis"): cancel(channel)
+    отменяет еще не начатые задачи канала, а результаты уже запущенных отбрасываются
+    как устаревшие. OpenCV, torch и NumPy отпускают GIL во время вычислений, поэтому
+    потоков достаточно для параллельной работы моделей.
+    """
+    POLL_INTERVAL_MS = 50 # Период проверки очереди готовых задач
+
+    def __init__(self, root, max_workers=3, on_busy_change=None):
+        """
+        Args:
+            root: Корневое окно Tk.
+            max_workers: Размер пула потоков.
+            on_busy_change: Вызывается в потоке Tk с числом выполняющихся задач при его изменении.
+        """
+        self.root = root
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.on_busy_change = on_busy_change
+        self.done = queue.Queue() # Готовые задачи, ожидающие обработки в потоке Tk
+        self.generations = {} # Номер актуального поколения задач для каждого канала
+        self.pending = {} # Незавершенные futures каждого канала
+        self.active = 0 # Количество незавершенных задач
+        self.poll_job = self.root.after(self.POLL_INTERVAL_MS, self._poll)
+
+    def submit(self, channel, fn, *args, on_success=None, on_error=None):
+        """Запускает fn(*args) в пуле; on_success(result) или on_error(exc) вызываются в потоке Tk."""
+        generation = self.generations.setdefault(channel, 0)
+        future = self.executor.submit(fn, *args)
+        self.pending.setdefault(channel, set()).add(future)
+        self._set_active(self.active + 1)
+        # Обратный вызов future выполняется в рабочем потоке, поэтому только передаем результат в очередь
+        future.add_done_callback(lambda f: self.done.put((channel, generation, f, on_success, on_error)))
+        return future
+
+    def cancel(self, channel):
+        """Делает все задачи канала устаревшими; еще не начатые задачи снимаются с очереди пула."""
+        self.generations[channel] = self.generations.get(channel, 0) + 1
+        for future in self.pending.get(channel, ()):
+            future.cancel() # Для уже запущенных задач не действует - их результат будет отброшен
+
+    def is_busy(self, channel=None):
+        """Есть ли незавершенные задачи (во всех каналах или в указанном)."""
+        if channel is None:
+            return self.active > 0
+        return bool(self.pending.get(channel))
+
+    def shutdown(self):
+        """Отменяет ожидающие задачи и останавливает пул, не дожидаясь выполняющихся."""
+        self.root.after_cancel(self.poll_job)
+        # Ожидающие задачи снимаются вручную: shutdown(cancel_futures=True) появился только в Python 3.9
+        for channel in list(self.pending):
+            self.cancel(channel)
+        self.executor.shutdown(wait=False)
+
+    def _set_active(self, active):
+        self.active = active
+        if self.on_busy_change is not None:
+            self.on_busy_change(active)
+
+    def _poll(self):
+        """Обрабатывает готовые задачи в потоке Tk."""
+        while True:
+            try:
+                channel, generation, future, on_success, on_error = self.done.get_nowait()
+            except queue.Empty:
+                break
+            self.pending[channel].discard(future)
+            self._set_active(self.active - 1)
+            if future.cancelled() or generation != self.generations.get(channel):
+                continue # Задача отменена или её результат устарел
+            error = future.exception()
+            if error is not None:
+                if on_error is not None:
+                    on_error(error)
+            elif on_success is not None:
+                on_success(future.result())
+        self.poll_job = self.root.after(self.POLL_INTERVAL_MS, self._poll)
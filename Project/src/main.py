@@ -5,6 +5,7 @@ def main():
     root = tk.Tk()
     root.title("Анализатор клеток крови")
     app = MainWindow(root)
+    root.after(100, app.warm_up) # Модели загружаются в фоне, когда окно уже отрисовано
     root.mainloop()
 
 if __name__ == "__main__":
@@ -1,8 +1,12 @@
 from abc import ABC, abstractmethod
+from itertools import islice
 import numpy as np
+from .profiling import StageProfiler, NULL_STAGE
 
 class BaseModel(ABC):
     """Базовый абстрактный класс для моделей анализа клеток крови."""
+    _profiler = None # Профилировщик стадий экземпляра; None - профилирование выключено
+    
     @abstractmethod
     def predict(self, image: np.ndarray) -> int:
         """Абстрактный метод для предсказания количества клеток на изображении.
@@ -25,4 +29,108 @@ class BaseModel(ABC):
             images: Список входных изображений.
             labels: Список соответствующих меток (например, количество клеток).
         """
-        pass 
\ No newline at end of file
+        pass
+    
+    def fingerprint(self) -> str:
+        """Отпечаток конфигурации модели для кэширования результатов (см. PredictionCache).
+        
+        Включает класс модели и все публичные атрибуты простых типов (числа, строки, кортежи).
+        Наследники, результат которых зависит от других объектов (бэкенд, веса сети),
+        дополняют отпечаток.
+        
+        Returns:
+            str: Строка, меняющаяся при любом изменении параметров, влияющих на результат.
+        """
+        params = {name: value for name, value in sorted(vars(self).items())
+                  if not name.startswith("_") and isinstance(value, (bool, int, float, str, tuple, type(None)))}
+        return f"{type(self).__module__}.{type(self).__qualname__}{params!r}"
+    
+    def predict_batch(self, images, batch_size: int = 16) -> list:
+        """Предсказывает количество клеток для списка изображений.
+        
+        По умолчанию изображения обрабатываются по одному через predict(); модели, способные
+        обработать пачку быстрее (общие буферы, один прямой проход сети), переопределяют метод.
+        
+        Args:
+            images: Список изображений в формате numpy array.
+            batch_size: Максимальное количество изображений, обрабатываемых за один шаг.
+            
+        Returns:
+            list: Количество клеток для каждого изображения в исходном порядке.
+        """
+        return [self.predict(image) for image in images]
+    
+    def predict_stream(self, images, batch_size: int = 16):
+        """Лениво предсказывает количество клеток для потока изображений.
+        
+        Из итератора забирается не больше batch_size изображений за раз, и пачка передается
+        в predict_batch, поэтому в памяти одновременно находится одна пачка, а изображения
+        могут читаться с диска по мере обработки (например, генератором cv2.imread).
+        
+        Args:
+            images: Любой итерируемый объект изображений.
+            batch_size: Размер пачки.
+            
+        Yields:
+            int: Количество клеток для очередного изображения в исходном порядке.
+        """
+        iterator = iter(images)
+        while True:
+            batch = list(islice(iterator, batch_size))
+            if not batch:
+                return
+            yield from self.predict_batch(batch, batch_size)
+    
+    def detect(self, image: np.ndarray) -> np.ndarray:
+        """Находит центры клеток на изображении.
+        
+        Используется при подсчете по фрагментам (TiledModel): по координатам центров
+        отбрасываются клетки, повторно найденные в зонах перекрытия соседних фрагментов.
+        
+        Args:
+            image: Входное изображение в формате numpy array.
+            
+        Returns:
+            np.ndarray: Массив (k, 2) координат центров (x, y) в пикселях изображения.
+        """
+        raise NotImplementedError(f"{type(self).__name__} не поддерживает поиск координат клеток")
+    
+    def stage(self, name: str):
+        """Контекст замера именованной стадии модели (например, предобработки или инференса).
+        
+        Наследники оборачивают шаги анализа в `with self.stage("имя"):`. Пока профилирование
+        не включено, возвращается общий пустой контекст, и замеры почти ничего не стоят.
+        
+        Args:
+            name: Имя стадии.
+        """
+        profiler = self._profiler
+        return NULL_STAGE if profiler is None else profiler.stage(name)
+    
+    def enable_profiling(self, track_memory: bool = True) -> None:
+        """Включает сбор замеров стадий: время, процессорное время и пиковую память.
+        
+        Args:
+            track_memory: Замерять пиковую память стадий через tracemalloc (замедляет выделения памяти).
+        """
+        if self._profiler is None:
+            self._profiler = StageProfiler(track_memory=track_memory)
+    
+    def disable_profiling(self) -> None:
+        """Выключает профилирование; накопленные замеры сбрасываются."""
+        if self._profiler is not None:
+            self._profiler.close()
+            self._profiler = None
+    
+    def stage_stats(self) -> dict:
+        """Возвращает накопленные замеры стадий.
+        
+        Returns:
+            dict: {стадия: {"calls", "wall_ms", "cpu_ms", "peak_kb"}}; пустой словарь, если профилирование выключено.
+        """
+        return {} if self._profiler is None else self._profiler.stats()
+    
+    def reset_stage_stats(self) -> None:
+        """Обнуляет накопленные замеры стадий (например, перед обработкой очередного изображения)."""
+        if self._profiler is not None:
+            self._profiler.reset()
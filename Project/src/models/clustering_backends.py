@@ -0,0 +1,176 @@
+from abc import ABC, abstractmethod
+import time
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from sklearn.cluster import DBSCAN
+from sklearn.neighbors import NearestNeighbors
+
+
+class ClusteringBackend(ABC):
+    """Базовый класс алгоритма, подсчитывающего кластеры в стеке признаков пикселей.
+
+    Стек признаков передается как массив (высота, ширина, число признаков), то есть
+    с сохранением решетки пикселей. Каждый вызов labels()/count() замеряется: last_time,
+    total_time и calls доступны для сравнения бэкендов.
+    """
+    name = "base"
+
+    def __init__(self):
+        self.calls = 0 # Количество вызовов labels()/count()
+        self.total_time = 0.0 # Суммарное время всех вызовов, с
+        self.last_time = 0.0 # Время последнего вызова, с
+
+    def fingerprint(self):
+        """Имя алгоритма и параметры, влияющие на разметку (для отпечатка ClusteringModel)."""
+        return self.name
+
+    @property
+    def mean_time(self):
+        """Среднее время одного вызова, с."""
+        return self.total_time / self.calls if self.calls else 0.0
+
+    def labels(self, feature_stack, eps, min_samples):
+        """Размечает пиксели стека признаков метками кластеров и учитывает время вызова.
+
+        Args:
+            feature_stack: Массив (высота, ширина, число признаков).
+            eps: Максимальное расстояние между соседними векторами признаков одного кластера.
+            min_samples: Минимальное количество точек для кластера (смысл зависит от бэкенда).
+
+        Returns:
+            np.ndarray: Метки (высота, ширина); -1 - шум.
+        """
+        start = time.perf_counter()
+        labels = self._labels(feature_stack, eps, min_samples)
+        self.last_time = time.perf_counter() - start
+        self.total_time += self.last_time
+        self.calls += 1
+        return np.asarray(labels).reshape(feature_stack.shape[:2])
+
+    def count(self, feature_stack, eps, min_samples):
+        """Подсчитывает кластеры в стеке признаков (без шума); параметры как у labels()."""
+        labels = self.labels(feature_stack, eps, min_samples)
+        return len(np.unique(labels[labels >= 0]))
+
+    def count_batch(self, feature_stacks, eps, min_samples):
+        """Подсчитывает кластеры в каждом стеке пачки (N, высота, ширина, число признаков).
+
+        Время пачки распределяется поровну между стеками: calls увеличивается на N.
+
+        Returns:
+            list: Количество кластеров (без шума) для каждого стека.
+        """
+        start = time.perf_counter()
+        labels = self._labels_batch(feature_stacks, eps, min_samples)
+        elapsed = time.perf_counter() - start
+        self.last_time = elapsed / max(len(feature_stacks), 1)
+        self.total_time += elapsed
+        self.calls += len(feature_stacks)
+        return [len(np.unique(frame[frame >= 0])) for frame in labels]
+
+    def _labels_batch(self, feature_stacks, eps, min_samples):
+        """Метки (N, высота, ширина) для пачки стеков; по умолчанию стеки кластеризуются по одному."""
+        return np.stack([np.asarray(self._labels(stack, eps, min_samples)).reshape(stack.shape[:2])
+                         for stack in feature_stacks])
+
+    @abstractmethod
+    def _labels(self, feature_stack, eps, min_samples):
+        """Собственно кластеризация: метки в порядке пикселей; реализуется наследниками."""
+        pass
+
+
+class DBSCANBackend(ClusteringBackend):
+    """Исходный вариант: sklearn DBSCAN по всем векторам признаков без учета решетки."""
+    name = "dbscan"
+
+    def _labels(self, feature_stack, eps, min_samples):
+        feature_vectors = feature_stack.reshape(-1, feature_stack.shape[-1])
+        return DBSCAN(eps=eps, min_samples=min_samples).fit(feature_vectors).labels_
+
+
+class PrecomputedDBSCANBackend(ClusteringBackend):
+    """DBSCAN по заранее построенному разреженному графу соседей в радиусе eps.
+
+    Поиск соседей выполняется отдельно (и может идти в n_jobs потоков), после чего DBSCAN
+    работает с готовой разреженной матрицей расстояний. Результат совпадает с DBSCANBackend.
+    """
+    name = "precomputed"
+
+    def __init__(self, n_jobs=None):
+        super().__init__()
+        self.n_jobs = n_jobs
+
+    def _labels(self, feature_stack, eps, min_samples):
+        feature_vectors = feature_stack.reshape(-1, feature_stack.shape[-1])
+        neighbors = NearestNeighbors(radius=eps, n_jobs=self.n_jobs).fit(feature_vectors)
+        graph = neighbors.radius_neighbors_graph(feature_vectors, mode="distance")
+        return DBSCAN(eps=eps, min_samples=min_samples, metric="precomputed").fit(graph).labels_
+
+
+class GridComponentsBackend(ClusteringBackend):
+    """Связные компоненты на решетке пикселей.
+
+    Соседние (по 4- или 8-связности) пиксели соединяются, если расстояние между их
+    векторами признаков не больше eps; кластером считается компонента не меньше
+    min_samples пикселей. Сравниваются только соседи по решетке, поэтому стоимость
+    линейна по числу пикселей, а не зависит от плотности точек в пространстве признаков.
+    Пачка стеков размечается одним проходом: решетки кадров объединяются в один граф
+    без ребер между кадрами, и связные компоненты ищутся одним вызовом.
+    """
+    name = "grid"
+
+    def __init__(self, connectivity=4):
+        super().__init__()
+        if connectivity not in (4, 8):
+            raise ValueError("connectivity должна быть 4 или 8")
+        self.connectivity = connectivity
+
+    def fingerprint(self):
+        return f"{self.name}(connectivity={self.connectivity})"
+
+    def _labels(self, feature_stack, eps, min_samples):
+        return self._labels_batch(feature_stack[None], eps, min_samples)[0]
+
+    def _labels_batch(self, feature_stacks, eps, min_samples):
+        n, h, w = feature_stacks.shape[:3]
+        index = np.arange(n * h * w).reshape(n, h, w)
+        features = feature_stacks.astype(np.float32, copy=False)
+
+        # Смещения соседей: вправо и вниз (+ две диагонали для 8-связности); каждое ребро учитывается один раз
+        shifts = [(0, 1), (1, 0)] + ([(1, 1), (1, -1)] if self.connectivity == 8 else [])
+        rows, cols = [], []
+        for dy, dx in shifts:
+            y0, y1 = 0, h - dy
+            x0, x1 = max(0, -dx), w - max(0, dx)
+            a = features[:, y0:y1, x0:x1]
+            b = features[:, y0 + dy:y1 + dy, x0 + dx:x1 + dx]
+            close = np.einsum("nijk,nijk->nij", a - b, a - b) <= eps * eps # Квадрат расстояния без sqrt
+            rows.append(index[:, y0:y1, x0:x1][close])
+            cols.append(index[:, y0 + dy:y1 + dy, x0 + dx:x1 + dx][close])
+        rows, cols = np.concatenate(rows), np.concatenate(cols)
+
+        size = n * h * w
+        graph = coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(size, size))
+        _, labels = connected_components(graph, directed=False)
+        # Компоненты меньше min_samples считаются шумом, остальные нумеруются подряд с нуля
+        large = np.bincount(labels) >= min_samples
+        relabel = np.where(large, np.cumsum(large) - 1, -1)
+        return relabel[labels].reshape(n, h, w)
+
+
+# Бэкенды, доступные по имени в ClusteringModel
+BACKENDS = {
+    DBSCANBackend.name: DBSCANBackend,
+    PrecomputedDBSCANBackend.name: PrecomputedDBSCANBackend,
+    GridComponentsBackend.name: GridComponentsBackend,
+}
+
+
+def make_backend(backend):
+    """Возвращает экземпляр бэкенда по имени из BACKENDS или сам переданный экземпляр."""
+    if isinstance(backend, ClusteringBackend):
+        return backend
+    if backend not in BACKENDS:
+        raise ValueError(f"Неизвестный бэкенд кластеризации: {backend}")
+    return BACKENDS[backend]()
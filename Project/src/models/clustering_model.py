@@ -2,12 +2,26 @@ from .base_model import BaseModel
 import numpy as np
 import cv2
 from scipy.signal import convolve2d
-from sklearn.cluster import DBSCAN
+from .texture import LawsTextureEngine
+from .clustering_backends import make_backend
 
 class ClusteringModel(BaseModel):
     """Модель анализа клеток крови на основе текстурного анализа с использованием фильтров Laws и кластеризации DBSCAN."""
-    def __init__(self):
-        """Инициализация модели и определение 1D фильтров Laws."""
+    def __init__(self, fast_texture=True, backend="dbscan", feature_size=100, eps=10, min_samples=5,
+                 tile_memory_mb=None):
+        """Инициализация модели и определение 1D фильтров Laws.
+        
+        Args:
+            fast_texture: Вычислять карты энергии сепарабельным движком LawsTextureEngine (float32)
+                вместо 16 полных 2D сверток scipy в float64.
+            backend: Алгоритм кластеризации - имя из clustering_backends.BACKENDS
+                ("dbscan", "precomputed", "grid") или экземпляр ClusteringBackend.
+            feature_size: Сторона сетки, до которой уменьшаются карты признаков (int или (ширина, высота)).
+            eps: Максимальное расстояние между векторами признаков одного кластера.
+            min_samples: Минимальное количество точек для кластера.
+            tile_memory_mb: Если задано, текстурный анализ идет полосами с перекрытием в пределах этого
+                объема рабочих буферов (МБ), без хранения полноразмерных карт энергии.
+        """
         # 1D фильтры Laws для выделения различных текстурных признаков
         self.L5 = np.array([1, 4, 6, 4, 1]) # Level (усреднение)
         self.E5 = np.array([-1, -2, 0, 2, 1]) # Edge (край)
@@ -16,6 +30,17 @@ class ClusteringModel(BaseModel):
         
         self.filters_1d = [self.L5, self.E5, self.S5, self.R5]
         self.filter_names = ['L5', 'E5', 'S5', 'R5']
+        self.laws_filters = self.create_laws_filters() # 2D фильтры строятся один раз
+        
+        self.fast_texture = fast_texture
+        self.texture_engine = LawsTextureEngine() # Сепарабельный движок с заранее подготовленными ядрами
+        
+        # Параметры шага кластеризации
+        self.backend = make_backend(backend)
+        self.feature_size = (feature_size, feature_size) if np.isscalar(feature_size) else tuple(feature_size)
+        self.eps = eps
+        self.min_samples = min_samples
+        self.tile_memory_mb = tile_memory_mb
         
     def create_laws_filters(self):
         """Создание набора 2D фильтров Laws из 1D фильтров."""
@@ -40,11 +65,9 @@ class ClusteringModel(BaseModel):
         """Применяет набор 2D фильтров Laws к изображению и вычисляет текстурную энергию."""
         # Удаляем локальное среднее
         image = self.zero_mean(image, kernel_size=kernel_size)
-        # Создаем 2D фильтры Laws
-        filters = self.create_laws_filters()
         energy_maps = {}
-        # Применяем каждый фильтр и вычисляем энергию
-        for name, kernel in filters.items():
+        # Применяем каждый заранее созданный 2D фильтр и вычисляем энергию
+        for name, kernel in self.laws_filters.items():
             filtered = convolve2d(image, kernel, mode='same', boundary='symm')
             # Вычисляем энергию как среднее абсолютных значений в окне
             energy = cv2.boxFilter(np.abs(filtered), ddepth=-1, ksize=(kernel_size, kernel_size))
@@ -67,40 +90,90 @@ class ClusteringModel(BaseModel):
         }
         return combined
     
+    def build_feature_stack(self, image, combined_maps):
+        """Собирает текстурные карты и исходное изображение в стек признаков размера feature_size."""
+        # Изменяем размер карт до feature_size (по умолчанию 100x100) для уменьшения размерности
+        feature_stack = np.dstack([cv2.resize(combined_maps[key], self.feature_size) for key in sorted(combined_maps)])
+        # Добавляем измененное изображение как дополнительный признак
+        return np.dstack([feature_stack, cv2.resize(image, self.feature_size)]) # (высота, ширина, 9 текстур + 1 изображение)
+    
     def cluster_texture(self, image, combined_maps, eps=0.5, min_samples=50):
-        """Выполняет кластеризацию текстурных признаков с помощью DBSCAN для идентификации областей клеток."""
+        """Выполняет кластеризацию текстурных признаков выбранным бэкендом для идентификации областей клеток."""
         # Собираем текстурные карты и исходное изображение в один стек признаков
-        # Изменяем размер карт до 100x100 для уменьшения размерности
-        feature_stack = np.dstack([cv2.resize(combined_maps[key], (100, 100)) for key in sorted(combined_maps)])
-        # Добавляем измененное изображение как дополнительный признак
-        feature_stack = np.dstack([feature_stack, cv2.resize(image, (100, 100))])
-        # Преобразуем стек признаков в список векторов признаков для каждого пикселя
-        feature_vectors = feature_stack.reshape(-1, 10) # (100*100) x (9 текстур + 1 изображение) = 10000 x 10
-
-        # Применение алгоритма кластеризации DBSCAN
-        clustering = DBSCAN(eps=eps, min_samples=min_samples).fit(feature_vectors) # eps - максимальное расстояние между выборками, min_samples - количество выборок в окрестности для ядра
-        labels = clustering.labels_ # Получаем метки кластеров для каждого вектора признаков
-
-        # Подсчитываем количество уникальных кластеров (исключая шумовой кластер с меткой -1)
-        cell_count = len(set(labels)) - (1 if -1 in labels else 0)  # Убираем шум
-        return cell_count
+        feature_stack = self.build_feature_stack(image, combined_maps)
+        # eps - максимальное расстояние между выборками, min_samples - количество выборок в окрестности для ядра
+        return self.backend.count(feature_stack, eps, min_samples) # Количество кластеров без шума
+    
+    def extract_features(self, image: np.ndarray) -> np.ndarray:
+        """Строит уменьшенный стек текстурных признаков (высота, ширина, 10) для входного изображения."""
+        with self.stage("preprocess"):
+            # Преобразуем в оттенки серого, если изображение цветное
+            if len(image.shape) == 3:
+                image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            
+            # Применяем размытие для сглаживания изображения перед текстурным анализом
+            image = cv2.GaussianBlur(image, (9, 9), 0.5)
+        
+        with self.stage("apply_laws_filters"):
+            if self.fast_texture and self.tile_memory_mb:
+                # Полосовая обработка сразу дает уменьшенный стек признаков в ограниченной памяти
+                return self.texture_engine.feature_stack_tiled(image, self.feature_size, self.tile_memory_mb)
+            elif self.fast_texture:
+                # Сепарабельные 1D проходы сразу дают объединенные карты энергии
+                combined_maps = self.texture_engine.combined_energies(image)
+            else:
+                # Применяем фильтры Laws и вычисляем карты энергии
+                energy_maps = self.apply_laws_filters(image)
+                # Объединяем симметричные карты энергии
+                combined_maps = self.combine_symmetric_energies(energy_maps)
+        with self.stage("feature_stack"):
+            return self.build_feature_stack(image, combined_maps)
     
     def predict(self, image: np.ndarray) -> int:
         """Предсказывает количество клеток на входном изображении, применяя последовательность шагов анализа текстур."""
-        # Преобразуем в оттенки серого, если изображение цветное
-        if len(image.shape) == 3:
-            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
-        # Применяем размытие для сглаживания изображения перед текстурным анализом
-        image = cv2.GaussianBlur(image, (9, 9), 0.5)
+        features = self.extract_features(image)
+        # Выполняем кластеризацию на основе текстурных признаков и подсчитываем клетки
+        with self.stage("cluster_texture"):
+            return self.backend.count(features, self.eps, self.min_samples) # Используем заданные параметры кластеризации
+    
+    def fingerprint(self) -> str:
+        """Отпечаток параметров модели, дополненный алгоритмом кластеризации."""
+        return f"{super().fingerprint()}|backend={self.backend.fingerprint()}"
+    
+    def predict_batch(self, images, batch_size: int = 16) -> list:
+        """Предсказывает количество клеток для списка изображений.
         
-        # Применяем фильтры Laws и вычисляем карты энергии
-        energy_maps = self.apply_laws_filters(image)
-        # Объединяем симметричные карты энергии
-        combined_maps = self.combine_symmetric_energies(energy_maps)
+        Стеки признаков пачки (одного размера feature_size независимо от размера кадров)
+        собираются в один массив и передаются бэкенду целиком: бэкенд "grid" размечает
+        всю пачку одним проходом, остальные - по одному стеку.
         
-        # Выполняем кластеризацию на основе текстурных признаков и подсчитываем клетки
-        return self.cluster_texture(image, combined_maps, eps=10, min_samples=5) # Используем заданные параметры для DBSCAN
+        Returns:
+            list: Количество клеток для каждого изображения.
+        """
+        counts = []
+        for start in range(0, len(images), batch_size):
+            features = np.stack([self.extract_features(image) for image in images[start:start + batch_size]])
+            with self.stage("cluster_texture"):
+                counts.extend(self.backend.count_batch(features, self.eps, self.min_samples))
+        return counts
+    
+    def detect(self, image: np.ndarray) -> np.ndarray:
+        """Возвращает центры кластеров в координатах исходного изображения (массив (k, 2) координат (x, y))."""
+        features = self.extract_features(image)
+        with self.stage("cluster_texture"):
+            labels = self.backend.labels(features, self.eps, self.min_samples)
+        clustered = labels >= 0
+        if not clustered.any():
+            return np.empty((0, 2), dtype=np.float32)
+        # Средние координаты ячеек сетки признаков каждого кластера
+        ys, xs = np.nonzero(clustered)
+        ids = np.unique(labels[clustered], return_inverse=True)[1]
+        sizes = np.bincount(ids)
+        centers = np.stack([np.bincount(ids, xs) / sizes, np.bincount(ids, ys) / sizes], axis=1)
+        # Центр ячейки сетки -> пиксели исходного изображения
+        fh, fw = labels.shape
+        h, w = image.shape[:2]
+        return ((centers + 0.5) * (w / fw, h / fh)).astype(np.float32)
     
     def train(self, images: list, labels: list) -> None:
         """Метод обучения не реализован, так как эта модель не требует явного обучения на данных с метками."""
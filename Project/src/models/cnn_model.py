@@ -1,22 +1,165 @@
 from .base_model import BaseModel
+from .prediction_cache import file_digest
 import numpy as np
 from ultralytics import YOLO
 import cv2
 import os
 
 
+def letterbox(image, size=640, color=(114, 114, 114)):
+    """Вписывает изображение в квадрат size x size с сохранением пропорций и заполнением полей.
+
+    Returns:
+        tuple: (изображение size x size, коэффициент масштаба, (сдвиг по x, сдвиг по y)).
+    """
+    h, w = image.shape[:2]
+    scale = min(size / h, size / w) # Масштаб, при котором большая сторона равна size
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    if (new_w, new_h) != (w, h):
+        image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    # Поля распределяются поровну с обеих сторон, как в ultralytics
+    pad_x, pad_y = (size - new_w) / 2, (size - new_h) / 2
+    top, bottom = int(round(pad_y - 0.1)), int(round(pad_y + 0.1))
+    left, right = int(round(pad_x - 0.1)), int(round(pad_x + 0.1))
+    image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return image, scale, (left, top)
+
+
 class CNNModel(BaseModel):
-    """Модель анализа клеток крови на основе предобученной сверточной нейронной сети YOLOv8n."""
-    def __init__(self):
-        """Инициализация модели CNN, загрузка предобученных весов."""
+    """Модель анализа клеток крови на основе предобученной сверточной нейронной сети YOLOv8n.
+
+    Поддерживает два бэкенда: "ultralytics" (исходный объект YOLO на torch) и "onnx" -
+    граф, один раз экспортированный из weights.pt в weights.onnx и выполняемый ONNX Runtime
+    на CPU. ONNX-бэкенд обрабатывает пачку кадров за один прямой проход (predict_batch).
+    По умолчанию кадры вписываются в квадрат imgsz с сохранением пропорций (letterbox);
+    keep_aspect=False возвращает прежнее растяжение до imgsz x imgsz, с которым посчитаны
+    старые записи results.db.
+    """
+    def __init__(self, backend="ultralytics", imgsz=640, conf=0.25, iou=0.7, intra_op_threads=None, max_det=300,
+                 keep_aspect=True):
+        """Инициализация модели CNN, загрузка предобученных весов.
+        
+        Args:
+            backend: "ultralytics" или "onnx".
+            imgsz: Размер стороны входа сети.
+            conf: Порог уверенности детекции.
+            iou: Порог IoU для подавления немаксимумов.
+            intra_op_threads: Число потоков ONNX Runtime внутри оператора (None - по числу ядер).
+            max_det: Максимальное число детекций на изображение.
+            keep_aspect: True - letterbox с сохранением пропорций, False - растяжение кадра до imgsz x imgsz
+                без сохранения пропорций (исходное поведение; число клеток на неквадратных кадрах отличается).
+        """
         # Получаем абсолютный путь к файлу весов weights.pt
         base_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
         args_path = os.path.join(base_dir, 'src', 'models', 'weights.pt')
+        self.weights_path = args_path
+        self.backend = backend
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+        self.max_det = max_det
+        self.keep_aspect = keep_aspect
+        
+        if backend == "ultralytics":
+            # Загружаем предобученную модель YOLOv8n с использованием указанного файла весов
+            # Предполагается, что weights.pt содержит веса модели YOLOv8n, обученной на нужных классах объектов (клетки крови)
+            self.model = YOLO(args_path)
+        elif backend == "onnx":
+            self.session = self._create_onnx_session(self._export_onnx(), intra_op_threads)
+            self.input_name = self.session.get_inputs()[0].name
+        else:
+            raise ValueError(f"Неизвестный бэкенд CNNModel: {backend}")
+    
+    def _export_onnx(self):
+        """Экспортирует weights.pt в ONNX с динамическими размерами пачки; результат кэшируется на диске.
+
+        Returns:
+            str: Путь к файлу weights.onnx рядом с weights.pt.
+        """
+        onnx_path = os.path.splitext(self.weights_path)[0] + ".onnx"
+        # Повторный экспорт нужен только если веса новее кэшированного графа
+        if os.path.exists(onnx_path) and os.path.getmtime(onnx_path) >= os.path.getmtime(self.weights_path):
+            return onnx_path
+        exported = YOLO(self.weights_path).export(format="onnx", imgsz=self.imgsz, dynamic=True)
+        if os.path.abspath(exported) != os.path.abspath(onnx_path):
+            os.replace(exported, onnx_path)
+        return onnx_path
+    
+    @staticmethod
+    def _create_onnx_session(onnx_path, intra_op_threads):
+        """Создает сессию ONNX Runtime с CPU-провайдером и полным набором оптимизаций графа."""
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("Для бэкенда 'onnx' установите пакет onnxruntime") from e
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.inter_op_num_threads = 1 # Граф YOLO последовательный, параллелизм внутри операторов
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        return ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+    
+    def _resize(self, image):
+        """Приводит кадр к входу сети imgsz x imgsz.
+
+        Returns:
+            tuple: (кадр imgsz x imgsz, масштаб, (сдвиг по x, сдвиг по y)); при keep_aspect=False
+                масштаб - массив [sx, sy, sx, sy] для рамок xyxy, сдвиг нулевой.
+        """
+        if self.keep_aspect:
+            return letterbox(image, self.imgsz)
+        h, w = image.shape[:2]
+        scale = np.array([self.imgsz / w, self.imgsz / h] * 2, dtype=np.float32)
+        return cv2.resize(image, (self.imgsz, self.imgsz)), scale, (0, 0)
+    
+    def _detect_onnx(self, images):
+        """Прямой проход ONNX-графа по пачке кадров.
+
+        Returns:
+            list: Для каждого кадра массив рамок (k, 4) в формате xyxy в координатах исходного кадра.
+        """
+        with self.stage("resize"):
+            batch = np.empty((len(images), 3, self.imgsz, self.imgsz), dtype=np.float32)
+            transforms = []
+            for i, image in enumerate(images):
+                if len(image.shape) == 2:
+                    image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+                boxed, scale, pad = self._resize(image)
+                # BGR -> RGB, HWC -> CHW, [0, 255] -> [0, 1], запись сразу в общий буфер пачки
+                np.multiply(boxed[:, :, ::-1].transpose(2, 0, 1), 1 / 255.0, out=batch[i], casting="unsafe")
+                transforms.append((scale, pad))
         
-        # Загружаем предобученную модель YOLOv8n с использованием указанного файла весов
-        # Предполагается, что weights.pt содержит веса модели YOLOv8n, обученной на нужных классах объектов (клетки крови)
-        self.model = YOLO(args_path)
+        with self.stage("inference"):
+            output = self.session.run(None, {self.input_name: batch})[0] # (N, 4 + число классов, число якорей)
+        with self.stage("postprocess"):
+            return [self._postprocess(pred, scale, pad) for pred, (scale, pad) in zip(output, transforms)]
+    
+    def _postprocess(self, pred, scale, pad):
+        """Отбор детекций по уверенности и NMS по классам для выхода YOLOv8 одного кадра."""
+        pred = pred.T # (число якорей, 4 + число классов)
+        class_scores = pred[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(pred)), class_ids]
+        keep = scores > self.conf
+        if not np.any(keep):
+            return np.zeros((0, 4), dtype=np.float32)
+        boxes, scores, class_ids = pred[keep, :4], scores[keep], class_ids[keep]
         
+        # Смещаем рамки разных классов, чтобы NMS подавлял пересечения только внутри класса
+        xywh = boxes.copy()
+        xywh[:, :2] -= xywh[:, 2:] / 2 # центр -> левый верхний угол
+        shifted = xywh.copy()
+        shifted[:, :2] += class_ids[:, None] * 7680.0
+        indices = cv2.dnn.NMSBoxes(shifted.tolist(), scores.tolist(), self.conf, self.iou, top_k=self.max_det)
+        indices = np.array(indices, dtype=int).reshape(-1)
+        
+        # Переводим рамки из координат входа сети в координаты исходного кадра
+        xyxy = np.hstack([xywh[indices, :2], xywh[indices, :2] + xywh[indices, 2:]])
+        xyxy[:, [0, 2]] -= pad[0]
+        xyxy[:, [1, 3]] -= pad[1]
+        return xyxy / scale
+    
     def predict(self, image: np.ndarray) -> int:
         """Предсказывает количество клеток на входном изображении с использованием модели CNN.
         
@@ -26,18 +169,74 @@ class CNNModel(BaseModel):
         Returns:
             int: Количество обнаруженных объектов (клеток) на изображении.
         """
-        # Запускаем процесс предсказания (инференса) модели на изображении
-        # Изменяем размер изображения до 640x640, так как YOLOv8n часто работает с таким размером
-        image = cv2.resize(image, (640, 640))
-        results = self.model(image) # Выполняем предсказание
-        
-        # Считаем общее количество обнаруженных объектов (клеток) во всех результатах предсказания
-        count = 0
-        for result in results:
-            # result.boxes содержит информацию о каждом обнаруженном объекте (граничные рамки, классы, уверенность)
-            count += len(result.boxes) # Количество объектов в текущем результате
+        # Тот же путь, что и у predict_batch/predict_stream (letterbox или растяжение по keep_aspect),
+        # поэтому число клеток не зависит от того, каким методом обработан кадр
+        return self.predict_batch([image])[0]
+    
+    def weights_digest(self) -> str:
+        """Хеш файла весов; пересчитывается только при изменении времени изменения или размера файла."""
+        stat = os.stat(self.weights_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if getattr(self, "_weights_signature", None) != signature:
+            self._weights_digest = file_digest(self.weights_path)
+            self._weights_signature = signature
+        return self._weights_digest
+    
+    def fingerprint(self) -> str:
+        """Отпечаток параметров модели, дополненный хешем весов: замена weights.pt меняет отпечаток."""
+        return f"{super().fingerprint()}|weights={self.weights_digest()}"
+    
+    def predict_batch(self, images, batch_size=16) -> list:
+        """Предсказывает количество клеток для списка кадров, обрабатывая их пачками.
+        
+        Args:
+            images: Список изображений в формате numpy array (размеры могут различаться).
+            batch_size: Максимальное число кадров в одном прямом проходе.
             
-        return count
+        Returns:
+            list: Количество обнаруженных клеток для каждого кадра.
+        """
+        return [len(boxes) for boxes in self.detect_boxes(images, batch_size)]
+    
+    def detect_boxes(self, images, batch_size=16) -> list:
+        """Обнаруживает клетки на списке кадров, обрабатывая их пачками.
+        
+        Returns:
+            list: Для каждого кадра массив рамок (k, 4) в формате xyxy в координатах исходного кадра.
+        """
+        boxes = []
+        for start in range(0, len(images), batch_size):
+            chunk = images[start:start + batch_size]
+            if self.backend == "onnx":
+                boxes.extend(self._detect_onnx(chunk))
+            else:
+                boxes.extend(self._detect_ultralytics(chunk))
+        return boxes
+    
+    def _detect_ultralytics(self, images):
+        """Прямой проход модели ultralytics по пачке кадров; формат результата как у _detect_onnx."""
+        with self.stage("resize"):
+            boxed = [self._resize(image) for image in images]
+        # ultralytics сам собирает список кадров в пачку; пороги те же, что входят в fingerprint()
+        with self.stage("inference"):
+            results = self.model([img for img, _, _ in boxed], conf=self.conf, iou=self.iou, max_det=self.max_det,
+                                 verbose=False)
+        with self.stage("postprocess"):
+            boxes = []
+            for (_, scale, pad), result in zip(boxed, results):
+                xyxy = np.asarray(result.boxes.xyxy.cpu().numpy(), dtype=np.float32).reshape(-1, 4)
+                xyxy[:, [0, 2]] -= pad[0]
+                xyxy[:, [1, 3]] -= pad[1]
+                boxes.append(xyxy / scale)
+        return boxes
+    
+    def detect(self, image: np.ndarray) -> np.ndarray:
+        """Возвращает центры обнаруженных рамок (массив (k, 2) координат (x, y) исходного кадра)."""
+        return self.detect_batch([image])[0]
+    
+    def detect_batch(self, images, batch_size=16) -> list:
+        """Центры обнаруженных рамок для списка кадров (см. detect)."""
+        return [(xyxy[:, :2] + xyxy[:, 2:]) / 2 for xyxy in self.detect_boxes(images, batch_size)]
     
     def train(self, images: list, labels: list) -> None:
         """Метод обучения не реализован, так как используется предобученная модель."""
@@ -2,6 +2,56 @@ from .base_model import BaseModel
 import numpy as np
 import cv2
 
+
+def contour_areas(contours) -> np.ndarray:
+    """Площади контуров по формуле шнурования, векторно для всего списка.
+
+    Результат совпадает с cv2.contourArea для каждого контура, но без цикла Python.
+
+    Args:
+        contours: Контуры в формате cv2.findContours (массивы (k, 1, 2)).
+
+    Returns:
+        np.ndarray: Площади контуров (float64), в порядке контуров.
+    """
+    if len(contours) == 0:
+        return np.zeros(0, dtype=np.float64)
+    lengths = np.fromiter((len(contour) for contour in contours), dtype=np.int64, count=len(contours))
+    starts = np.zeros(len(contours), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=starts[1:])
+    points = np.concatenate(contours).reshape(-1, 2).astype(np.int64)
+    # Индекс следующей вершины: последняя вершина каждого контура замыкается на первую
+    following = np.arange(1, len(points) + 1)
+    following[starts + lengths - 1] = starts
+    x, y = points[:, 0], points[:, 1]
+    cross = x * y[following] - x[following] * y
+    return np.abs(np.add.reduceat(cross, starts)) * 0.5
+
+
+def drop_small_components(binary: np.ndarray, min_area: float) -> np.ndarray:
+    """Удаляет компоненты связности, внешний контур которых заведомо меньше min_area.
+
+    Вершины внешнего контура лежат в центрах пикселей компоненты, поэтому его площадь
+    не превышает (w - 1) * (h - 1) по габаритам компоненты из статистики
+    connectedComponentsWithStats. Компоненты с меньшей оценкой отбрасываются до поиска
+    контуров; остальные контуры, их площади и вложенность не меняются, так что
+    результат фильтра по площади остается прежним.
+
+    Args:
+        binary: Бинаризованное изображение (объекты - 255).
+        min_area: Нижняя граница площади контура.
+
+    Returns:
+        np.ndarray: Новое бинарное изображение только с компонентами, способными пройти фильтр.
+    """
+    _, labels, stats, _ = cv2.connectedComponentsWithStatsWithAlgorithm(
+        binary, 8, cv2.CV_32S, cv2.CCL_GRANA) # 8-связность - как у внешних контуров findContours
+    bound = (stats[:, cv2.CC_STAT_WIDTH] - 1) * (stats[:, cv2.CC_STAT_HEIGHT] - 1)
+    lut = np.where(bound >= min_area, 255, 0).astype(np.uint8)
+    lut[0] = 0 # Фон
+    return lut[labels]
+
+
 class MLModel(BaseModel):
     """Модель анализа клеток крови на основе классических методов обработки изображений и поиска контуров."""
     def __init__(self):
@@ -14,24 +64,41 @@ class MLModel(BaseModel):
         # Параметры для фильтрации найденных контуров
         self.min_contour_area = 100 # Минимальная площадь контура, чтобы считать его клеткой
         self.max_contour_area = 1000 # Максимальная площадь контура
+        # Отсеивать мелкие компоненты по статистике связности до поиска контуров.
+        # Результат не меняется; выгодно на шумных снимках с тысячами мелких пятен,
+        # на чистых снимках дополнительный проход разметки обходится дороже, чем экономит
+        self.component_prefilter = False
         
-    def preprocess_image(self, image: np.ndarray) -> np.ndarray:
+        self.morph_kernel = np.ones((3, 3), np.uint8) # Ядро для морфологических операций
+        
+    def preprocess_image(self, image: np.ndarray, buffers: dict = None) -> np.ndarray:
         """Выполняет предобработку входного изображения для дальнейшего анализа.
         
         Преобразование в оттенки серого, размытие и адаптивная бинаризация.
         
         Args:
             image: Входное изображение в формате numpy array.
+            buffers: Словарь рабочих буферов, переиспользуемых между кадрами одного размера
+                (заполняется при первом вызове); None - новые массивы на каждый вызов.
             
         Returns:
-            np.ndarray: Бинаризованное изображение после предобработки.
+            np.ndarray: Бинаризованное изображение после предобработки (при buffers - один из буферов,
+                который перезаписывается следующим вызовом).
         """
+        if buffers is None:
+            buffers = {}
+        elif buffers.get("shape") != image.shape[:2]:
+            buffers.clear() # Кадр другого размера: буферы создаются заново
+            buffers["shape"] = image.shape[:2]
+        
         # Преобразуем в оттенки серого, если изображение цветное
         if len(image.shape) == 3:
-            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=buffers.get("gray"))
+            buffers["gray"] = image
             
         # Применяем размытие по Гауссу для уменьшения шума
-        image = cv2.GaussianBlur(image, self.blur_size, 0)
+        image = cv2.GaussianBlur(image, self.blur_size, 0, dst=buffers.get("blurred"))
+        buffers["blurred"] = image
         
         # Применяем адаптивную бинаризацию для отделения объектов от фона
         binary = cv2.adaptiveThreshold(
@@ -40,18 +107,24 @@ class MLModel(BaseModel):
             cv2.ADAPTIVE_THRESH_GAUSSIAN_C, # Метод адаптивного порога (по Гауссу)
             cv2.THRESH_BINARY_INV, # Инвертированный бинарный порог (объекты - белые, фон - черный)
             self.threshold_block_size, # Размер окрестности для вычисления порога
-            self.threshold_C # Вычитаемая константа из среднего по окрестности
+            self.threshold_C, # Вычитаемая константа из среднего по окрестности
+            dst=buffers.get("binary")
         )
+        buffers["binary"] = binary
         
         # Морфологические операции для удаления мелкого шума (Open) и закрытия небольших промежутков (Close)
-        kernel = np.ones((3, 3), np.uint8) # Ядро для морфологических операций
-        binary = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel) # Операция открытия
-        binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel) # Операция закрытия
+        opened = cv2.morphologyEx(binary, cv2.MORPH_OPEN, self.morph_kernel, dst=buffers.get("opened")) # Операция открытия
+        buffers["opened"] = opened
+        binary = cv2.morphologyEx(opened, cv2.MORPH_CLOSE, self.morph_kernel, dst=binary) # Операция закрытия
         
         return binary
     
     def find_cells(self, binary: np.ndarray) -> list:
         """Находит и фильтрует контуры на бинаризованном изображении для идентификации клеток."""
+        # Отбрасываем компоненты, которые не могут пройти нижнюю границу площади (см. drop_small_components)
+        if self.component_prefilter and self.min_contour_area > 0:
+            binary = drop_small_components(binary, self.min_contour_area)
+        
         # Находим все внешние контуры на бинаризованном изображении
         contours, _ = cv2.findContours(
             binary,
@@ -60,13 +133,9 @@ class MLModel(BaseModel):
         )
         
         # Фильтруем найденные контуры по площади, чтобы отобрать только те, которые соответствуют размеру клеток
-        valid_contours = []
-        for contour in contours:
-            area = cv2.contourArea(contour) # Вычисляем площадь контура
-            if self.min_contour_area <= area <= self.max_contour_area: # Проверяем, попадает ли площадь в заданный диапазон
-                valid_contours.append(contour) # Добавляем подходящий контур в список
-                
-        return valid_contours
+        areas = contour_areas(contours) # Площади всех контуров одним векторным проходом
+        valid = np.flatnonzero((areas >= self.min_contour_area) & (areas <= self.max_contour_area))
+        return [contours[i] for i in valid]
     
     def predict(self, image: np.ndarray) -> int:
         """Предсказывает количество клеток на входном изображении с использованием классических методов.
@@ -80,14 +149,106 @@ class MLModel(BaseModel):
             int: Количество найденных клеток.
         """
         # Выполняем предобработку изображения для подготовки к поиску контуров
-        binary = self.preprocess_image(image)
+        with self.stage("preprocess_image"):
+            binary = self.preprocess_image(image)
         
         # Находим контуры, соответствующие клеткам
-        contours = self.find_cells(binary)
+        with self.stage("find_cells"):
+            contours = self.find_cells(binary)
         
         # Возвращаем количество найденных валидных контуров (клеток)
         return len(contours)
     
+    def predict_batch(self, images, batch_size: int = 16) -> list:
+        """Предсказывает количество клеток для списка изображений.
+        
+        Рабочие буферы предобработки выделяются один раз и переиспользуются всеми кадрами
+        одного размера, поэтому на пачке не создаются промежуточные массивы на каждый кадр.
+        
+        Returns:
+            list: Количество клеток для каждого изображения.
+        """
+        buffers = {}
+        counts = []
+        for image in images:
+            with self.stage("preprocess_image"):
+                binary = self.preprocess_image(image, buffers)
+            with self.stage("find_cells"):
+                counts.append(len(self.find_cells(binary)))
+        return counts
+    
+    def detect(self, image: np.ndarray) -> np.ndarray:
+        """Возвращает центры масс найденных клеток в виде массива (k, 2) координат (x, y)."""
+        with self.stage("preprocess_image"):
+            binary = self.preprocess_image(image)
+        with self.stage("find_cells"):
+            contours = self.find_cells(binary)
+        centers = np.empty((len(contours), 2), dtype=np.float32)
+        for i, contour in enumerate(contours):
+            moments = cv2.moments(contour) # Площадь m00 не меньше min_contour_area, деление безопасно
+            centers[i] = (moments['m10'] / moments['m00'], moments['m01'] / moments['m00'])
+        return centers
+    
+    def sweep(self, images, blur_sizes=None, block_sizes=None, threshold_Cs=None, area_ranges=None) -> np.ndarray:
+        """Считает клетки для всей сетки параметров на каждом изображении.
+        
+        Общие промежуточные результаты вычисляются один раз: оттенки серого - на изображение,
+        размытие - на blur_size, локальное гауссово среднее адаптивного порога - на пару
+        (blur_size, block_size), бинарное изображение с морфологией - на threshold_C.
+        Контуры и их площади ищутся один раз на бинарное изображение, после чего все
+        диапазоны площадей считаются векторно. Счетчики совпадают с predict() при тех же
+        значениях атрибутов модели.
+        
+        Args:
+            images: Итерируемый набор изображений.
+            blur_sizes: Размеры ядра размытия ((w, h)); None - текущий self.blur_size.
+            block_sizes: Размеры блока адаптивной бинаризации; None - текущий.
+            threshold_Cs: Константы адаптивной бинаризации; None - текущая.
+            area_ranges: Пары (min_area, max_area); None - текущие границы площади.
+            
+        Returns:
+            np.ndarray: Матрица счетчиков формы (изображения, blur_sizes, block_sizes, threshold_Cs, area_ranges).
+        """
+        blur_sizes = [tuple(size) for size in blur_sizes] if blur_sizes is not None else [self.blur_size]
+        block_sizes = list(block_sizes) if block_sizes is not None else [self.threshold_block_size]
+        threshold_Cs = list(threshold_Cs) if threshold_Cs is not None else [self.threshold_C]
+        if area_ranges is None:
+            area_ranges = [(self.min_contour_area, self.max_contour_area)]
+        min_areas, max_areas = np.array(area_ranges, dtype=np.float64).reshape(-1, 2).T
+        prefilter_area = min_areas.min()
+        
+        counts = []
+        for image in images:
+            image_counts = np.zeros((len(blur_sizes), len(block_sizes), len(threshold_Cs), len(min_areas)), dtype=np.int64)
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
+            for i, blur_size in enumerate(blur_sizes):
+                with self.stage("sweep_blur"):
+                    blurred = cv2.GaussianBlur(gray, blur_size, 0)
+                    blurred_int = blurred.astype(np.int16)
+                    blurred_float = blurred.astype(np.float32)
+                for j, block_size in enumerate(block_sizes):
+                    with self.stage("sweep_local_mean"):
+                        # Разность с локальным средним так же, как в cv2.adaptiveThreshold (ADAPTIVE_THRESH_GAUSSIAN_C):
+                        # среднее - гауссово размытие блока с округлением до целого
+                        mean = cv2.GaussianBlur(blurred_float, (block_size, block_size), 0,
+                                                borderType=cv2.BORDER_REPLICATE | cv2.BORDER_ISOLATED)
+                        diff = blurred_int - np.rint(mean).astype(np.int16)
+                    for k, threshold_C in enumerate(threshold_Cs):
+                        with self.stage("sweep_binarize"):
+                            # THRESH_BINARY_INV: объект там, где пиксель не выше среднего минус floor(C)
+                            binary = (diff <= -np.floor(threshold_C)).view(np.uint8) * np.uint8(255)
+                            binary = cv2.morphologyEx(binary, cv2.MORPH_OPEN, self.morph_kernel)
+                            binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, self.morph_kernel)
+                        with self.stage("sweep_count"):
+                            if self.component_prefilter and prefilter_area > 0:
+                                binary = drop_small_components(binary, prefilter_area)
+                            contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+                            areas = contour_areas(contours)
+                            image_counts[i, j, k] = ((areas >= min_areas[:, None]) & (areas <= max_areas[:, None])).sum(axis=1)
+            counts.append(image_counts)
+        return np.array(counts, dtype=np.int64).reshape((len(counts),) + (len(blur_sizes), len(block_sizes),
+                                                                          len(threshold_Cs), len(min_areas)))
+    
     def train(self, images: list, labels: list) -> None:
         """Метод обучения не реализован, так как эта модель не требует обучения на данных с метками."""
         pass 
\ No newline at end of file
@@ -0,0 +1,163 @@
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+import numpy as np
+
+CACHE_DB_PATH = "predictions.db" # Файл постоянного уровня кэша (рядом с results.db)
+
+
+def image_digest(image: np.ndarray) -> str:
+    """Хеш содержимого изображения: форма, тип и байты пикселей (blake2b, 128 бит)."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{image.shape}{image.dtype.str}".encode())
+    digest.update(np.ascontiguousarray(image).data)
+    return digest.hexdigest()
+
+
+def file_digest(path, chunk_size=1 << 20) -> str:
+    """Хеш содержимого файла (blake2b, 128 бит), читаемого блоками по chunk_size байт."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """Кэш результатов predict() с адресацией по содержимому.
+
+    Ключ - хеш байтов изображения и хеш отпечатка модели (BaseModel.fingerprint()):
+    при изменении параметров или весов модели меняется ключ, и прежние результаты
+    просто перестают находиться. Два уровня: LRU в памяти на memory_entries записей и
+    таблица SQLite в файле db_path, которая переживает перезапуск программы. Методы
+    потокобезопасны; статистика попаданий доступна через stats().
+    """
+    def __init__(self, db_path=None, memory_entries=4096):
+        """
+        Args:
+            db_path: Путь к файлу SQLite (по умолчанию CACHE_DB_PATH).
+            memory_entries: Емкость уровня в памяти (записей).
+        """
+        self.db_path = db_path or CACHE_DB_PATH
+        self.memory_entries = memory_entries
+        self.entries = OrderedDict() # (хеш изображения, хеш модели) -> результат
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS predictions (
+                image_hash TEXT, -- Хеш байтов изображения
+                model_hash TEXT, -- Хеш отпечатка модели (класс и параметры, для CNN - хеш весов)
+                model TEXT, -- Класс модели, для просмотра и выборочной очистки
+                result INTEGER, -- Количество клеток
+                created TEXT, -- Время вычисления
+                PRIMARY KEY (image_hash, model_hash)
+            ) WITHOUT ROWID
+        """)
+        self.conn.commit()
+
+    @staticmethod
+    def model_hash(model) -> str:
+        """Хеш отпечатка модели (короткая строка для ключа кэша)."""
+        return hashlib.blake2b(model.fingerprint().encode(), digest_size=16).hexdigest()
+
+    def get(self, image_hash, model_hash):
+        """Ищет результат сначала в памяти, затем в SQLite; None при промахе."""
+        key = (image_hash, model_hash)
+        with self.lock:
+            result = self.entries.get(key)
+            if result is not None:
+                self.entries.move_to_end(key)
+                self.memory_hits += 1
+                return result
+            row = self.conn.execute("SELECT result FROM predictions WHERE image_hash = ? AND model_hash = ?",
+                                    key).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, row[0]) # Найденное на диске поднимается в уровень памяти
+            return row[0]
+
+    def put(self, image_hash, model_hash, result, model_name=""):
+        """Сохраняет результат в оба уровня."""
+        key = (image_hash, model_hash)
+        with self.lock:
+            self._remember(key, result)
+            with self.conn:
+                self.conn.execute("INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?)",
+                                  key + (model_name, result, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+
+    def _remember(self, key, result):
+        """Помещает запись в LRU в памяти; вызывается под self.lock."""
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.memory_entries:
+            self.entries.popitem(last=False)
+
+    def predict(self, model, image, image_hash=None):
+        """Возвращает model.predict(image), вычисляя его только при промахе кэша.
+
+        Args:
+            model: Модель-наследник BaseModel.
+            image: Изображение (numpy array).
+            image_hash: Готовый хеш изображения (см. image_digest), если он уже посчитан.
+
+        Returns:
+            int: Количество клеток.
+        """
+        image_hash = image_hash or image_digest(image)
+        model_hash = self.model_hash(model)
+        result = self.get(image_hash, model_hash)
+        if result is None:
+            result = int(model.predict(image))
+            self.put(image_hash, model_hash, result, type(model).__name__)
+        return result
+
+    def predict_all(self, models, image):
+        """Результаты нескольких моделей для одного изображения; хеш изображения считается один раз.
+
+        Args:
+            models: Список моделей.
+
+        Returns:
+            list: Результаты в порядке моделей.
+        """
+        image_hash = image_digest(image)
+        return [self.predict(model, image, image_hash) for model in models]
+
+    def stats(self):
+        """
+        Returns:
+            dict: Попадания в памяти и на диске, промахи, доля попаданий и число записей в памяти.
+        """
+        with self.lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {"memory_hits": self.memory_hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                    "hit_rate": hits / total if total else 0.0, "memory_entries": len(self.entries)}
+
+    def clear(self, model=None):
+        """Удаляет все записи или только записи модели с текущим отпечатком."""
+        with self.lock:
+            with self.conn:
+                if model is None:
+                    self.entries.clear()
+                    self.conn.execute("DELETE FROM predictions")
+                else:
+                    model_hash = self.model_hash(model)
+                    for key in [key for key in self.entries if key[1] == model_hash]:
+                        del self.entries[key]
+                    self.conn.execute("DELETE FROM predictions WHERE model_hash = ?", (model_hash,))
+
+    def close(self):
+        """Закрывает соединение с SQLite."""
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,161 @@
+import time
+import threading
+import tracemalloc
+from contextlib import nullcontext
+
+NULL_STAGE = nullcontext() # Контекст выключенного профилирования: без замеров и выделений памяти
+
+# tracemalloc глобален для процесса: его запускает первый профилировщик с track_memory, а
+# останавливает последний закрытый, если трассировку запустили именно профилировщики
+_tracing_lock = threading.Lock()
+_tracing_users = 0 # Число открытых профилировщиков с track_memory
+_tracing_owned = False # Запущен ли tracemalloc профилировщиками (а не вызывающим кодом)
+# Python 3.8: нет tracemalloc.reset_peak, пик сбрасывается через clear_traces(). Трассы при этом
+# забываются, поэтому объем памяти до сброса копится в _cleared_bytes, чтобы текущий объем и пик
+# оставались сравнимыми между сбросами (освобождение забытых блоков уже не вычитается)
+_HAS_RESET_PEAK = hasattr(tracemalloc, "reset_peak")
+_cleared_bytes = 0
+
+
+def _traced_memory():
+    """(текущий объем, пик) трассируемой памяти в байтах, с поправкой на сбросы через clear_traces."""
+    current, peak = tracemalloc.get_traced_memory()
+    return _cleared_bytes + current, _cleared_bytes + peak
+
+
+def _reset_peak():
+    """Начинает новый отсчет пика: reset_peak() на Python 3.9+, clear_traces() на 3.8."""
+    global _cleared_bytes
+    if _HAS_RESET_PEAK:
+        tracemalloc.reset_peak()
+    else:
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.clear_traces()
+        _cleared_bytes += current
+
+
+def _acquire_tracing():
+    """Регистрирует профилировщик, которому нужен tracemalloc, и запускает трассировку при необходимости."""
+    global _tracing_users, _tracing_owned, _cleared_bytes
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing_owned = True
+            _cleared_bytes = 0
+        _tracing_users += 1
+
+
+def _release_tracing():
+    """Снимает регистрацию; последний профилировщик останавливает трассировку, если она запущена ими."""
+    global _tracing_users, _tracing_owned
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _tracing_owned:
+            tracemalloc.stop()
+            _tracing_owned = False
+
+
+class StageProfiler:
+    """Накопитель замеров именованных стадий модели.
+
+    Для каждой стадии суммируются число вызовов, время по часам (perf_counter) и
+    процессорное время текущего потока (thread_time), а при track_memory - пиковый
+    прирост памяти Python/NumPy по tracemalloc относительно начала стадии. Вложенные
+    стадии допустимы: пик внутренней стадии учитывается и во внешней. tracemalloc
+    считает выделения всего процесса, поэтому при параллельных вызовах модели из
+    нескольких потоков пики памяти стадий включают выделения соседних потоков.
+    """
+    def __init__(self, track_memory=True):
+        """
+        Args:
+            track_memory: Замерять пиковую память стадий; запускает tracemalloc, если он не запущен.
+        """
+        self.track_memory = track_memory
+        self._tracing = False # Зарегистрирован ли профилировщик как пользователь tracemalloc
+        if track_memory:
+            _acquire_tracing()
+            self._tracing = True
+        self._stats = {} # стадия -> [вызовы, время, время CPU, пиковая память в байтах]
+        self._lock = threading.Lock()
+        self._local = threading.local() # Стек открытых стадий своего потока
+
+    def stage(self, name):
+        """Возвращает контекст замера стадии name."""
+        return _Stage(self, name)
+
+    def _enter(self):
+        stack = self._local.__dict__.setdefault("stack", [])
+        base = 0
+        if self.track_memory:
+            current, peak = _traced_memory()
+            if stack:
+                # Пик, накопленный внешней стадией до сброса, сохраняется в ее записи
+                stack[-1][1] = max(stack[-1][1], peak)
+            _reset_peak()
+            base = current
+        frame = [base, base] # [память в начале стадии, наибольший пик за время стадии]
+        stack.append(frame)
+        return frame
+
+    def _exit(self, name, frame, wall, cpu):
+        stack = self._local.stack
+        stack.pop()
+        grown = 0
+        if self.track_memory:
+            peak = max(frame[1], _traced_memory()[1])
+            grown = peak - frame[0]
+            if stack:
+                stack[-1][1] = max(stack[-1][1], peak)
+        with self._lock:
+            stats = self._stats.setdefault(name, [0, 0.0, 0.0, 0])
+            stats[0] += 1
+            stats[1] += wall
+            stats[2] += cpu
+            stats[3] = max(stats[3], grown)
+
+    def stats(self):
+        """Сводка по стадиям.
+
+        Returns:
+            dict: {стадия: {"calls", "wall_ms", "cpu_ms"[, "peak_kb"]}}; время суммарное по всем вызовам,
+            пиковая память - наибольшая за вызов (только при track_memory).
+        """
+        with self._lock:
+            stats = {}
+            for name, (calls, wall, cpu, peak) in self._stats.items():
+                stats[name] = {"calls": calls, "wall_ms": round(wall * 1000, 3), "cpu_ms": round(cpu * 1000, 3)}
+                if self.track_memory:
+                    stats[name]["peak_kb"] = round(peak / 1024, 1)
+            return stats
+
+    def reset(self):
+        """Обнуляет накопленные замеры."""
+        with self._lock:
+            self._stats = {}
+
+    def close(self):
+        """Освобождает tracemalloc: трассировка останавливается, когда закрыт последний профилировщик с track_memory."""
+        if self._tracing:
+            _release_tracing()
+            self._tracing = False
+
+
+class _Stage:
+    """Контекст замера одной стадии (создается на каждый вызов stage)."""
+    __slots__ = ("profiler", "name", "frame", "wall", "cpu")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.frame = self.profiler._enter()
+        self.cpu = time.thread_time()
+        self.wall = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.wall
+        cpu = time.thread_time() - self.cpu
+        self.profiler._exit(self.name, self.frame, wall, cpu)
+        return False
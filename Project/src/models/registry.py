@@ -0,0 +1,92 @@
+import importlib
+import threading
+import time
+
+# Компоненты, которые реестр умеет создавать: имя -> (модуль, класс)
+COMPONENT_SPECS = {
+    "ml": ("models.ml_model", "MLModel"),
+    "clustering": ("models.clustering_model", "ClusteringModel"),
+    "cnn": ("models.cnn_model", "CNNModel"),
+    "generator": ("utils.generator", "BloodCellGenerator"),
+}
+
+
+class ModelRegistry:
+    """Реестр моделей и генератора с отложенным импортом и созданием.
+
+    Модуль компонента (а вместе с ним torch/ultralytics, sklearn, scipy) импортируется,
+    а объект создается только при первом обращении через get(). warm_up() выполняет то же
+    самое в фоновом потоке, например после появления окна. Время импорта и инициализации
+    каждого компонента сохраняется в timings.
+    """
+    def __init__(self, specs=None):
+        """
+        Args:
+            specs: Словарь {имя: (модуль, класс)}; по умолчанию COMPONENT_SPECS.
+        """
+        self.specs = dict(specs or COMPONENT_SPECS)
+        self.kwargs = {name: {} for name in self.specs} # Аргументы конструкторов компонентов
+        self.timings = {} # {имя: {"import": секунды, "init": секунды}}
+        self._instances = {}
+        self._locks = {name: threading.Lock() for name in self.specs}
+
+    def configure(self, name, **kwargs):
+        """Задает аргументы конструктора компонента; действует до его первого создания."""
+        if name in self._instances:
+            raise RuntimeError(f"Компонент {name} уже создан")
+        self.kwargs[name].update(kwargs)
+        return self
+
+    def get(self, name):
+        """Возвращает компонент, при первом обращении импортируя модуль и создавая объект."""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        # Блокировка на компонент: параллельные обращения дождутся одного создания
+        with self._locks[name]:
+            if name not in self._instances:
+                module_name, class_name = self.specs[name]
+                start = time.perf_counter()
+                module = importlib.import_module(module_name)
+                imported = time.perf_counter()
+                instance = getattr(module, class_name)(**self.kwargs[name])
+                self.timings[name] = {"import": imported - start, "init": time.perf_counter() - imported}
+                self._instances[name] = instance
+        return self._instances[name]
+
+    def is_loaded(self, name):
+        """Создан ли уже компонент."""
+        return name in self._instances
+
+    def warm_up(self, names=None, on_ready=None):
+        """Создает компоненты в фоновом потоке.
+
+        Args:
+            names: Имена компонентов в порядке загрузки (по умолчанию все).
+            on_ready: Вызывается в фоновом потоке как on_ready(имя, ошибка или None) после каждого компонента.
+
+        Returns:
+            threading.Thread: Запущенный поток прогрева.
+        """
+        def run():
+            for name in names or list(self.specs):
+                try:
+                    self.get(name)
+                    error = None
+                except Exception as e: # Ошибка одного компонента не должна останавливать остальные
+                    error = e
+                if on_ready is not None:
+                    on_ready(name, error)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def report(self):
+        """Возвращает текстовый отчет о времени импорта и инициализации созданных компонентов."""
+        lines = [f"{'компонент':<12}{'импорт, с':>12}{'создание, с':>14}"]
+        for name, timing in self.timings.items():
+            lines.append(f"{name:<12}{timing['import']:>12.3f}{timing['init']:>14.3f}")
+        total = sum(t["import"] + t["init"] for t in self.timings.values())
+        lines.append(f"{'итого':<12}{total:>26.3f}")
+        return "\n".join(lines)
@@ -0,0 +1,180 @@
+import numpy as np
+import cv2
+
+
+class LawsTextureEngine:
+    """Вычисление карт текстурной энергии Laws сепарабельными 1D свертками.
+
+    Каждое 2D ядро Laws - внешнее произведение двух 1D фильтров, поэтому вместо 16 полных
+    2D сверток выполняется 4 вертикальных прохода (по одному на 1D фильтр) и по одному
+    горизонтальному проходу на каждую нужную пару. Симметричные пары (например, L5E5 и E5L5)
+    накапливаются в один буфер модулей откликов, и сглаживание окном выполняется один раз
+    на объединенную карту. Ядра создаются один раз в конструкторе, вычисления идут в float32.
+    """
+    # 1D фильтры Laws для выделения различных текстурных признаков
+    FILTERS_1D = {
+        'L5': [1, 4, 6, 4, 1], # Level (усреднение)
+        'E5': [-1, -2, 0, 2, 1], # Edge (край)
+        'S5': [-1, 0, 2, 0, -1], # Spot (пятно/точка)
+        'R5': [1, -4, 6, -4, 1], # Ripple (волна)
+    }
+    # Объединенные карты: имя -> пары (вертикальный фильтр, горизонтальный фильтр), энергии которых усредняются
+    COMBINED = {
+        'E5E5': [('E5', 'E5')],
+        'S5S5': [('S5', 'S5')],
+        'R5R5': [('R5', 'R5')],
+        'L5E5': [('L5', 'E5'), ('E5', 'L5')],
+        'L5S5': [('L5', 'S5'), ('S5', 'L5')],
+        'L5R5': [('L5', 'R5'), ('R5', 'L5')],
+        'E5S5': [('E5', 'S5'), ('S5', 'E5')],
+        'E5R5': [('E5', 'R5'), ('R5', 'E5')],
+        'S5R5': [('S5', 'R5'), ('R5', 'S5')],
+    }
+
+    # Отклик одномерного фильтра Laws зависит от пикселей на расстоянии до 2 от центра
+    LAWS_RADIUS = 2
+    # Число буферов размером со строку изображения, нужных при обработке полосы (см. feature_stack_tiled)
+    STRIP_BUFFERS = 10
+
+    def __init__(self, kernel_size=15, dtype=np.float32):
+        """
+        Args:
+            kernel_size: Размер окна локального среднего и окна усреднения энергии.
+            dtype: Тип вычислений (float32 по умолчанию, float64 для сверки с эталоном).
+        """
+        self.kernel_size = kernel_size
+        self.dtype = dtype
+        # Вертикальные ядра (5x1) и горизонтальные ядра (1x5) для cv2.filter2D.
+        # filter2D вычисляет корреляцию, а не свертку: для симметричных L5, S5, R5 это одно и то же,
+        # а у антисимметричного E5 меняется только знак отклика, который убирается модулем.
+        self.vertical = {name: np.array(f, dtype=dtype).reshape(-1, 1) for name, f in self.FILTERS_1D.items()}
+        self.horizontal = {name: np.array(f, dtype=dtype).reshape(1, -1) for name, f in self.FILTERS_1D.items()}
+
+    @property
+    def halo(self):
+        """Ширина перекрытия полос: на сколько строк распространяется влияние края полосы
+        через три последовательных шага (локальное среднее, фильтр Laws, окно энергии)."""
+        return self.kernel_size // 2 + self.LAWS_RADIUS + self.kernel_size // 2
+
+    def zero_mean(self, image):
+        """Вычитание локального среднего (окно kernel_size x kernel_size, симметричное отражение края)."""
+        image = image.astype(self.dtype, copy=False)
+        # BORDER_REFLECT соответствует boundary='symm' в scipy.signal.convolve2d
+        local_mean = cv2.blur(image, (self.kernel_size, self.kernel_size), borderType=cv2.BORDER_REFLECT)
+        return np.subtract(image, local_mean, out=local_mean)
+
+    def combined_energies(self, image):
+        """Вычисляет 9 объединенных карт текстурной энергии.
+
+        Результат совпадает (в пределах точности float32) с последовательностью
+        ClusteringModel.apply_laws_filters + combine_symmetric_energies.
+
+        Args:
+            image: Изображение в оттенках серого.
+
+        Returns:
+            dict: Карты энергии {имя: массив того же размера, что и image}.
+        """
+        image = self.zero_mean(image)
+        # Вертикальный проход каждым 1D фильтром выполняется один раз и переиспользуется всеми парами
+        columns = {name: cv2.filter2D(image, -1, kernel, borderType=cv2.BORDER_REFLECT)
+                   for name, kernel in self.vertical.items()}
+
+        response = np.empty_like(image) # Буфер отклика одного 2D фильтра
+        accumulator = np.empty_like(image) # Сумма модулей откликов симметричной пары
+        combined = {}
+        ksize = (self.kernel_size, self.kernel_size)
+        for name, pairs in self.COMBINED.items():
+            for i, (vertical, horizontal) in enumerate(pairs):
+                target = accumulator if i == 0 else response
+                cv2.filter2D(columns[vertical], -1, self.horizontal[horizontal], dst=target,
+                             borderType=cv2.BORDER_REFLECT)
+                np.abs(target, out=target)
+                if i > 0:
+                    np.add(accumulator, target, out=accumulator)
+            # Усреднение окном линейно, поэтому среднее энергий пары равно энергии среднего модуля откликов
+            energy = cv2.boxFilter(accumulator, ddepth=-1, ksize=ksize)
+            if len(pairs) > 1:
+                energy *= 1.0 / len(pairs)
+            combined[name] = energy
+        return combined
+
+    def feature_stack_tiled(self, image, feature_size, memory_limit_mb=64, out=None):
+        """Вычисляет уменьшенный стек признаков по горизонтальным полосам с перекрытием.
+
+        Полные карты энергии не хранятся: каждая полоса (с перекрытием halo строк сверху и
+        снизу) обрабатывается в заранее выделенных float32 буферах, из неё сразу берутся строки,
+        нужные для билинейного уменьшения до feature_size, и буферы переиспользуются следующей
+        полосой. Высота полосы подбирается так, чтобы рабочие буферы уложились в memory_limit_mb.
+        Результат совпадает (в пределах точности float32) с
+        ClusteringModel.build_feature_stack(image, combined_energies(image)).
+
+        Args:
+            image: Изображение в оттенках серого (uint8).
+            feature_size: Размер сетки признаков (ширина, высота).
+            memory_limit_mb: Ограничение памяти рабочих буферов полос, МБ.
+            out: Необязательный буфер float32 (высота, ширина, 10) для результата.
+
+        Returns:
+            np.ndarray: Стек признаков (высота, ширина, 9 текстур + 1 изображение) в float32.
+        """
+        h, w = image.shape[:2]
+        fw, fh = feature_size
+        names = sorted(self.COMBINED) # Порядок каналов как в ClusteringModel.build_feature_stack
+        if out is None:
+            out = np.empty((fh, fw, len(names) + 1), dtype=np.float32)
+        # Канал исходного изображения уменьшается целиком: само изображение uint8 уже в памяти
+        out[:, :, -1] = cv2.resize(image, (fw, fh))
+
+        # Исходные строки и веса билинейной интерполяции для каждой выходной строки (как в cv2.resize)
+        fy = (np.arange(fh) + 0.5) * (h / fh) - 0.5
+        y0 = np.floor(fy).astype(int)
+        wy = (fy - y0).astype(np.float32)
+        wy[y0 < 0] = 0
+        y0 = np.clip(y0, 0, h - 1)
+        wy[y0 >= h - 1] = 0
+        y1 = np.minimum(y0 + 1, h - 1)
+
+        # Высота ядра полосы из ограничения памяти (минимум одна строка)
+        halo = self.halo
+        row_bytes = w * np.dtype(np.float32).itemsize * self.STRIP_BUFFERS
+        core = max(1, int(memory_limit_mb * 2 ** 20 // row_bytes) - 2 * halo - 1)
+        max_rows = min(h, core + 1 + 2 * halo)
+        buffers = {name: np.empty((max_rows, w), dtype=np.float32)
+                   for name in ['image', 'mean', 'response', 'accumulator', 'energy'] + list(self.vertical)}
+        ksize = (self.kernel_size, self.kernel_size)
+
+        for c0 in range(0, h, core):
+            c1 = min(c0 + core, h)
+            rows = np.nonzero((y0 >= c0) & (y0 < c1))[0] # Выходные строки, опирающиеся на эту полосу
+            if len(rows) == 0:
+                continue
+            # Полоса с перекрытием; +1 строка снизу для второй точки интерполяции
+            s0, s1 = max(0, c0 - halo), min(h, c1 + 1 + halo)
+            n = s1 - s0
+            zm, mean = buffers['image'][:n], buffers['mean'][:n]
+            np.copyto(zm, image[s0:s1], casting='unsafe')
+            cv2.blur(zm, ksize, dst=mean, borderType=cv2.BORDER_REFLECT)
+            np.subtract(zm, mean, out=zm)
+            columns = {name: cv2.filter2D(zm, -1, kernel, dst=buffers[name][:n], borderType=cv2.BORDER_REFLECT)
+                       for name, kernel in self.vertical.items()}
+
+            accumulator, response = buffers['accumulator'][:n], buffers['response'][:n]
+            energy = buffers['energy'][:n]
+            top, bottom, weight = y0[rows] - s0, y1[rows] - s0, wy[rows, None]
+            for k, name in enumerate(names):
+                pairs = self.COMBINED[name]
+                for i, (vertical, horizontal) in enumerate(pairs):
+                    target = accumulator if i == 0 else response
+                    cv2.filter2D(columns[vertical], -1, self.horizontal[horizontal], dst=target,
+                                 borderType=cv2.BORDER_REFLECT)
+                    np.abs(target, out=target)
+                    if i > 0:
+                        np.add(accumulator, target, out=accumulator)
+                cv2.boxFilter(accumulator, ddepth=-1, ksize=ksize, dst=energy)
+                if len(pairs) > 1:
+                    energy *= 1.0 / len(pairs)
+                # Вертикальная интерполяция нужных строк, затем горизонтальное уменьшение средствами OpenCV
+                sampled = energy[top] * (1 - weight) + energy[bottom] * weight
+                out[rows, :, k] = cv2.resize(sampled, (fw, len(rows)), interpolation=cv2.INTER_LINEAR)
+        return out
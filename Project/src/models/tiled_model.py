@@ -0,0 +1,166 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import cv2
+from .base_model import BaseModel
+
+
+def open_large_image(path):
+    """Открывает изображение для подсчета по фрагментам.
+
+    Файлы .npy отображаются в память (np.load(mmap_mode='r')): фрагменты читаются с диска
+    по мере обращения, и изображение целиком в память не загружается. Остальные форматы
+    читаются cv2.imread полностью - для них выигрыш только в пиковой памяти моделей.
+    """
+    if os.path.splitext(path)[1].lower() == ".npy":
+        return np.load(path, mmap_mode="r")
+    image = cv2.imread(path)
+    if image is None:
+        raise ValueError(f"Не удалось открыть изображение: {path}")
+    return image
+
+
+def tile_starts(length, tile, overlap):
+    """Начала фрагментов вдоль одной оси; последний фрагмент прижат к краю изображения."""
+    if length <= tile:
+        return [0]
+    stride = tile - overlap
+    starts = list(range(0, length - tile, stride))
+    starts.append(length - tile)
+    return starts
+
+
+def owned_bounds(starts, length, tile):
+    """Границы зон ответственности фрагментов: середины перекрытий соседних фрагментов."""
+    ends = [min(s + tile, length) for s in starts]
+    middles = [(ends[i] + starts[i + 1]) / 2 for i in range(len(starts) - 1)]
+    return list(zip([0] + middles, middles + [length]))
+
+
+class TiledModel(BaseModel):
+    """Подсчет клеток на больших изображениях (целых препаратах) скользящим окном.
+
+    Изображение разбивается на фрагменты tile_size x tile_size с перекрытием overlap,
+    каждый фрагмент обрабатывается моделью-основой через detect(). Каждый фрагмент
+    отвечает только за свою зону - от середины перекрытия с предыдущим соседом до середины
+    перекрытия со следующим, поэтому клетка в перекрытии учитывается одним фрагментом.
+    Клетки на самой границе зон могут попасть в оба фрагмента с немного разными центрами:
+    такие пары (ближе merge_radius пикселей, из разных фрагментов) объединяются.
+
+    Фрагменты вырезаются в рабочих потоках непосредственно перед обработкой, поэтому в памяти
+    одновременно находится не больше workers * batch_size фрагментов, а изображение,
+    отображенное в память (см. open_large_image), не загружается целиком.
+    """
+    def __init__(self, model, tile_size=1024, overlap=128, merge_radius=8, workers=1, batch_size=1, scale=1.0):
+        """
+        Args:
+            model: Модель-основа (наследник BaseModel с реализованным detect()).
+            tile_size: Сторона фрагмента в пикселях исходного изображения.
+            overlap: Ширина перекрытия соседних фрагментов (не меньше диаметра клетки).
+            merge_radius: Расстояние, в пределах которого центры из соседних фрагментов считаются одной клеткой.
+            workers: Количество потоков обработки фрагментов.
+            batch_size: Количество фрагментов в одном вызове detect_batch модели (если модель его поддерживает).
+            scale: Масштаб фрагмента перед подачей в модель - для препаратов, снятых при другом
+                увеличении, чем изображения, под которые настроена модель.
+        """
+        if not 0 <= overlap < tile_size:
+            raise ValueError("overlap должен быть неотрицательным и меньше tile_size")
+        self.model = model
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.merge_radius = merge_radius
+        self.workers = workers
+        self.batch_size = batch_size
+        self.scale = scale
+
+    def tiles(self, shape):
+        """Список фрагментов (x0, y0, x1, y1, зона ответственности (ox0, oy0, ox1, oy1)) для изображения формы shape."""
+        h, w = shape[:2]
+        xs, ys = tile_starts(w, self.tile_size, self.overlap), tile_starts(h, self.tile_size, self.overlap)
+        x_owned, y_owned = owned_bounds(xs, w, self.tile_size), owned_bounds(ys, h, self.tile_size)
+        tiles = []
+        for y0, (oy0, oy1) in zip(ys, y_owned):
+            for x0, (ox0, ox1) in zip(xs, x_owned):
+                tiles.append((x0, y0, min(x0 + self.tile_size, w), min(y0 + self.tile_size, h), (ox0, oy0, ox1, oy1)))
+        return tiles
+
+    def _detect_tiles(self, image, batch):
+        """Обрабатывает пачку фрагментов; возвращает центры в координатах всего изображения,
+        оставляя только те, что лежат в зоне ответственности своего фрагмента."""
+        crops = []
+        for x0, y0, x1, y1, _ in batch:
+            crop = np.ascontiguousarray(image[y0:y1, x0:x1]) # Для memmap здесь происходит чтение с диска
+            if self.scale != 1.0:
+                crop = cv2.resize(crop, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+            crops.append(crop)
+
+        detect_batch = getattr(self.model, "detect_batch", None)
+        if len(crops) > 1 and detect_batch is not None:
+            results = detect_batch(crops)
+        else:
+            results = [self.model.detect(crop) for crop in crops]
+
+        found = []
+        for (x0, y0, _, _, (ox0, oy0, ox1, oy1)), centers in zip(batch, results):
+            centers = np.asarray(centers, dtype=np.float32).reshape(-1, 2) / self.scale + (x0, y0)
+            inside = ((centers[:, 0] >= ox0) & (centers[:, 0] < ox1) &
+                      (centers[:, 1] >= oy0) & (centers[:, 1] < oy1))
+            found.append(centers[inside])
+        return found
+
+    def merge(self, centers, tile_ids):
+        """Объединяет центры из разных фрагментов, лежащие ближе merge_radius друг к другу.
+
+        Поиск соседей через хеш-сетку с ячейкой merge_radius: для каждой точки проверяются
+        только 9 соседних ячеек, поэтому время линейно по числу точек.
+        """
+        if self.merge_radius <= 0 or len(centers) == 0:
+            return centers
+        radius2 = self.merge_radius ** 2
+        cells = np.floor(centers / self.merge_radius).astype(np.int64).tolist()
+        grid = {} # Ячейка сетки -> индексы принятых точек
+        keep = []
+        for i, (cx, cy) in enumerate(cells):
+            neighbors = [j for dx in (-1, 0, 1) for dy in (-1, 0, 1) for j in grid.get((cx + dx, cy + dy), ())]
+            if any(tile_ids[j] != tile_ids[i] and np.sum((centers[i] - centers[j]) ** 2) <= radius2
+                   for j in neighbors):
+                continue # Эта клетка уже найдена соседним фрагментом
+            grid.setdefault((cx, cy), []).append(i)
+            keep.append(i)
+        return centers[keep]
+
+    def detect(self, image: np.ndarray) -> np.ndarray:
+        """Центры клеток на всем изображении (массив (k, 2) координат (x, y)) без повторов в перекрытиях."""
+        tiles = self.tiles(image.shape)
+        batches = [tiles[i:i + self.batch_size] for i in range(0, len(tiles), self.batch_size)]
+        with self.stage("detect_tiles"):
+            if self.workers > 1:
+                # map отдает задачи пулу, но фрагменты вырезаются только в момент обработки
+                with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                    results = executor.map(lambda batch: self._detect_tiles(image, batch), batches)
+                    per_tile = [centers for batch_result in results for centers in batch_result]
+            else:
+                per_tile = [centers for batch in batches for centers in self._detect_tiles(image, batch)]
+
+        if not per_tile:
+            return np.empty((0, 2), dtype=np.float32)
+        centers = np.concatenate(per_tile)
+        tile_ids = np.repeat(np.arange(len(per_tile)), [len(c) for c in per_tile])
+        with self.stage("merge"):
+            return self.merge(centers, tile_ids)
+
+    def fingerprint(self) -> str:
+        """Параметры разбиения и отпечаток модели-основы."""
+        return f"{super().fingerprint()}|model={self.model.fingerprint()}"
+
+    def predict(self, image: np.ndarray) -> int:
+        """Количество клеток на всем изображении."""
+        return len(self.detect(image))
+
+    def predict_path(self, path) -> int:
+        """Количество клеток на изображении из файла (.npy читается по фрагментам, см. open_large_image)."""
+        return self.predict(open_large_image(path))
+
+    def train(self, images: list, labels: list) -> None:
+        """Обучение передается модели-основе."""
+        self.model.train(images, labels)
@@ -0,0 +1,139 @@
+import threading
+import cv2
+from .filters import ImageFilters
+
+PREVIEW_SIZE = 800 # Наибольшая сторона уменьшенной копии для предпросмотра
+
+
+def downscale(image, max_size):
+    """Уменьшает изображение так, чтобы большая сторона не превышала max_size (меньшие возвращаются как есть)."""
+    height, width = image.shape[:2]
+    if max(height, width) <= max_size:
+        return image
+    scale = max_size / max(height, width)
+    return cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+
+
+class FilterChain:
+    """Неразрушающая цепочка фильтров над исходным изображением.
+
+    Исходное изображение не изменяется: результат каждой стадии хранится в кэше по
+    префиксу цепочки, поэтому при изменении стадии пересчитываются только она и
+    стадии после нее. Цепочка вычисляется в двух разрешениях - на уменьшенной копии
+    (не больше preview_size по большей стороне) для мгновенного предпросмотра и на
+    исходном изображении, которое считается только по запросу (например, перед
+    анализом). Изменять цепочку можно из потока интерфейса, пока рабочие потоки
+    вычисляют результат: вычисление идет по снимку стадий, а устаревшие результаты
+    в кэш не попадают.
+    """
+    FILTERS = {
+        "blur": ImageFilters.blur,
+        "sharpen": ImageFilters.sharpen,
+        "contrast": ImageFilters.contrast,
+        "gradient": ImageFilters.gradient,
+    }
+
+    def __init__(self, image=None, preview_size=PREVIEW_SIZE):
+        """
+        Args:
+            image: Исходное изображение (numpy array); можно задать позже через set_image.
+            preview_size: Наибольшая сторона уменьшенной копии для предпросмотра.
+        """
+        self.preview_size = preview_size
+        self.original = None
+        self.proxy = None # Уменьшенная копия исходного изображения
+        self.stages = () # Стадии: (название фильтра, ((параметр, значение), ...))
+        self.version = 0 # Номер исходного изображения; растет при каждом set_image
+        self.caches = {False: {}, True: {}} # полное разрешение? -> {префикс стадий: результат}
+        self.lock = threading.Lock() # Защищает стадии и кэши
+        # Одно вычисление на разрешение: параллельные запросы ждут его и берут результат из кэша
+        self.render_locks = {False: threading.Lock(), True: threading.Lock()}
+        if image is not None:
+            self.set_image(image)
+
+    def set_image(self, image):
+        """Задает новое исходное изображение; цепочка стадий и кэши сбрасываются."""
+        proxy = downscale(image, self.preview_size)
+        with self.lock:
+            self.original = image
+            self.proxy = proxy
+            self.version += 1
+            self.stages = ()
+            for cache in self.caches.values():
+                cache.clear()
+
+    @classmethod
+    def stage(cls, name, **params):
+        """Описание стадии для set_stages: название фильтра из FILTERS и его параметры."""
+        if name not in cls.FILTERS:
+            raise ValueError(f"Неизвестный фильтр: {name}")
+        return (name, tuple(sorted(params.items())))
+
+    def set_stages(self, stages):
+        """Заменяет цепочку; результаты общего с прежней цепочкой префикса остаются в кэше."""
+        with self.lock:
+            self.stages = tuple(stages)
+            for cache in self.caches.values():
+                for key in [key for key in cache if key != self.stages[:len(key)]]:
+                    del cache[key]
+
+    def append(self, name, **params):
+        """Добавляет фильтр в конец цепочки."""
+        self.set_stages(self.stages + (self.stage(name, **params),))
+
+    def replace(self, index, name, **params):
+        """Заменяет стадию index; стадии до нее не пересчитываются."""
+        stages = list(self.stages)
+        stages[index] = self.stage(name, **params)
+        self.set_stages(stages)
+
+    def remove(self, index=-1):
+        """Удаляет стадию index (по умолчанию последнюю)."""
+        stages = list(self.stages)
+        del stages[index]
+        self.set_stages(stages)
+
+    def clear(self):
+        """Убирает все фильтры: результатом становится исходное изображение."""
+        self.set_stages(())
+
+    def key(self):
+        """Ключ текущего результата (номер изображения и стадии), например для кэша отображения."""
+        with self.lock:
+            return (self.version, self.stages)
+
+    def render(self, full_resolution=False):
+        """Вычисляет результат текущей цепочки, начиная с самого длинного закэшированного префикса.
+
+        Args:
+            full_resolution: True - на исходном изображении, False - на уменьшенной копии.
+
+        Returns:
+            tuple: (ключ результата, изображение); ключ совпадает с key() на момент вызова.
+        """
+        with self.render_locks[full_resolution]:
+            with self.lock:
+                if self.original is None:
+                    raise ValueError("Изображение не задано")
+                version, stages = self.version, self.stages
+                cache = self.caches[full_resolution]
+                start = len(stages)
+                while start > 0 and stages[:start] not in cache:
+                    start -= 1
+                image = cache[stages[:start]] if start else (self.original if full_resolution else self.proxy)
+            for i in range(start, len(stages)):
+                name, params = stages[i]
+                image = self.FILTERS[name](image, **dict(params))
+                with self.lock:
+                    # Цепочку могли изменить во время вычисления: кэшируются только актуальные префиксы
+                    if self.version == version and self.stages[:i + 1] == stages[:i + 1]:
+                        cache[stages[:i + 1]] = image
+            return (version, stages), image
+
+    def preview(self):
+        """Результат цепочки на уменьшенной копии."""
+        return self.render()[1]
+
+    def result(self):
+        """Результат цепочки в полном разрешении."""
+        return self.render(full_resolution=True)[1]
@@ -2,33 +2,50 @@ import cv2
 import numpy as np
 
 class ImageFilters:
+    # Ядро резкости создается один раз, а не на каждый вызов sharpen
+    SHARPEN_KERNEL = np.array([[-1,-1,-1],
+                               [-1, 9,-1],
+                               [-1,-1,-1]], dtype=np.float32)
+
+    # Все фильтры принимают необязательный dst - массив для результата нужной формы и типа.
+    # При повторной обработке кадров одного размера это избавляет от выделения памяти на каждый вызов.
+
     @staticmethod
-    def blur(image):
+    def blur(image, dst=None):
         """Применяет фильтр Гаусса для размытия изображения."""
-        return cv2.GaussianBlur(image, (5, 5), 0)
-    
+        return cv2.GaussianBlur(image, (5, 5), 0, dst=dst)
+
     @staticmethod
-    def sharpen(image):
+    def sharpen(image, dst=None):
         """Применяет ядро свертки для увеличения резкости изображения."""
-        kernel = np.array([[-1,-1,-1],
-                          [-1, 9,-1],
-                          [-1,-1,-1]])
-        return cv2.filter2D(image, -1, kernel)
-    
+        return cv2.filter2D(image, -1, ImageFilters.SHARPEN_KERNEL, dst=dst)
+
     @staticmethod
-    def gradient(image):
-        """Вычисляет градиент изображения по осям X и Y с использованием оператора Собеля и возвращает величину градиента."""
+    def gradient(image, dst=None, buffers=None):
+        """Вычисляет градиент изображения по осям X и Y с использованием оператора Собеля и возвращает величину градиента.
+
+        Градиенты и величина считаются в float32 (результат тоже float32).
+
+        Args:
+            image: Входное изображение.
+            dst: Массив float32 для величины градиента.
+            buffers: Словарь для промежуточных градиентов по X и Y, переиспользуемых между вызовами
+                (заполняется при первом вызове); None - новые массивы на каждый вызов.
+        """
+        if buffers is None:
+            buffers = {}
         # Применяем оператор Собеля для нахождения градиентов по X и Y
-        sobelx = cv2.Sobel(image, cv2.CV_64F, 1, 0, ksize=3)
-        sobely = cv2.Sobel(image, cv2.CV_64F, 0, 1, ksize=3)
-        # Вычисляем величину градиента как корень из суммы квадратов градиентов
-        return np.sqrt(sobelx**2 + sobely**2)
-    
+        sobelx = cv2.Sobel(image, cv2.CV_32F, 1, 0, ksize=3, dst=buffers.get("sobelx"))
+        sobely = cv2.Sobel(image, cv2.CV_32F, 0, 1, ksize=3, dst=buffers.get("sobely"))
+        buffers["sobelx"], buffers["sobely"] = sobelx, sobely
+        # Вычисляем величину градиента как корень из суммы квадратов градиентов одним проходом
+        return cv2.magnitude(sobelx, sobely, dst)
+
     @staticmethod
-    def contrast(image, alpha=1.5, beta=0):
+    def contrast(image, alpha=1.5, beta=0, dst=None):
         """Регулирует контраст и яркость изображения с помощью линейного преобразования."""
         # Применяем преобразование new_image = alpha*old_image + beta
         # alpha: коэффициент усиления (влияет на контраст, >1 увеличивает, <1 уменьшает)
         # beta: сдвиг (влияет на яркость, >0 увеличивает)
-        adjusted = cv2.convertScaleAbs(image, alpha=alpha, beta=beta)
-        return adjusted
\ No newline at end of file
+        adjusted = cv2.convertScaleAbs(image, dst=dst, alpha=alpha, beta=beta)
+        return adjusted
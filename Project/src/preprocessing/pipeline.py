@@ -0,0 +1,148 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import cv2
+import numpy as np
+from .filters import ImageFilters
+
+
+class FilterPipeline:
+    """Последовательность фильтров ImageFilters для обработки наборов изображений.
+
+    Промежуточные результаты пишутся в рабочие буферы (dst=), которые выделяются на
+    первом кадре и переиспользуются всеми кадрами того же размера; результаты списка
+    одинаковых по размеру изображений пишутся прямо в один заранее выделенный массив.
+    Подряд идущие шаги contrast сливаются в один шаг: для uint8 входа это один проход
+    cv2.LUT по таблице из 256 значений, совпадающий с последовательным применением шагов.
+    Фрагменты списка по chunk_size изображений могут обрабатываться в пуле из workers
+    потоков: OpenCV отпускает GIL, у каждого фрагмента свои буферы.
+
+    Пример:
+        pipeline = FilterPipeline(["blur", ("contrast", {"alpha": 2.0})], workers=4)
+        results = pipeline.run(images)
+    """
+    def __init__(self, steps, workers=1, chunk_size=16):
+        """
+        Args:
+            steps: Шаги - названия методов ImageFilters или пары (название, словарь параметров).
+            workers: Число потоков для обработки фрагментов (1 - в текущем потоке).
+            chunk_size: Число изображений во фрагменте, который обрабатывается одной задачей пула.
+        """
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.steps = [] # (название, параметры); слитые шаги contrast - ("contrast", [параметры, ...])
+        for step in steps:
+            name, params = (step, {}) if isinstance(step, str) else step
+            if name not in ("blur", "sharpen", "gradient", "contrast"):
+                raise ValueError(f"Неизвестный фильтр: {name}")
+            if name == "contrast":
+                params = {"alpha": 1.5, "beta": 0, **params} # Значения по умолчанию ImageFilters.contrast
+                if self.steps and self.steps[-1][0] == "contrast":
+                    self.steps[-1][1].append(params) # Сливаем с предыдущим шагом contrast
+                    continue
+                params = [params]
+            self.steps.append((name, params))
+        # Номер шага -> таблицы cv2.LUT слитых шагов contrast: всех шагов и всех, кроме первого
+        self.luts = {i: (self._contrast_lut(params), self._contrast_lut(params[1:]))
+                     for i, (name, params) in enumerate(self.steps) if name == "contrast" and len(params) > 1}
+
+    @staticmethod
+    def _contrast_lut(params):
+        """Таблица значений uint8 после последовательных шагов contrast с параметрами params."""
+        table = np.arange(256, dtype=np.uint8).reshape(1, 256)
+        for step_params in params:
+            table = cv2.convertScaleAbs(table, alpha=step_params["alpha"], beta=step_params["beta"])
+        return table
+
+    def _apply_step(self, i, image, dst, buffers):
+        name, params = self.steps[i]
+        if name == "gradient":
+            return ImageFilters.gradient(image, dst, buffers.setdefault(("gradient", i), {}))
+        if name == "contrast":
+            if len(params) == 1:
+                return ImageFilters.contrast(image, dst=dst, **params[0]) # Одиночный шаг быстрее без таблицы
+            if image.dtype != np.uint8:
+                # Для других типов (например, после gradient) первый шаг приводит к uint8, остальные - по таблице
+                image = ImageFilters.contrast(image, dst=dst, **params[0])
+                return cv2.LUT(image, self.luts[i][1], dst=dst)
+            return cv2.LUT(image, self.luts[i][0], dst=dst)
+        return getattr(ImageFilters, name)(image, dst=dst, **params)
+
+    def apply(self, image, dst=None, buffers=None):
+        """Пропускает одно изображение через все шаги.
+
+        Args:
+            image: Входное изображение (numpy array); не изменяется.
+            dst: Массив для результата нужной формы и типа; None - новый массив.
+            buffers: Словарь рабочих буферов, переиспользуемых между кадрами одного размера
+                (заполняется при первом вызове); None - новые массивы на каждый вызов.
+
+        Returns:
+            np.ndarray: Результат последнего шага (dst, если он подходит по форме и типу).
+        """
+        if buffers is None:
+            buffers = {}
+        elif buffers.get("shape") != image.shape:
+            buffers.clear() # Кадр другого размера: буферы создаются заново
+            buffers["shape"] = image.shape
+        if not self.steps:
+            if dst is None:
+                return image.copy()
+            np.copyto(dst, image)
+            return dst
+        for i in range(len(self.steps)):
+            last = i == len(self.steps) - 1
+            image = self._apply_step(i, image, dst if last else buffers.get(i), buffers)
+            if not last:
+                buffers[i] = image
+        return image
+
+    def _run_chunk(self, images, out):
+        """Обрабатывает фрагмент с общими буферами; результаты пишутся в out (если задан)."""
+        buffers = {}
+        if out is None:
+            return [self.apply(image, buffers=buffers) for image in images]
+        for image, dst in zip(images, out):
+            self.apply(image, dst, buffers)
+        return list(out)
+
+    def run(self, images):
+        """Обрабатывает список изображений.
+
+        Если все изображения одного размера и типа, результаты - срезы одного массива,
+        выделенного после обработки первого изображения.
+
+        Returns:
+            list: Результаты в порядке изображений.
+        """
+        images = list(images)
+        if not images:
+            return []
+        buffers = {}
+        first = self.apply(images[0], buffers=buffers)
+        out = None
+        if all(image.shape == images[0].shape and image.dtype == images[0].dtype for image in images):
+            out = np.empty((len(images),) + first.shape, dtype=first.dtype)
+            out[0] = first
+        chunks = [(images[i:i + self.chunk_size], None if out is None else out[i:i + self.chunk_size])
+                  for i in range(1, len(images), self.chunk_size)]
+        if self.workers > 1 and len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                results = list(executor.map(lambda chunk: self._run_chunk(*chunk), chunks))
+        else:
+            results = [self._run_chunk(*chunk) for chunk in chunks]
+        if out is not None:
+            return list(out)
+        return [first] + [result for chunk_results in results for result in chunk_results]
+
+    def stream(self, images):
+        """Лениво обрабатывает поток изображений фрагментами по chunk_size * workers изображений.
+
+        Yields:
+            np.ndarray: Результаты в порядке изображений; не перезаписываются следующими фрагментами.
+        """
+        images = iter(images)
+        while True:
+            chunk = list(islice(images, self.chunk_size * max(self.workers, 1)))
+            if not chunk:
+                return
+            yield from self.run(chunk)
@@ -1,18 +1,61 @@
+import time
+_STARTED = time.perf_counter() # Момент начала импорта модуля, для отчета о времени старта
 import os
+import sys
+import argparse
+import queue
+import multiprocessing as mp
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import cv2
-from experiment_db import init_db, save_experiment
-from models.cnn_model import CNNModel
-from models.ml_model import MLModel
-from models.clustering_model import ClusteringModel
-from utils.generator import BloodCellGenerator
-
-def run_methods_on_image(image_path, ml_model, clustering_model, cnn_model):
-    """Загружает изображение по пути и запускает на нем все три модели анализа клеток."""
+import numpy as np
+from experiment_db import init_db, save_experiment, ExperimentWriter, load_processed_paths
+from models.registry import ModelRegistry
+_BASE_IMPORT_TIME = time.perf_counter() - _STARTED # Базовые импорты: OpenCV, NumPy, sqlite3
+
+def create_registry(data_dir, blend_mode="seamless", background_pool=0):
+    """Создает реестр компонентов эксперимента; модели и генератор загружаются при первом обращении."""
+    registry = ModelRegistry()
+    registry.configure("generator", data_dir=data_dir, blend_mode=blend_mode, background_pool=background_pool)
+    return registry
+
+def print_startup_report(registry, title="Время старта"):
+    """Печатает разбивку времени старта: базовые импорты и импорт/создание каждого компонента."""
+    print(f"{title}:")
+    print(f"  базовые импорты: {_BASE_IMPORT_TIME:.3f} с")
+    for line in registry.report().splitlines():
+        print(f"  {line}")
+
+def enable_profiling(models, track_memory=False):
+    """Включает замеры стадий у моделей {метод: модель} (см. BaseModel.stage)."""
+    for model in models.values():
+        model.enable_profiling(track_memory=track_memory)
+
+def collect_stage_timings(models):
+    """Забирает замеры стадий моделей за последнее изображение и обнуляет их.
+
+    Returns:
+        dict: {метод: {стадия: замеры}} или None, если профилирование выключено.
+    """
+    timings = {name: model.stage_stats() for name, model in models.items()}
+    for model in models.values():
+        model.reset_stage_stats()
+    return timings if any(timings.values()) else None
+
+def run_methods_on_image(image_path, ml_model, clustering_model, cnn_model, cache=None):
+    """Загружает изображение по пути и запускает на нем все три модели анализа клеток.
+
+    Если передан cache (models.prediction_cache.PredictionCache), модели запускаются только
+    для изображений, которые еще не анализировались с текущими параметрами моделей.
+    """
     image = cv2.imread(image_path) # Загружаем изображение с диска
     if image is None:
         raise ValueError(f"Не удалось загрузить изображение: {image_path}") # Проверяем успешность загрузки
 
+    if cache is not None:
+        return tuple(cache.predict_all([ml_model, clustering_model, cnn_model], image))
+
     # Запускаем каждую модель на изображении и получаем результаты
     method1_result = ml_model.predict(image)
     method2_result = clustering_model.predict(image)
@@ -20,19 +63,30 @@ def run_methods_on_image(image_path, ml_model, clustering_model, cnn_model):
 
     return method1_result, method2_result, method3_result # Возвращаем результаты всех моделей
 
-def process_generated_images(num_images):
-    """Генерирует заданное количество синтетических изображений, анализирует их и сохраняет результаты в БД."""
+def process_generated_images(num_images, startup_report=False, blend_mode="seamless", background_pool=0,
+                             profile=False, profile_memory=False):
+    """Генерирует заданное количество синтетических изображений, анализирует их и сохраняет результаты в БД.
+
+    При profile рядом с каждой строкой сохраняются замеры стадий моделей (колонка stage_timings),
+    при profile_memory - дополнительно пиковая память стадий.
+    """
     init_db() # Инициализируем базу данных перед началом экспериментов
 
     # Определяем базовый путь и путь к данным
     base_dir = os.path.dirname(os.path.dirname(__file__))
     data_dir = os.path.join(base_dir, "data")
     
-    # Инициализируем генератор изображений и модели анализа
-    generator = BloodCellGenerator(data_dir)
-    ml_model = MLModel()
-    clustering_model = ClusteringModel()
-    cnn_model = CNNModel()
+    # Инициализируем генератор изображений и модели анализа через реестр
+    registry = create_registry(data_dir, blend_mode, background_pool)
+    generator = registry.get("generator")
+    ml_model = registry.get("ml")
+    clustering_model = registry.get("clustering")
+    cnn_model = registry.get("cnn")
+    if startup_report:
+        print_startup_report(registry)
+    models = {"ml": ml_model, "clustering": clustering_model, "cnn": cnn_model}
+    if profile or profile_memory:
+        enable_profiling(models, track_memory=profile_memory)
     
     # Генерируем изображения и проводим эксперименты в цикле
     for i in range(num_images):
@@ -52,16 +106,319 @@ def process_generated_images(num_images):
             gen_params=str(num_cells), # Сохраняем фактическое число сгенерированных клеток как параметр генерации
             method1=m1, # Результат ML модели
             method2=m2, # Результат модели кластеризации
-            method3=m3 # Результат CNN модели
+            method3=m3, # Результат CNN модели
+            stage_timings=collect_stage_timings(models) # Замеры стадий (None без профилирования)
         )
         print(f"[Сгенерировано {i+1}/{num_images}]: OK") # Выводим прогресс
 
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff") # Расширения реальных изображений
+
+def iter_image_paths(root, extensions=IMAGE_EXTENSIONS):
+    """Лениво обходит дерево папок через os.scandir и выдает абсолютные пути изображений.
+
+    Каждая папка читается только когда до нее доходит обход, записи сортируются по имени,
+    поэтому порядок обработки одинаков от запуска к запуску.
+    """
+    stack = [os.path.abspath(root)]
+    while stack:
+        directory = stack.pop()
+        with os.scandir(directory) as entries:
+            entries = sorted(entries, key=lambda entry: entry.name)
+        subdirs = []
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            elif entry.name.lower().endswith(extensions):
+                yield entry.path
+        stack.extend(reversed(subdirs)) # Подпапки обходятся в алфавитном порядке
+
+def iter_decoded(paths, workers=4, prefetch=16):
+    """Декодирует изображения в пуле потоков, сохраняя порядок путей.
+
+    cv2.imread освобождает GIL, поэтому чтение и декодирование следующих файлов идут
+    параллельно с работой моделей. Впереди читается не больше prefetch изображений.
+
+    Yields:
+        tuple: (путь, изображение или None, если файл не удалось прочитать).
+    """
+    paths = iter(paths)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for path in paths:
+            pending.append((path, executor.submit(cv2.imread, path)))
+            if len(pending) >= prefetch:
+                break
+        while pending:
+            path, future = pending.popleft()
+            next_path = next(paths, None) # Освободившееся место в очереди занимает следующий файл
+            if next_path is not None:
+                pending.append((next_path, executor.submit(cv2.imread, next_path)))
+            yield path, future.result()
+
+def process_real_images(images_dir, decode_workers=4, prefetch=16, batch_size=50,
+                        profile=False, profile_memory=False):
+    """Анализирует реальные изображения из дерева папок и сохраняет результаты в БД.
+
+    Пути, для которых в БД уже есть строка (real_data_path), пропускаются, поэтому прерванная
+    обработка большого архива при повторном запуске продолжается с необработанных файлов.
+
+    Args:
+        images_dir: Корневая папка с изображениями (обходится рекурсивно).
+        decode_workers: Количество потоков чтения и декодирования.
+        prefetch: Сколько изображений может быть прочитано заранее.
+        batch_size: Количество строк в одной транзакции записи.
+        profile: Сохранять замеры стадий моделей в колонку stage_timings.
+        profile_memory: Замерять также пиковую память стадий.
+
+    Returns:
+        int: Количество обработанных в этом запуске изображений.
+
+    Raises:
+        SystemExit: Папка images_dir не существует (проверяется до загрузки моделей).
+    """
+    root = os.path.abspath(images_dir)
+    if not os.path.isdir(root):
+        raise SystemExit(f"Папка с изображениями не найдена: {root}")
+    init_db()
+    done = load_processed_paths(root)
+    print(f"Папка {root}: обработано ранее {len(done)} изображений")
+
+    registry = ModelRegistry()
+    models = {"ml": registry.get("ml"), "clustering": registry.get("clustering"), "cnn": registry.get("cnn")}
+    if profile or profile_memory:
+        enable_profiling(models, track_memory=profile_memory)
+
+    paths = (path for path in iter_image_paths(root) if path not in done)
+    processed = 0
+    started = time.perf_counter()
+    with ExperimentWriter(batch_size=batch_size) as writer:
+        for path, image in iter_decoded(paths, decode_workers, prefetch):
+            if image is None:
+                print(f"Не удалось загрузить изображение: {path}") # Строка не пишется: файл повторится при следующем запуске
+                continue
+            m1, m2, m3 = (model.predict(image) for model in models.values())
+            writer.add(datetime.now().strftime("%Y-%m-%d %H:%M:%S"), path, "", m1, m2, m3,
+                       collect_stage_timings(models))
+            processed += 1
+            if processed % batch_size == 0:
+                print(f"[Обработано {processed}]: {processed / (time.perf_counter() - started):.2f} изображений/с")
+    print(f"Обработано изображений: {processed} за {time.perf_counter() - started:.1f} с")
+    return processed
+
+def _generator_worker(data_dir, count, frames, stats, blend_mode, background_pool):
+    """Процесс-генератор: создает count изображений и кладет их в ограниченную очередь кадров."""
+    np.random.seed() # Каждый процесс берет собственное зерно, иначе все генераторы выдадут одинаковые кадры
+    cv2.setNumThreads(1) # Параллелизм обеспечивается процессами, а не потоками OpenCV
+    # Через реестр процесс-генератор импортирует только генератор, без torch и sklearn
+    generator = create_registry(data_dir, blend_mode, background_pool).get("generator")
+
+    busy = 0.0 # Суммарное время, затраченное на генерацию
+    for _ in range(count):
+        start = time.perf_counter()
+        image, bboxes = generator.generate_image(return_bboxes=True)
+        busy += time.perf_counter() - start
+        frames.put((image, len(bboxes))) # Блокируется, если анализ не успевает (обратное давление)
+    stats.put(("generate", count, busy))
+
+def _model_worker(worker_id, frames, results, stats, threads, startup_report, profile=False, profile_memory=False):
+    """Процесс анализа: забирает кадры из очереди, запускает три модели и отправляет строки писателю."""
+    cv2.setNumThreads(threads) # Ограничиваем внутренние потоки, чтобы воркеры не конкурировали за ядра
+
+    registry = ModelRegistry()
+    ml_model = registry.get("ml")
+    clustering_model = registry.get("clustering")
+    cnn_model = registry.get("cnn")
+    torch = sys.modules.get("torch") # torch импортирован вместе с ultralytics
+    if torch is not None:
+        torch.set_num_threads(threads)
+    if startup_report:
+        print_startup_report(registry, title=f"Время старта процесса анализа {worker_id}")
+    models = {"ml": ml_model, "clustering": clustering_model, "cnn": cnn_model}
+    if profile or profile_memory:
+        enable_profiling(models, track_memory=profile_memory)
+
+    items = 0 # Количество обработанных кадров
+    busy = 0.0 # Суммарное время работы моделей
+    while True:
+        frame = frames.get()
+        if frame is None: # Сигнал завершения от главного процесса
+            break
+        image, num_cells = frame
+
+        start = time.perf_counter()
+        m1 = ml_model.predict(image)
+        m2 = clustering_model.predict(image)
+        m3 = cnn_model.predict(image)
+        busy += time.perf_counter() - start
+
+        results.put((datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "", str(num_cells), m1, m2, m3,
+                     collect_stage_timings(models)))
+        items += 1
+    stats.put(("analyze", items, busy))
+
+def report_throughput(stage_stats, num_images, wall_time):
+    """Печатает пропускную способность каждой стадии конвейера и определяет узкое место.
+
+    Args:
+        stage_stats: Словарь {стадия: (число элементов, суммарное время работы, число воркеров)}.
+        num_images: Общее количество обработанных изображений.
+        wall_time: Полное время работы конвейера в секундах.
+    """
+    print("Пропускная способность по стадиям (изображений/с):")
+    capacities = {}
+    for stage, (items, busy, workers) in stage_stats.items():
+        per_worker = items / busy if busy > 0 else float("inf") # Скорость одного воркера стадии
+        capacities[stage] = per_worker * workers # Предельная скорость стадии при всех воркерах
+        print(f"  {stage:<9} воркеров: {workers:<3} на воркер: {per_worker:8.2f}  стадия: {capacities[stage]:8.2f}")
+    print(f"  итого: {num_images / wall_time:.2f} изображений/с за {wall_time:.1f} с")
+    print(f"Узкое место: {min(capacities, key=capacities.get)}")
+
+def process_generated_images_parallel(num_images, num_workers, num_generators=None, queue_size=None,
+                                      batch_size=50, threads_per_worker=1, startup_report=False,
+                                      blend_mode="seamless", background_pool=0, profile=False,
+                                      profile_memory=False):
+    """Конвейерная версия process_generated_images.
+
+    Процессы-генераторы заполняют ограниченную очередь кадров, процессы анализа запускают
+    на кадрах все три модели, а единственный писатель (главный процесс) сохраняет строки
+    в БД пачками.
+
+    Args:
+        num_images: Количество изображений для генерации.
+        num_workers: Количество процессов анализа.
+        num_generators: Количество процессов-генераторов (по умолчанию половина от num_workers).
+        queue_size: Емкость очереди кадров (по умолчанию 2 * num_workers).
+        batch_size: Количество строк в одной транзакции записи.
+        threads_per_worker: Число внутренних потоков OpenCV/torch на процесс анализа.
+        startup_report: Печатать разбивку времени старта каждого процесса анализа.
+        blend_mode: Режим вставки клеток генератора ("seamless" или "alpha").
+        background_pool: Размер пула фонов каждого процесса-генератора (0 - без пула).
+        profile: Сохранять замеры стадий моделей в колонку stage_timings.
+        profile_memory: Замерять также пиковую память стадий (tracemalloc, медленнее).
+
+    Returns:
+        dict: Статистика стадий {стадия: (число элементов, время работы, число воркеров)}.
+    """
+    init_db() # Инициализируем базу данных перед началом экспериментов
+
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    data_dir = os.path.join(base_dir, "data")
+
+    num_generators = num_generators or max(1, num_workers // 2)
+    queue_size = queue_size or 2 * num_workers
+
+    # spawn вместо fork: дочерние процессы не наследуют пулы потоков torch/OpenMP родителя
+    ctx = mp.get_context("spawn")
+    frames = ctx.Queue(maxsize=queue_size) # Ограниченная очередь кадров между генерацией и анализом
+    results = ctx.Queue() # Строки для писателя
+    stats = ctx.Queue() # Итоговая статистика воркеров
+
+    # Распределяем изображения между генераторами как можно равномернее
+    counts = [num_images // num_generators + (1 if k < num_images % num_generators else 0)
+              for k in range(num_generators)]
+    generators = [ctx.Process(target=_generator_worker,
+                              args=(data_dir, count, frames, stats, blend_mode, background_pool),
+                              daemon=True)
+                  for count in counts]
+    workers = [ctx.Process(target=_model_worker,
+                           args=(k, frames, results, stats, threads_per_worker, startup_report,
+                                 profile, profile_memory),
+                           daemon=True)
+               for k in range(num_workers)]
+
+    started = time.perf_counter()
+    for process in generators + workers:
+        process.start()
+
+    # Писатель: единственное соединение с БД, строки сохраняются пачками по batch_size
+    written = 0
+    write_busy = 0.0
+    with ExperimentWriter(batch_size=batch_size) as writer:
+        while written < num_images:
+            try:
+                row = results.get(timeout=1.0)
+            except queue.Empty:
+                if any(p.exitcode not in (None, 0) for p in generators + workers):
+                    raise RuntimeError("Один из процессов конвейера завершился с ошибкой")
+                continue
+
+            start = time.perf_counter()
+            writer.add(*row)
+            written += 1
+            if written % batch_size == 0 or written == num_images:
+                writer.flush()
+                print(f"[Сохранено {written}/{num_images}]: OK") # Выводим прогресс
+            write_busy += time.perf_counter() - start
+    wall_time = time.perf_counter() - started
+
+    for process in generators:
+        process.join()
+    for _ in workers:
+        frames.put(None) # По одному сигналу завершения на каждый процесс анализа
+    for process in workers:
+        process.join()
+
+    # Собираем статистику стадий
+    stage_stats = {"generate": [0, 0.0, len(generators)], "analyze": [0, 0.0, len(workers)]}
+    for _ in range(len(generators) + len(workers)):
+        stage, items, busy = stats.get()
+        stage_stats[stage][0] += items
+        stage_stats[stage][1] += busy
+    stage_stats["write"] = [written, write_busy, 1]
+    stage_stats = {stage: tuple(values) for stage, values in stage_stats.items()}
+
+    report_throughput(stage_stats, num_images, wall_time)
+    return stage_stats
+
 if __name__ == "__main__":
     """Основная точка входа для запуска массовых экспериментов."""
-    # Определяем путь к папке с изображениями для валидации (если нужно обрабатывать реальные данные)
-    # В данном случае, запускаем только генерацию изображений
-    base_dir = os.path.dirname(os.path.dirname(__file__))
+    parser = argparse.ArgumentParser(description="Массовый эксперимент на синтетических изображениях")
+    parser.add_argument("--num-images", type=int, default=50, help="количество генерируемых изображений")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="число процессов анализа; 0 - последовательный режим в одном процессе")
+    parser.add_argument("--generators", type=int, default=None, help="число процессов-генераторов")
+    parser.add_argument("--queue-size", type=int, default=None, help="емкость очереди кадров")
+    parser.add_argument("--batch-size", type=int, default=50, help="число строк в одной транзакции записи")
+    parser.add_argument("--threads-per-worker", type=int, default=1, help="потоков OpenCV/torch на процесс анализа")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="вывести время импорта и инициализации каждого компонента")
+    parser.add_argument("--blend-mode", choices=["seamless", "alpha"], default="seamless",
+                        help="вставка клеток: бесшовное клонирование или быстрое альфа-смешивание")
+    parser.add_argument("--background-pool", type=int, default=0,
+                        help="размер пула заранее синтезированных фонов; 0 - синтезировать фон для каждого кадра")
+    parser.add_argument("--real", nargs="?", const="", default=None, metavar="DIR",
+                        help="анализировать реальные изображения из папки DIR (по умолчанию dataset/val/images)")
+    parser.add_argument("--decode-workers", type=int, default=4, help="потоков чтения реальных изображений")
+    parser.add_argument("--prefetch", type=int, default=16, help="сколько реальных изображений читать заранее")
+    parser.add_argument("--profile", action="store_true",
+                        help="сохранять время и процессорное время стадий моделей в колонку stage_timings")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="дополнительно замерять пиковую память стадий (tracemalloc, замедляет анализ)")
+    args = parser.parse_args()
+
+    # Папка с изображениями для валидации - реальные данные по умолчанию для --real
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     images_dir = os.path.join(base_dir, "dataset", "val", "images")
-    
-    # Запускаем процесс обработки сгенерированных изображений (генерируем 50 изображений)
-    process_generated_images(num_images=50) 
\ No newline at end of file
+
+    if args.real is not None:
+        process_real_images(args.real or images_dir, decode_workers=args.decode_workers, prefetch=args.prefetch,
+                            batch_size=args.batch_size, profile=args.profile, profile_memory=args.profile_memory)
+    elif args.workers > 0:
+        process_generated_images_parallel(
+            args.num_images,
+            num_workers=args.workers,
+            num_generators=args.generators,
+            queue_size=args.queue_size,
+            batch_size=args.batch_size,
+            threads_per_worker=args.threads_per_worker,
+            startup_report=args.startup_report,
+            blend_mode=args.blend_mode,
+            background_pool=args.background_pool,
+            profile=args.profile,
+            profile_memory=args.profile_memory,
+        )
+    else:
+        # Запускаем процесс обработки сгенерированных изображений
+        process_generated_images(num_images=args.num_images, startup_report=args.startup_report,
+                                 blend_mode=args.blend_mode, background_pool=args.background_pool,
+                                 profile=args.profile, profile_memory=args.profile_memory)
@@ -0,0 +1,140 @@
+import threading
+import cv2
+import numpy as np
+from .random_state import random_int, random_uniform
+
+
+class BackgroundPool:
+    """Пул заранее синтезированных фонов с дешевыми случайными преобразованиями при выдаче.
+
+    Синтез фона (10 бесшовных клонирований текстур) - самая дорогая часть генерации кадра.
+    Пул один раз синтезирует pool_size фонов увеличенного размера в фоновом потоке, а каждый
+    кадр получает случайный фон из пула после случайной обрезки, отражения, поворота на 90°
+    и цветового сдвига через таблицу LUT. Каждые refresh_every выдач самый старый фон пула
+    заменяется новым (тоже в фоновом потоке), чтобы разнообразие не ограничивалось
+    начальным набором. Число фонов ограничено бюджетом памяти memory_limit_mb.
+
+    Из-за фонового синтеза последовательность фонов зависит от времени выполнения, поэтому
+    кадры с пулом не воспроизводятся точно по зерну.
+    """
+    def __init__(self, synthesize, image_size, pool_size=16, memory_limit_mb=256, refresh_every=50, margin=1.25,
+                 jitter=0.08, rng=None):
+        """
+        Args:
+            synthesize: Функция synthesize(size, rng) -> фон uint8 размера size (ширина, высота),
+                использующая генератор случайных чисел rng (np.random.RandomState).
+            image_size: Размер выдаваемого фона (ширина, высота).
+            pool_size: Желаемое количество фонов в пуле.
+            memory_limit_mb: Ограничение памяти пула, МБ; при необходимости pool_size уменьшается.
+            refresh_every: Через сколько выдач заменять самый старый фон (0 - не обновлять).
+            margin: Во сколько раз сторона синтезируемого фона больше стороны кадра (запас для обрезки).
+            jitter: Максимальное относительное изменение яркости каналов при цветовом сдвиге.
+            rng: Источник случайных чисел для выдачи фонов (np.random.Generator или None - глобальный np.random).
+        """
+        self.synthesize = synthesize
+        self.image_size = tuple(image_size)
+        side = int(np.ceil(max(self.image_size) * margin)) # Квадрат, чтобы обрезка подходила и после поворота
+        self.source_size = (side, side)
+        item_bytes = side * side * 3
+        self.pool_size = max(1, min(pool_size, int(memory_limit_mb * 2 ** 20 // item_bytes)))
+        self.refresh_every = refresh_every
+        self.jitter = jitter
+        self.rng = rng
+
+        # Отдельный генератор для синтеза в фоновом потоке; зерно берется из rng,
+        # поэтому процессы с разными зернами получают разные пулы
+        self.synthesis_rng = np.random.RandomState(random_int(rng, 0, 2 ** 31))
+        self.backgrounds = [] # Готовые фоны пула
+        self.oldest = 0 # Индекс фона, заменяемого следующим обновлением
+        self.draws = 0 # Количество выдач
+        self.refreshing = False # Идет ли обновление в фоновом потоке
+        self.closed = False
+        self.error = None # Исключение синтеза в фоновом потоке; draw() передает его вызывающему
+        self.ready = threading.Condition()
+        self._start(self._fill)
+
+    def set_rng(self, rng):
+        """Переключает выдачу на другой источник случайных чисел и заново выводит из него зерно синтеза,
+        чтобы следующие фоны пула (дозаполнение и обновления) зависели от нового источника."""
+        self.rng = rng
+        self.synthesis_rng = np.random.RandomState(random_int(rng, 0, 2 ** 31))
+
+    def _start(self, target):
+        threading.Thread(target=target, daemon=True).start()
+
+    def _fill(self):
+        """Начальное заполнение пула (в фоновом потоке); draw() может выдавать фоны уже после первого."""
+        for _ in range(self.pool_size):
+            if self.closed:
+                return
+            try:
+                background = self.synthesize(self.source_size, self.synthesis_rng)
+            except Exception as e:
+                # Без этого поток завершился бы молча, а draw() ждал бы первый фон бесконечно
+                with self.ready:
+                    self.error = e
+                    self.ready.notify_all()
+                return
+            with self.ready:
+                self.backgrounds.append(background)
+                self.ready.notify_all()
+
+    def _refresh(self):
+        """Заменяет самый старый фон пула новым (в фоновом потоке)."""
+        try:
+            background = self.synthesize(self.source_size, self.synthesis_rng)
+        except Exception as e:
+            with self.ready:
+                self.error = e
+                self.refreshing = False
+            return
+        with self.ready:
+            self.backgrounds[self.oldest] = background
+            self.oldest = (self.oldest + 1) % len(self.backgrounds)
+            self.refreshing = False
+
+    def draw(self):
+        """Возвращает новый фон размера image_size (массив uint8, принадлежащий вызывающему).
+
+        Raises:
+            RuntimeError: Синтез в фоновом потоке завершился ошибкой до появления первого фона.
+        """
+        with self.ready:
+            while not self.backgrounds:
+                if self.error is not None:
+                    raise RuntimeError("Не удалось синтезировать фон для пула") from self.error
+                self.ready.wait() # Ждем только первый синтезированный фон
+            source = self.backgrounds[random_int(self.rng, 0, len(self.backgrounds))]
+            self.draws += 1
+            # Обновление запускается, только когда пул заполнен и предыдущее обновление завершено
+            # После ошибки синтеза пул больше не обновляется и выдает уже готовые фоны
+            if (self.refresh_every and self.draws % self.refresh_every == 0 and not self.refreshing
+                    and len(self.backgrounds) == self.pool_size and not self.closed and self.error is None):
+                self.refreshing = True
+                self._start(self._refresh)
+        return self.augment(source)
+
+    def augment(self, source):
+        """Случайная обрезка, отражение, поворот на 90° и цветовой сдвиг фона source."""
+        w, h = self.image_size
+        k = random_int(self.rng, 0, 4) # Число поворотов на 90°
+        crop_w, crop_h = (h, w) if k % 2 else (w, h) # После нечетного числа поворотов стороны меняются местами
+        y = random_int(self.rng, 0, source.shape[0] - crop_h + 1)
+        x = random_int(self.rng, 0, source.shape[1] - crop_w + 1)
+        image = source[y:y + crop_h, x:x + crop_w]
+
+        flip = random_int(self.rng, -1, 3) # -1, 0, 1 - коды cv2.flip, 2 - без отражения
+        if flip != 2:
+            image = cv2.flip(image, flip)
+        if k:
+            image = cv2.rotate(image, (cv2.ROTATE_90_CLOCKWISE, cv2.ROTATE_180, cv2.ROTATE_90_COUNTERCLOCKWISE)[k - 1])
+
+        # Цветовой сдвиг: общий коэффициент яркости и небольшие поканальные отклонения в одной таблице LUT
+        brightness = 1 + random_uniform(self.rng, -self.jitter, self.jitter)
+        gains = brightness * (1 + random_uniform(self.rng, -self.jitter, self.jitter, 3) / 2)
+        lut = np.clip(np.arange(256, dtype=np.float32)[:, None] * gains.astype(np.float32), 0, 255)
+        return cv2.LUT(np.ascontiguousarray(image), lut.astype(np.uint8).reshape(1, 256, 3))
+
+    def close(self):
+        """Останавливает начальное заполнение и дальнейшие обновления пула."""
+        self.closed = True
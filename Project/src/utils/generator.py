@@ -1,17 +1,53 @@
 import os
 import cv2
 import numpy as np
+from .background_pool import BackgroundPool
+from .random_state import random_int
 
 class BloodCellGenerator:
     """Генератор синтетических изображений клеток крови для обучения и тестирования моделей."""
-    def __init__(self, data_dir, image_size=(1024, 1024)):
-        """Инициализация генератора с путями к данным и целевым размером изображения."""
+    CELL_SIZE = (100, 100) # Размер клетки на изображении (ширина, высота)
+    BLEND_MODES = ("seamless", "alpha")
+
+    def __init__(self, data_dir, image_size=(1024, 1024), blend_mode="seamless", background_pool=0,
+                 pool_memory_mb=256, pool_refresh_every=50, rng=None):
+        """Инициализация генератора с путями к данным и целевым размером изображения.
+        
+        Args:
+            data_dir: Папка с подпапками cells и backgrounds.
+            image_size: Размер генерируемого изображения (ширина, высота).
+            blend_mode: Способ вставки клеток: "seamless" - бесшовное клонирование (cv2.seamlessClone,
+                решение уравнения Пуассона для каждой клетки), "alpha" - быстрое альфа-смешивание
+                с мягкой маской. При одинаковом зерне оба режима выдают одинаковые рамки клеток.
+            background_pool: Размер пула заранее синтезированных фонов (см. BackgroundPool);
+                0 - синтезировать фон заново для каждого кадра.
+            pool_memory_mb: Ограничение памяти пула фонов, МБ.
+            pool_refresh_every: Через сколько кадров заменять самый старый фон пула.
+            rng: Собственный генератор случайных чисел (np.random.Generator); по умолчанию
+                используется глобальное состояние np.random.
+        """
+        if blend_mode not in self.BLEND_MODES:
+            raise ValueError(f"Неизвестный режим вставки клеток: {blend_mode}")
         self.cells_dir = os.path.join(data_dir, "cells") # Папка с изображениями отдельных клеток
         self.backgrounds_dir = os.path.join(data_dir, "backgrounds") # Папка с фоновыми изображениями
         self.image_size = image_size # Целевой размер генерируемого изображения (ширина, высота)
+        self.blend_mode = blend_mode
+        self.rng = rng # Источник случайных чисел (None - глобальный np.random)
 
         self.cells = self.load_cells() # Загружаем изображения клеток
         self.backgrounds = self.load_backgrounds() # Загружаем фоновые изображения
+        self.prepare_cells() # Один раз готовим уменьшенные клетки и маски для вставки
+        self.background_pool = None
+        if background_pool:
+            self.background_pool = BackgroundPool(self.synthesize_background, image_size, pool_size=background_pool,
+                                                  memory_limit_mb=pool_memory_mb, refresh_every=pool_refresh_every,
+                                                  rng=rng)
+    
+    def set_rng(self, rng):
+        """Переключает генератор (и его пул фонов) на другой источник случайных чисел."""
+        self.rng = rng
+        if self.background_pool is not None:
+            self.background_pool.set_rng(rng)
     
     def load_cells(self):
         """Загружает изображения отдельных клеток из указанной папки."""
@@ -22,6 +58,36 @@ class BloodCellGenerator:
                 cells.append(img) # Добавляем изображение в список, если оно успешно загружено
         return cells
 
+    def prepare_cells(self):
+        """Заранее уменьшает клетки до CELL_SIZE и строит маски, чтобы не делать этого при каждой вставке.
+
+        Для альфа-смешивания строится мягкая маска: непрозрачность растет с отличием пикселя
+        от цвета подложки клетки (медиана краевых пикселей), сглаживается и плавно спадает
+        к краям квадрата, чтобы на фоне не было видно границ вставки. Клетка хранится
+        умноженной на маску, поэтому смешивание - одно умножение и одно сложение на пиксель.
+        """
+        w, h = self.CELL_SIZE
+        self.cell_sprites = [cv2.resize(cell, self.CELL_SIZE) for cell in self.cells] # Уменьшенные клетки (uint8)
+        self.clone_mask = np.full((h, w, 3), 255, dtype=np.uint8) # Полная маска для seamlessClone
+
+        # Плавный спад непрозрачности к краям квадрата (расстояние до края, нормированное на ширину спада)
+        feather = max(1, min(w, h) // 10)
+        ys, xs = np.mgrid[0:h, 0:w]
+        edge_distance = np.minimum(np.minimum(xs, w - 1 - xs), np.minimum(ys, h - 1 - ys)).astype(np.float32)
+        edge_ramp = np.clip((edge_distance + 1) / feather, 0, 1)
+
+        self.cell_inverse_alphas = [] # 1 - мягкая маска, (высота, ширина, 1) в float32
+        self.cell_premultiplied = [] # Клетки, умноженные на маску, в float32
+        for sprite in self.cell_sprites:
+            sprite = sprite.astype(np.float32)
+            border = np.concatenate([sprite[0], sprite[-1], sprite[:, 0], sprite[:, -1]])
+            difference = np.linalg.norm(sprite - np.median(border, axis=0), axis=2)
+            alpha = np.clip(difference / 60.0, 0, 1) # Отличие в 60 уровней яркости и больше - полностью клетка
+            alpha = cv2.GaussianBlur(alpha, (0, 0), 2) * edge_ramp
+            alpha = alpha[:, :, None]
+            self.cell_inverse_alphas.append(1.0 - alpha)
+            self.cell_premultiplied.append(sprite * alpha)
+
     def load_backgrounds(self):
         """Загружает фоновые изображения из указанной папки и изменяет их размер."""
         backgrounds = []
@@ -34,20 +100,26 @@ class BloodCellGenerator:
 
     def generate_background(self):
         """Генерирует сложное фоновое изображение путем смешивания случайных фоновых текстур."""
+        if self.background_pool is not None:
+            return self.background_pool.draw() # Готовый фон из пула со случайными преобразованиями
+        return self.synthesize_background(self.image_size, self.rng)
+
+    def synthesize_background(self, size, rng=None):
+        """Синтезирует фон размера size (ширина, высота), используя генератор случайных чисел rng (см. random_int)."""
         # Выбираем случайное фоновое изображение в качестве основы
-        canvas = self.backgrounds[np.random.randint(0, len(self.backgrounds))] # Выбираем случайный фон
-        canvas = cv2.resize(canvas, self.image_size) # Изменяем размер под целевой
+        canvas = self.backgrounds[random_int(rng, 0, len(self.backgrounds))] # Выбираем случайный фон
+        canvas = cv2.resize(canvas, size) # Изменяем размер под целевой
 
         # Добавляем дополнительные фоновые текстуры с помощью бесшовного клонирования
         for _ in range(10): # Добавляем 10 случайных текстур
-            background = self.backgrounds[np.random.randint(0, len(self.backgrounds))] # Выбираем случайную текстуру
+            background = self.backgrounds[random_int(rng, 0, len(self.backgrounds))] # Выбираем случайную текстуру
             mask = np.full_like(background, 255) # Создаем маску для бесшовного клонирования
             
             h, w = background.shape[:2] # Размеры добавляемой текстуры
             
             # Выбираем случайный центр для размещения текстуры на холсте
-            center_y = np.random.randint(0, self.image_size[0])
-            center_x = np.random.randint(0, self.image_size[1])
+            center_y = random_int(rng, 0, size[0])
+            center_x = random_int(rng, 0, size[1])
 
             # Рассчитываем координаты углов добавляемой текстуры относительно центра
             h_left_up = center_y - h // 2
@@ -85,54 +157,67 @@ class BloodCellGenerator:
     def generate_cells(self, canvas):
         """Размещает случайное количество клеток на фоновом изображении."""
         bboxes = []  # Список для хранения координат ограничивающих рамок клеток
+        alpha_mode = self.blend_mode == "alpha"
+        if alpha_mode:
+            # Один буфер float32 на изображение: все клетки смешиваются в нем, в uint8 переводим один раз
+            blended = canvas.astype(np.float32)
         
         # Генерируем случайное количество клеток для добавления
-        for _ in range(np.random.randint(5, 30)): # Количество клеток от 5 до 30
-            cell = self.cells[np.random.randint(0, len(self.cells))] # Выбираем случайное изображение клетки
-            cell = cv2.resize(cell, (100, 100)) # Изменяем размер клетки
-            mask = np.full_like(cell, 255) # Создаем маску для бесшовного клонирования клетки
+        for _ in range(random_int(self.rng, 5, 30)): # Количество клеток от 5 до 30
+            index = random_int(self.rng, 0, len(self.cells)) # Выбираем случайное изображение клетки
+            cell = self.cell_sprites[index] # Клетка, заранее уменьшенная до CELL_SIZE
+            mask = self.clone_mask # Маска для бесшовного клонирования клетки
             
             h, w = cell.shape[:2] # Размеры добавляемой клетки
             
             # Выбираем случайный центр для размещения клетки на холсте
-            center_y = np.random.randint(0, self.image_size[0])
-            center_x = np.random.randint(0, self.image_size[1])
+            center_y = random_int(self.rng, 0, self.image_size[0])
+            center_x = random_int(self.rng, 0, self.image_size[1])
 
             # Рассчитываем координаты углов добавляемой клетки относительно центра
             h_left_up = center_y - h // 2
             h_right_down = center_y + h // 2
             w_left_up = center_x - w // 2
             w_right_down = center_x + w // 2
+            crop_x, crop_y = slice(None), slice(None) # Видимая часть клетки (для альфа-смешивания)
 
             # Корректируем размер и маску, если клетка выходит за границы холста
             if w_left_up < 0:
-                cell = cell[:, -w_left_up:]
-                mask = mask[:, -w_left_up:]
+                crop_x = slice(-w_left_up, None)
+                cell = cell[:, crop_x]
+                mask = mask[:, crop_x]
                 center_x -= w_left_up // 2
                 w = cell.shape[1] # Обновляем ширину после обрезки
 
             elif w_right_down > canvas.shape[1]:
-                cell = cell[:, :canvas.shape[1] - w_right_down]
-                mask = mask[:, :canvas.shape[1] - w_right_down]
+                crop_x = slice(None, canvas.shape[1] - w_right_down)
+                cell = cell[:, crop_x]
+                mask = mask[:, crop_x]
                 center_x += (canvas.shape[1] - w_right_down) // 2
                 w = cell.shape[1] # Обновляем ширину после обрезки
 
             if h_left_up < 0:
-                cell = cell[-h_left_up:, :]
-                mask = mask[-h_left_up:, :]
+                crop_y = slice(-h_left_up, None)
+                cell = cell[crop_y, :]
+                mask = mask[crop_y, :]
                 center_y -= h_left_up // 2
                 h = cell.shape[0] # Обновляем высоту после обрезки
 
             elif h_right_down > canvas.shape[0]:
-                cell = cell[:canvas.shape[0] - h_right_down, :]
-                mask = mask[:canvas.shape[0] - h_right_down, :]
+                crop_y = slice(None, canvas.shape[0] - h_right_down)
+                cell = cell[crop_y, :]
+                mask = mask[crop_y, :]
                 center_y += (canvas.shape[0] - h_right_down) // 2
                 h = cell.shape[0] # Обновляем высоту после обрезки
 
             center = (center_x, center_y) # Координаты центра для клонирования
 
-            # Выполняем бесшовное клонирование клетки на холст
-            canvas = cv2.seamlessClone(cell, canvas, mask, center, cv2.MIXED_CLONE)
+            if alpha_mode:
+                # Альфа-смешивание на месте: roi = roi * (1 - alpha) + клетка * alpha
+                self._blend_cell(blended, index, crop_y, crop_x, center_x - w // 2, center_y - h // 2)
+            else:
+                # Выполняем бесшовное клонирование клетки на холст
+                canvas = cv2.seamlessClone(cell, canvas, mask, center, cv2.MIXED_CLONE)
             
             # Добавляем координаты ограничивающей рамки клетки в список (центр и размеры)
             bboxes.append({
@@ -141,8 +226,22 @@ class BloodCellGenerator:
                 'width': w,
                 'height': h
             })
-                
+        
+        if alpha_mode:
+            canvas = cv2.convertScaleAbs(blended) # Округление и насыщение до uint8
         return canvas, bboxes
+
+    def _blend_cell(self, blended, index, crop_y, crop_x, x0, y0):
+        """Смешивает видимую часть клетки index с буфером blended, начиная с точки (x0, y0)."""
+        inverse = self.cell_inverse_alphas[index][crop_y, crop_x]
+        premultiplied = self.cell_premultiplied[index][crop_y, crop_x]
+        h, w = inverse.shape[:2]
+        # Обрезка рамки по холсту на случай расхождения в один пиксель из-за нечетной ширины
+        top, left = max(0, -y0), max(0, -x0)
+        bottom, right = min(h, blended.shape[0] - y0), min(w, blended.shape[1] - x0)
+        roi = blended[y0 + top:y0 + bottom, x0 + left:x0 + right]
+        np.multiply(roi, inverse[top:bottom, left:right], out=roi)
+        np.add(roi, premultiplied[top:bottom, left:right], out=roi)
     
     def generate_image(self, return_bboxes=False):
         """Генерирует полное синтетическое изображение с фоном и клетками."""
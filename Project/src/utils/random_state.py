@@ -0,0 +1,17 @@
+import numpy as np
+
+
+def random_int(rng, low, high):
+    """Случайное целое из [low, high).
+
+    Args:
+        rng: np.random.Generator, np.random.RandomState или None (глобальное состояние np.random).
+    """
+    if isinstance(rng, np.random.Generator):
+        return int(rng.integers(low, high))
+    return int((np.random if rng is None else rng).randint(low, high))
+
+
+def random_uniform(rng, low, high, size=None):
+    """Равномерно распределенное случайное число (или массив размера size) из [low, high); rng как в random_int."""
+    return (np.random if rng is None else rng).uniform(low, high, size)